@@ -23,31 +23,25 @@ class EventAdmin(admin.ModelAdmin):
     Custom admin configuration for the Event model.
     """
     list_display = ('name', 'date', 'get_current_headcount', 'get_status')
+    list_select_related = ('state',)
     list_filter = ('date',)
     search_fields = ('name',)
     inlines = [HeadcountSnapshotInline]
 
     def get_current_headcount(self, obj):
         """
-        Calculates and displays the latest headcount in the admin list view.
-        Uses an explicit query instead of relying on reverse relation name.
+        Displays the latest headcount in the admin list view (from EventState).
         """
-        latest_snapshot = (
-            HeadcountSnapshot.objects.filter(event=obj).order_by("-timestamp").first()
-        )
-        return latest_snapshot.headcount if latest_snapshot else 0
+        state = obj.current_state()
+        return state.headcount if state else 0
     get_current_headcount.short_description = 'Current Headcount'  # Column header
 
     def get_status(self, obj):
         """
-        Determines and displays the crowd status (Green/Yellow/Red) in the list view.
+        Displays the crowd status (Green/Yellow/Red) in the list view.
         """
-        headcount = self.get_current_headcount(obj)
-        if headcount < obj.safe_threshold:
-            return "Green"
-        elif headcount > obj.crowded_threshold:
-            return "Red"
-        return "Yellow"
+        state = obj.current_state()
+        return state.status if state else obj.crowd_status(0)
     get_status.short_description = 'Status' # Column header
 
 
@@ -7,8 +7,16 @@ urlpatterns = [
     path('admin_update/', views.admin_update, name='admin_update'),
     path('status/', views.status_view, name='status'),
     path('history/', views.history_view, name='history'),
+    path('history/export/', views.history_export, name='history_export'),
     path('heatmap/', views.heatmap_view, name='heatmap'),
     path('alerts/', views.alerts_view, name='alerts'),
     path('qr/<int:event_id>/', views.qr_for_event, name='qr_for_event'),
+    path('qr/<int:event_id>/image/', views.QRImageView.as_view(), name='qr_image'),
+    path('ml/model/', views.ml_model_info, name='ml_model_info'),
+    path('forecast/', views.forecast_view, name='forecast'),
+    path('tasks/metrics/', views.task_queue_metrics, name='task_queue_metrics'),
+    path('ws/metrics/', views.ws_broadcast_metrics, name='ws_broadcast_metrics'),
+    path('forecast/batch/', views.forecast_batch, name='forecast_batch'),
+    path('metrics/', views.prometheus_metrics, name='prometheus_metrics'),
 ]
 
@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class CoreConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "core"
+
+    def ready(self):
+        from .instrumentation import install_query_hook
+
+        # Per-request SQL counters (core.instrumentation) hook every DB connection.
+        connection_created.connect(install_query_hook, dispatch_uid="core.instrumentation")
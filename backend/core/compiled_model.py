@@ -0,0 +1,140 @@
+# backend/core/compiled_model.py
+"""
+Tree ensembles as plain NumPy arrays.
+
+`manage.py export_model` (core.training.export) compiles a trained model
+(our GradientBoostedTrees, scikit-learn tree ensembles, LightGBM or
+XGBoost) into one set of node arrays for the whole ensemble, saved as an
+uncompressed .npz next to the joblib file. Loading it needs NumPy only:
+no unpickling, so no sklearn/LightGBM import and none of their per-object
+overhead in every worker.
+
+Every model is reduced to the same form: prediction = base_score + the sum
+of one leaf value per tree, going left when x <= threshold. Learning rates,
+forest averaging and strict "<" splits are folded into the arrays at export
+time. Missing values are not supported (serving never produces NaN
+features).
+"""
+import os
+
+import numpy as np
+
+FORMAT_VERSION = 1
+ARRAYS = ("roots", "feature", "threshold", "left", "right", "value")
+
+
+def walk(X, roots, feature, threshold, left, right, value, depth):
+    """
+    Sum of leaf values over all trees for every row of X. Every tree is
+    walked at once, one vectorized step per level; leaves point at
+    themselves, so rows that reach a leaf early stay put.
+    """
+    node = np.broadcast_to(roots, (len(X), len(roots))).copy()
+    rows = np.arange(len(X))[:, None]
+    for _ in range(depth):
+        # Leaves have feature -1; their lookups are discarded by left == right == self.
+        go_left = X[rows, feature[node]] <= threshold[node]
+        node = np.where(go_left, left[node], right[node])
+    return value[node].sum(axis=1)
+
+
+class CompiledTrees:
+    """Pure-NumPy predictor over exported node arrays."""
+
+    def __init__(self, roots, feature, threshold, left, right, value, depth, base_score,
+                 feature_names=None, input_dtype="float64", source=""):
+        self.roots = np.asarray(roots, dtype=np.int32)
+        self.feature = np.asarray(feature, dtype=np.int32)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.left = np.asarray(left, dtype=np.int32)
+        self.right = np.asarray(right, dtype=np.int32)
+        self.value = np.asarray(value, dtype=np.float64)
+        self.depth = int(depth)
+        self.base_score = float(base_score)
+        # Models that compare in float32 (scikit-learn, XGBoost) are exported
+        # with input_dtype float32 so inputs are rounded exactly as they were.
+        self.input_dtype = np.dtype(input_dtype)
+        self.source = source
+        if feature_names is not None:
+            self.feature_names_in_ = np.asarray(feature_names, dtype=object)
+
+    @classmethod
+    def from_trees(cls, trees, base_score, **kwargs):
+        """
+        Packs trees given as node lists [feature, threshold, left, right, value]
+        (children as indices within the tree, -1 feature for leaves).
+        """
+        sizes = [len(tree) for tree in trees]
+        roots = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int32) if trees else np.zeros(0, np.int32)
+        nodes = [node for tree in trees for node in tree]
+        offset = np.repeat(roots, sizes)
+        feature = np.array([node[0] for node in nodes], dtype=np.int32)
+        leaf = feature < 0
+        own = np.arange(len(nodes), dtype=np.int32)
+        left = np.where(leaf, own, np.array([node[2] for node in nodes], dtype=np.int64) + offset)
+        right = np.where(leaf, own, np.array([node[3] for node in nodes], dtype=np.int64) + offset)
+        return cls(
+            roots, feature,
+            np.array([node[1] for node in nodes], dtype=np.float64),
+            left, right,
+            np.array([node[4] for node in nodes], dtype=np.float64),
+            max((_tree_depth(tree) for tree in trees), default=0),
+            base_score,
+            **kwargs,
+        )
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=self.input_dtype)
+        if not self.n_trees:
+            return np.full(len(X), self.base_score)
+        return self.base_score + walk(X, self.roots, self.feature, self.threshold,
+                                      self.left, self.right, self.value, self.depth)
+
+    def save(self, path):
+        """Writes an uncompressed .npz (atomically: temp file, then rename)."""
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as fh:
+            np.savez(
+                fh,
+                format_version=np.int32(FORMAT_VERSION),
+                depth=np.int32(self.depth),
+                base_score=np.float64(self.base_score),
+                input_dtype=np.str_(self.input_dtype.name),
+                source=np.str_(self.source),
+                feature_names=np.array(
+                    [str(n) for n in getattr(self, "feature_names_in_", [])], dtype=np.str_
+                ),
+                **{name: getattr(self, name) for name in ARRAYS},
+            )
+        os.replace(tmp, path)
+
+
+def load(path):
+    with np.load(path, allow_pickle=False) as data:
+        version = int(data["format_version"])
+        if version != FORMAT_VERSION:
+            raise ValueError(f"{path}: compiled model format {version}, expected {FORMAT_VERSION}")
+        names = data["feature_names"].tolist()
+        return CompiledTrees(
+            *(data[name] for name in ARRAYS),
+            depth=int(data["depth"]),
+            base_score=float(data["base_score"]),
+            feature_names=names or None,
+            input_dtype=str(data["input_dtype"]),
+            source=str(data["source"]),
+        )
+
+
+def _tree_depth(tree):
+    depth, stack = 0, [(0, 0)]
+    while stack:
+        node_id, d = stack.pop()
+        depth = max(depth, d)
+        if tree[node_id][0] >= 0:
+            stack.append((tree[node_id][2], d + 1))
+            stack.append((tree[node_id][3], d + 1))
+    return depth
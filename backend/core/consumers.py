@@ -1,7 +1,72 @@
 # backend/core/core/consumers.py
+import asyncio
 import json
+import logging
+from collections import Counter
+
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 
+from . import fanout, wsprotocol
+from .fastjson import dumps
+from .models import EventState
+
+logger = logging.getLogger(__name__)
+
+# Frames delivered to sockets, per event id. Frames suppressed by coalescing
+# are counted by the producer (core.fanout.coalescer); "dropped" counts relay
+# frames shed by a socket whose inbox was full. Read by the /api/ws/metrics/
+# endpoint.
+BROADCAST_STATS = {"delivered": Counter(), "alerts": Counter(), "dropped": Counter()}
+
+# Close code telling a client it fell too far behind and should reconnect
+# (it receives a fresh snapshot on connect).
+RESYNC_CLOSE_CODE = 4008
+
+
+def headcount_frame(data):
+    """Client frame for a headcount_update group message's data."""
+    return {
+        "type": "headcount_update",
+        "headcount": data.get("headcount"),
+        "timestamp": data.get("timestamp"),
+        "source": data.get("source"),
+        "meta": {"event_id": data.get("event_id")},
+    }
+
+
+def alert_frame(data):
+    return {"type": "alert", "alert": data}
+
+
+def event_update_frame(message):
+    return {"type": "event_update", "headcount": message.get("headcount"), "status": message.get("status")}
+
+
+def snapshot_frame(state):
+    return {"type": "snapshot", **state}
+
+
+@database_sync_to_async
+def load_state(event_id):
+    """Current headcount/timestamp/status for an event, for resync snapshots."""
+    row = (
+        EventState.objects.filter(event_id=event_id)
+        .values("headcount", "timestamp", "status")
+        .first()
+    )
+    if row is None:
+        return {"headcount": 0, "timestamp": None, "status": "Green"}
+    row["timestamp"] = row["timestamp"].isoformat() if row["timestamp"] else None
+    return row
+
+
+def broadcast_stats():
+    return {
+        name: {"total": sum(counter.values()), "per_event": dict(counter)}
+        for name, counter in BROADCAST_STATS.items()
+    }
+
 
 class EventConsumer(AsyncWebsocketConsumer):
     """
@@ -9,6 +74,19 @@ class EventConsumer(AsyncWebsocketConsumer):
     Connect URL: /ws/event/<event_id>/
     Joins group: event_<event_id>
     Handles: headcount_update, alert_message, event_update
+
+    Clients may negotiate a compact delta stream (see core.wsprotocol);
+    otherwise they get the verbose JSON frames built by the producers.
+    Sending {"action": "resync"} returns a snapshot of the current state.
+
+    The socket joins one of the event's sub-groups, or, with local
+    rebroadcast on, receives messages from the process relay (core.fanout).
+
+    headcount_update / event_update arrive already coalesced per event by
+    the producer (core.fanout.broadcast), so every group message is sent on.
+    A relayed socket whose inbox is full drops further updates and sends a
+    snapshot once it catches up; an alert that does not fit closes the
+    socket with RESYNC_CLOSE_CODE instead of being lost silently.
     """
 
     async def connect(self):
@@ -17,15 +95,70 @@ class EventConsumer(AsyncWebsocketConsumer):
             await self.close(code=4001)
             return
 
-        self.group_name = f"event_{self.event_id}"
-        await self.channel_layer.group_add(self.group_name, self.channel_name)
-        await self.accept()
+        self.mode, subprotocol = wsprotocol.negotiate(self.scope)
+        self.encoder = (
+            wsprotocol.DeltaEncoder(binary=self.mode == wsprotocol.BINARY)
+            if self.mode != wsprotocol.VERBOSE else None
+        )
 
-        # small confirmation
-        await self.send_json({"type": "connection_established", "event_id": self.event_id})
+        fanout.bind_loop(asyncio.get_running_loop())
+        if fanout.local_rebroadcast():
+            self._inbox = asyncio.Queue(maxsize=fanout.inbox_size())
+            self._stale = False  # updates were dropped; snapshot once drained
+            self._closing = False
+            self._inbox_task = asyncio.ensure_future(self._drain_inbox())
+            await fanout.relay.subscribe(self.event_id, self)
+        else:
+            self.group_name = fanout.group_for(self.event_id, self.channel_name)
+            await self.channel_layer.group_add(self.group_name, self.channel_name)
+        fanout.connections.add(self.event_id)
+        self._registered = True
+        await self.accept(subprotocol=subprotocol)
+
+        if self.encoder:
+            await self.send_snapshot()  # late joiners start from the current state
+        else:
+            # small confirmation
+            await self.send_json({"type": "connection_established", "event_id": self.event_id})
 
     async def disconnect(self, close_code):
-        await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        if getattr(self, "_inbox_task", None):
+            self._inbox_task.cancel()
+            await fanout.relay.unsubscribe(self.event_id, self)
+        if hasattr(self, "group_name"):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        if getattr(self, "_registered", False):
+            fanout.connections.remove(self.event_id)
+            self._registered = False
+
+    # Local rebroadcast: the relay hands messages over here; they are
+    # dispatched in order on this socket's own task.
+    def deliver(self, message):
+        try:
+            self._inbox.put_nowait(message)
+            return
+        except asyncio.QueueFull:
+            pass
+        BROADCAST_STATS["dropped"][self.event_id] += 1
+        if message.get("type") in fanout.COALESCED_TYPES:
+            # Superseded by the next update anyway; the snapshot after the
+            # backlog drains brings the client up to date.
+            self._stale = True
+        elif not self._closing:
+            self._closing = True
+            logger.warning("Event %s socket fell behind; closing for resync", self.event_id)
+            asyncio.ensure_future(self.close(code=RESYNC_CLOSE_CODE))
+
+    async def _drain_inbox(self):
+        while True:
+            message = await self._inbox.get()
+            try:
+                await self.dispatch(message)
+                if self._stale and self._inbox.empty():
+                    self._stale = False
+                    await self.send_snapshot()
+            except Exception:
+                logger.exception("Failed to deliver %s to event %s socket", message.get("type"), self.event_id)
 
     async def receive(self, text_data=None, bytes_data=None):
         if not text_data:
@@ -36,38 +169,62 @@ class EventConsumer(AsyncWebsocketConsumer):
             await self.send_json({"type": "echo", "raw": text_data})
             return
 
+        action = payload.get("action") if isinstance(payload, dict) else None
+        if payload == ["r"]:
+            action = "resync"
+
         # simple ping support
-        if payload.get("action") == "ping":
+        if action == "ping":
             await self.send_json({"type": "pong"})
+        elif action == "resync":
+            await self.send_snapshot()
         else:
             await self.send_json({"type": "echo", "payload": payload})
 
     # Group handlers (method names must match the 'type' from group_send)
+    # Producers attach the encoded client frame as "frame" so one payload is
+    # serialized once per broadcast instead of once per socket.
     async def headcount_update(self, event):
-        data = event.get("data", {})
-        await self.send_json(
-            {
-                "type": "headcount_update",
-                "headcount": data.get("headcount"),
-                "timestamp": data.get("timestamp"),
-                "source": data.get("source"),
-                "meta": {"event_id": data.get("event_id")},
-            }
-        )
+        BROADCAST_STATS["delivered"][self.event_id] += 1
+        await self.send_frame(self._encode("headcount_update", event))
 
     async def alert_message(self, event):
         # forward serialized alert under 'alert' key; clients will receive "type":"alert"
-        data = event.get("data", {})
-        await self.send_json({"type": "alert", "alert": data})
+        BROADCAST_STATS["alerts"][self.event_id] += 1
+        await self.send_frame(self._encode("alert_message", event))
 
     async def event_update(self, event):
-        await self.send_json(
-            {
-                "type": "event_update",
-                "headcount": event.get("headcount"),
-                "status": event.get("status"),
-            }
-        )
+        BROADCAST_STATS["delivered"][self.event_id] += 1
+        await self.send_frame(self._encode("event_update", event))
+
+    def _encode(self, kind, event):
+        """Client frame (str or bytes) for a group message in this socket's mode."""
+        if self.encoder is None:
+            if event.get("frame"):
+                return event["frame"]
+            if kind == "headcount_update":
+                return dumps(headcount_frame(event.get("data", {})))
+            if kind == "alert_message":
+                return dumps(alert_frame(event.get("data", {})))
+            return dumps(event_update_frame(event))
+        if kind == "headcount_update":
+            return self.encoder.headcount_update(event.get("data", {}))
+        if kind == "alert_message":
+            return self.encoder.alert(event.get("data", {}))
+        return self.encoder.event_update(event.get("headcount"), event.get("status"))
+
+    async def send_snapshot(self):
+        state = await load_state(self.event_id)
+        if self.encoder is None:
+            await self.send_json(snapshot_frame(state))
+        else:
+            await self.send_frame(self.encoder.snapshot(state["headcount"], state["timestamp"], state["status"]))
+
+    async def send_frame(self, frame):
+        if isinstance(frame, bytes):
+            await self.send(bytes_data=frame)
+        else:
+            await self.send(text_data=frame)
 
     async def send_json(self, content):
-        await self.send(text_data=json.dumps(content))
+        await self.send(text_data=dumps(content))
@@ -0,0 +1,382 @@
+# backend/core/counters.py
+"""
+Atomic headcount counters for the scan endpoints.
+
+Scans bump a running total in a counter backend instead of doing a
+read-modify-write against HeadcountSnapshot. Dirty totals are flushed into
+HeadcountSnapshot rows at most once per FLUSH_INTERVAL per process: a scan
+that finds the interval elapsed flushes inline, otherwise it arms a
+one-shot timer that flushes at the end of the interval, so the last scan of
+a burst is written within FLUSH_INTERVAL even if no further scan arrives.
+Whatever is still dirty is flushed when the process exits.
+
+LocalCounter totals live only in the worker process, so the
+`flush_headcounts` management command (a separate process) can only flush
+a shared backend such as RedisCounter.
+
+Configured through settings.HEADCOUNT_COUNTER:
+
+    HEADCOUNT_COUNTER = {
+        "BACKEND": "core.counters.LocalCounter",   # or core.counters.RedisCounter
+        "OPTIONS": {},                              # e.g. {"url": "redis://localhost:6379/0"}
+        "FLUSH_INTERVAL": 1.0,                      # seconds, 0 disables inline and timed flushing
+        "MAX_INCREMENT": 10000,                     # largest |increment| one scan may carry
+    }
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Event, HeadcountSnapshot
+
+logger = logging.getLogger(__name__)
+
+
+class BaseCounter:
+    """
+    Interface for counter backends. All methods take plain event ids.
+    """
+
+    def get(self, event_id):
+        """Return the current total, or None if the counter is not seeded."""
+        raise NotImplementedError
+
+    def seed(self, event_id, value):
+        """Initialise the counter to `value` unless it already exists."""
+        raise NotImplementedError
+
+    def set(self, event_id, value):
+        """Overwrite the counter (e.g. admin correction). Not marked dirty."""
+        raise NotImplementedError
+
+    def incr(self, event_id, amount=1):
+        """Atomically add `amount`, mark the event dirty and return the new total."""
+        raise NotImplementedError
+
+    def mark_dirty(self, event_ids):
+        """Flag counters as dirty again, e.g. after a failed flush."""
+        raise NotImplementedError
+
+    def drain_dirty(self, event_ids=None):
+        """
+        Return {event_id: total} for every dirty counter (or only those in
+        `event_ids`) and clear their dirty flags.
+        """
+        raise NotImplementedError
+
+
+class LocalCounter(BaseCounter):
+    """
+    In-process counter guarded by a lock. Correct for a single worker process.
+    """
+
+    def __init__(self, **options):
+        self._lock = threading.Lock()
+        self._values = {}
+        self._dirty = set()
+
+    def get(self, event_id):
+        with self._lock:
+            return self._values.get(int(event_id))
+
+    def seed(self, event_id, value):
+        with self._lock:
+            self._values.setdefault(int(event_id), int(value))
+
+    def set(self, event_id, value):
+        with self._lock:
+            self._values[int(event_id)] = int(value)
+            self._dirty.discard(int(event_id))
+
+    def incr(self, event_id, amount=1):
+        event_id = int(event_id)
+        with self._lock:
+            value = self._values.get(event_id, 0) + int(amount)
+            self._values[event_id] = value
+            self._dirty.add(event_id)
+            return value
+
+    def mark_dirty(self, event_ids):
+        with self._lock:
+            self._dirty.update(int(event_id) for event_id in event_ids if int(event_id) in self._values)
+
+    def drain_dirty(self, event_ids=None):
+        with self._lock:
+            if event_ids is None:
+                ids = set(self._dirty)
+            else:
+                ids = self._dirty.intersection(int(event_id) for event_id in event_ids)
+            self._dirty -= ids
+            return {event_id: self._values[event_id] for event_id in ids}
+
+
+class RedisCounter(BaseCounter):
+    """
+    Counter backed by Redis (or anything speaking the same commands).
+    Uses INCRBY for atomic increments and a set of dirty event ids shared
+    by every worker, so each dirty total is flushed by exactly one process.
+    """
+
+    def __init__(self, client=None, url="redis://localhost:6379/0", prefix="crowd:headcount"):
+        if client is None:
+            import redis  # optional dependency, only needed for this backend
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+        self.dirty_key = f"{prefix}:dirty"
+
+    def _key(self, event_id):
+        return f"{self.prefix}:{int(event_id)}"
+
+    def get(self, event_id):
+        value = self.client.get(self._key(event_id))
+        return int(value) if value is not None else None
+
+    def seed(self, event_id, value):
+        self.client.set(self._key(event_id), int(value), nx=True)
+
+    def set(self, event_id, value):
+        self.client.set(self._key(event_id), int(value))
+        self.client.srem(self.dirty_key, int(event_id))
+
+    def incr(self, event_id, amount=1):
+        pipe = self.client.pipeline()
+        pipe.incrby(self._key(event_id), int(amount))
+        pipe.sadd(self.dirty_key, int(event_id))
+        value, _ = pipe.execute()
+        return int(value)
+
+    def mark_dirty(self, event_ids):
+        event_ids = [int(event_id) for event_id in event_ids]
+        if event_ids:
+            self.client.sadd(self.dirty_key, *event_ids)
+
+    def drain_dirty(self, event_ids=None):
+        drained = {}
+        if event_ids is not None:
+            event_ids = [int(event_id) for event_id in event_ids]
+            pipe = self.client.pipeline()
+            for event_id in event_ids:
+                pipe.srem(self.dirty_key, event_id)
+            for event_id, removed in zip(event_ids, pipe.execute()):
+                value = self.get(event_id) if removed else None
+                if value is not None:
+                    drained[event_id] = value
+            return drained
+        while True:
+            members = self.client.spop(self.dirty_key, 100)
+            if not members:
+                break
+            for member in members:
+                event_id = int(member)
+                value = self.get(event_id)
+                if value is not None:
+                    drained[event_id] = value
+        return drained
+
+
+# -----------------------
+# Module-level access
+# -----------------------
+_counter = None
+_counter_lock = threading.Lock()
+_last_flush = 0.0
+_flush_lock = threading.Lock()
+_flush_timer = None
+_timer_lock = threading.Lock()
+
+
+def _config():
+    return getattr(settings, "HEADCOUNT_COUNTER", {})
+
+
+def get_counter():
+    """Return the process-wide counter backend configured in settings."""
+    global _counter
+    if _counter is None:
+        with _counter_lock:
+            if _counter is None:
+                config = _config()
+                backend = import_string(config.get("BACKEND", "core.counters.LocalCounter"))
+                _counter = backend(**config.get("OPTIONS", {}))
+    return _counter
+
+
+def reset_counter(counter=None):
+    """Replace (or drop) the process-wide counter. Used by tests."""
+    global _counter, _last_flush
+    _cancel_flush_timer()
+    _counter = counter
+    _last_flush = 0.0
+
+
+def parse_increment(value):
+    """
+    A scan's increment: 1 when omitted, otherwise an integer with
+    |increment| <= MAX_INCREMENT. Raises ValueError for anything else, so
+    the counter never holds a total the database cannot store.
+    """
+    if value is None:
+        return 1
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError("increment must be an integer")
+    try:
+        amount = int(value)
+    except ValueError:
+        raise ValueError("increment must be an integer") from None
+    limit = _config().get("MAX_INCREMENT", 10000)
+    if abs(amount) > limit:
+        raise ValueError(f"increment must be between -{limit} and {limit}")
+    return amount
+
+
+def _latest_headcount(event_id):
+    last = (
+        HeadcountSnapshot.objects.filter(event_id=event_id)
+        .order_by("-timestamp")
+        .values_list("headcount", flat=True)
+        .first()
+    )
+    return last or 0
+
+
+def increment_headcount(event_id, amount=1):
+    """
+    Atomically add `amount` to the event's running headcount and return the
+    new total. The counter is seeded from the latest snapshot on first use.
+    """
+    counter = get_counter()
+    if counter.get(event_id) is None:
+        counter.seed(event_id, _latest_headcount(event_id))
+    value = counter.incr(event_id, amount)
+    maybe_flush()
+    return value
+
+
+def increment_headcounts(totals):
+    """
+    Apply {event_id: amount} in one pass without inline flushing.
+    Returns {event_id: new_total}. Callers follow up with
+    flush_headcounts(event_ids=...).
+    """
+    counter = get_counter()
+    result = {}
+    for event_id, amount in totals.items():
+        if counter.get(event_id) is None:
+            counter.seed(event_id, _latest_headcount(event_id))
+        result[event_id] = counter.incr(event_id, amount)
+    return result
+
+
+def set_headcount(event_id, value):
+    """Overwrite the running headcount after an absolute (admin/sensor) reading."""
+    get_counter().set(event_id, value)
+
+
+def flush_headcounts(source="qr", event_ids=None):
+    """
+    Write one HeadcountSnapshot per dirty event (or per dirty event in
+    `event_ids`) holding its current total, in a single transaction.
+    Returns the list of created snapshots. If the write fails the drained
+    events are marked dirty again, so a later flush retries them.
+    """
+    counter = get_counter()
+    drained = counter.drain_dirty(event_ids)
+    if not drained:
+        return []
+    try:
+        # Events deleted since their last scan have nothing to flush into.
+        existing = set(Event.objects.filter(pk__in=drained).values_list("pk", flat=True))
+        now = timezone.now()
+        snaps = [
+            HeadcountSnapshot(event_id=event_id, headcount=value, source=source, timestamp=now)
+            for event_id, value in sorted(drained.items())
+            if event_id in existing
+        ]
+        with transaction.atomic():
+            return HeadcountSnapshot.objects.bulk_create(snaps)
+    except BaseException:
+        counter.mark_dirty(drained)
+        raise
+
+
+def maybe_flush():
+    """
+    Flush dirty counters if FLUSH_INTERVAL has elapsed since the last flush,
+    otherwise make sure a trailing flush is scheduled for when it does.
+    """
+    global _last_flush
+    interval = _config().get("FLUSH_INTERVAL", 1.0)
+    if not interval:
+        return []
+    now = time.monotonic()
+    remaining = interval - (now - _last_flush)
+    if remaining > 0 or not _flush_lock.acquire(blocking=False):
+        _schedule_flush(max(remaining, 0.0))
+        return []
+    try:
+        _last_flush = now
+        return flush_headcounts()
+    except Exception:
+        # The scan is already counted; retry from the timer instead of failing it.
+        logger.exception("Inline headcount flush failed; retrying in %ss", interval)
+        _schedule_flush(interval)
+        return []
+    finally:
+        _flush_lock.release()
+
+
+def _schedule_flush(delay):
+    """Arm the one-shot trailing flush unless one is already pending."""
+    global _flush_timer
+    with _timer_lock:
+        if _flush_timer is not None:
+            return
+        _flush_timer = threading.Timer(delay, _timed_flush)
+        _flush_timer.name = "headcount-flush"
+        _flush_timer.daemon = True
+        _flush_timer.start()
+
+
+def _cancel_flush_timer():
+    global _flush_timer
+    with _timer_lock:
+        if _flush_timer is not None:
+            _flush_timer.cancel()
+            _flush_timer = None
+
+
+def _timed_flush():
+    global _flush_timer, _last_flush
+    with _timer_lock:
+        _flush_timer = None
+    try:
+        with _flush_lock:
+            _last_flush = time.monotonic()
+            flush_headcounts()
+    except Exception:
+        logger.exception("Trailing headcount flush failed; retrying")
+        _schedule_flush(_config().get("FLUSH_INTERVAL", 1.0) or 1.0)
+    finally:
+        connections.close_all()
+
+
+def flush_at_exit():
+    """Write whatever is still dirty before the process goes away."""
+    _cancel_flush_timer()
+    if _counter is None:
+        return
+    try:
+        with _flush_lock:
+            flush_headcounts()
+    except Exception:
+        logger.exception("Headcount flush at exit failed")
+
+
+atexit.register(flush_at_exit)
@@ -0,0 +1,294 @@
+# backend/core/fanout.py
+"""
+Group layout and per-process fan-out for event WebSocket broadcasts.
+
+Each event's audience is split into SHARDS sub-groups (`event_<id>.<n>`);
+producers publish to every sub-group, consumers join one of them. With a
+shared layer (core.layers.RedisChannelLayer) that keeps any one group's
+member set small and spreads big events across keys.
+
+With LOCAL_REBROADCAST on, sockets do not join layer groups at all: the
+first local socket for an event starts one relay per process that joins a
+sub-group, and every upstream message is handed to all local sockets for
+that event in-process. One upstream delivery then feeds any number of
+viewers on that worker.
+
+headcount_update / event_update broadcasts are coalesced here, on the
+producer side, before they reach the channel layer: at most one message of
+each per WS_BROADCAST_TICK per event, carrying the latest value (leading
+edge right away, trailing edge from a timer). Every group, relay and
+socket then sees one frame per tick instead of one per scan. Other
+messages (alerts) are never coalesced; pending updates for the event are
+published ahead of them so order is kept.
+
+`connections` counts live sockets per event in this process.
+
+    WS_BROADCAST_TICK = 1.0          # seconds; 0 publishes every update
+    WS_FANOUT = {
+        "SHARDS": 1,                 # 1 keeps the plain `event_<id>` group
+        "LOCAL_REBROADCAST": False,
+    }
+"""
+import asyncio
+import os
+import threading
+import time
+import uuid
+import zlib
+from collections import Counter
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from . import tasks
+
+# Group message types that are merged latest-value-wins within a tick.
+COALESCED_TYPES = ("headcount_update", "event_update")
+
+
+def _config():
+    return getattr(settings, "WS_FANOUT", {})
+
+
+def shard_count():
+    return max(1, int(_config().get("SHARDS", 1)))
+
+
+def local_rebroadcast():
+    return bool(_config().get("LOCAL_REBROADCAST", False))
+
+
+def inbox_size():
+    """Frames a locally rebroadcast socket may have queued before it sheds load."""
+    return max(1, int(_config().get("INBOX_SIZE", 100)))
+
+
+def broadcast_tick():
+    """Seconds between coalesced messages per event; 0 publishes every update."""
+    return getattr(settings, "WS_BROADCAST_TICK", 1.0)
+
+
+def group_names(event_id):
+    """Every sub-group carrying `event_id`'s broadcasts."""
+    shards = shard_count()
+    if shards == 1:
+        return [f"event_{event_id}"]
+    return [f"event_{event_id}.{n}" for n in range(shards)]
+
+
+def group_for(event_id, key):
+    """The sub-group a subscriber identified by `key` (channel name, process id) joins."""
+    names = group_names(event_id)
+    return names[zlib.crc32(str(key).encode()) % len(names)]
+
+
+async def apublish(event_id, message, layer=None):
+    layer = layer or get_channel_layer()
+    for group in group_names(event_id):
+        await layer.group_send(group, message)
+
+
+_loop = None
+
+
+def bind_loop(loop):
+    """
+    Remember the event loop serving this process's WebSockets. Publishing
+    from plain threads (the task queue workers) is then scheduled on it, which
+    process-local layers such as InMemoryChannelLayer need to wake consumers.
+    """
+    global _loop
+    _loop = loop
+
+
+def _on_loop(loop):
+    try:
+        return asyncio.get_running_loop() is loop
+    except RuntimeError:
+        return False
+
+
+def publish(event_id, message):
+    """Send a group message to every sub-group of an event (sync callers)."""
+    loop = _loop
+    if loop is not None and loop.is_running() and not _on_loop(loop):
+        asyncio.run_coroutine_threadsafe(apublish(event_id, message), loop).result(timeout=10)
+        return
+    async_to_sync(apublish)(event_id, message)
+
+
+class BroadcastCoalescer:
+    """
+    Latest-value-wins throttle in front of publish(), per event. Messages
+    for one event are published one at a time, in order.
+    """
+
+    def __init__(self, send):
+        self._send = send
+        self._lock = threading.Lock()
+        self._pending = {}  # event key -> {message type: message}
+        self._last = {}  # event key -> monotonic time of the last coalesced publish
+        self._timers = {}  # event key -> threading.Timer for the trailing edge
+        self._order = {}  # event key -> lock held while publishing
+        self.stats = {"published": Counter(), "suppressed": Counter()}
+
+    def broadcast(self, event_id, message):
+        tick = broadcast_tick()
+        if not tick or message.get("type") not in COALESCED_TYPES:
+            self._flush(event_id, message)
+            return
+        key = str(event_id)
+        with self._lock:
+            pending = self._pending.setdefault(key, {})
+            if message["type"] in pending:
+                self.stats["suppressed"][key] += 1
+            pending[message["type"]] = message
+            wait = self._last.get(key, 0.0) + tick - time.monotonic()
+            if wait > 0:
+                if key not in self._timers:
+                    timer = threading.Timer(wait, self._flush, (event_id,))
+                    timer.daemon = True
+                    self._timers[key] = timer
+                    timer.start()
+                return
+        self._flush(event_id)  # quiet period: send on the leading edge
+
+    def _flush(self, event_id, message=None):
+        """Publish the event's pending updates, then `message` if given."""
+        key = str(event_id)
+        with self._lock:
+            order = self._order.setdefault(key, threading.Lock())
+        with order:
+            with self._lock:
+                messages = list(self._pending.pop(key, {}).values())
+                timer = self._timers.pop(key, None)
+                if messages:
+                    self._last[key] = time.monotonic()
+            if timer is not None:
+                timer.cancel()  # no-op when called from the timer itself
+            if message is not None:
+                messages.append(message)
+            for pending in messages:
+                self._send(event_id, pending)
+                self.stats["published"][key] += 1
+
+    def flush_all(self):
+        with self._lock:
+            keys = list(self._pending)
+        for key in keys:
+            self._flush(key)
+
+    def reset(self):
+        with self._lock:
+            for timer in self._timers.values():
+                timer.cancel()
+            self._pending.clear()
+            self._last.clear()
+            self._timers.clear()
+            for counter in self.stats.values():
+                counter.clear()
+
+
+coalescer = BroadcastCoalescer(lambda event_id, message: publish(event_id, message))
+
+
+def _flush_at_exit():
+    # Queued fan-out tasks may still add pending updates, so drain them first;
+    # then the trailing edges go out before the executors close.
+    tasks.shutdown()
+    coalescer.flush_all()
+
+
+tasks.at_shutdown(_flush_at_exit)
+
+
+def broadcast(event_id, message):
+    """publish(), with headcount_update / event_update coalesced per WS_BROADCAST_TICK."""
+    coalescer.broadcast(event_id, message)
+
+
+class ConnectionRegistry:
+    """Live WebSocket count per event for this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+
+    def add(self, event_id):
+        with self._lock:
+            self._counts[str(event_id)] += 1
+
+    def remove(self, event_id):
+        with self._lock:
+            key = str(event_id)
+            self._counts[key] -= 1
+            if self._counts[key] <= 0:
+                del self._counts[key]
+
+    def count(self, event_id):
+        with self._lock:
+            return self._counts.get(str(event_id), 0)
+
+    def counts(self):
+        with self._lock:
+            return dict(self._counts)
+
+
+connections = ConnectionRegistry()
+
+
+class LocalRelay:
+    """
+    One layer subscription per event per process, rebroadcast to local
+    consumers through their deliver() method.
+    """
+
+    def __init__(self):
+        self._subscribers = {}  # event_id -> set of consumers
+        self._readers = {}  # event_id -> {"channel", "group", "task"}
+        self.upstream = Counter()  # messages received from the layer, per event id (str)
+
+    async def subscribe(self, event_id, consumer):
+        event_id = str(event_id)
+        self._subscribers.setdefault(event_id, set()).add(consumer)
+        if event_id in self._readers:
+            return
+        # Registered before the first await so concurrent connects share one reader.
+        reader = {
+            "channel": f"relay.{os.getpid()}!{uuid.uuid4().hex}",
+            "group": group_for(event_id, os.getpid()),
+            "task": None,
+        }
+        self._readers[event_id] = reader
+        layer = get_channel_layer()
+        await layer.group_add(reader["group"], reader["channel"])
+        if self._readers.get(event_id) is reader:
+            reader["task"] = asyncio.ensure_future(self._read(layer, event_id, reader["channel"]))
+
+    async def unsubscribe(self, event_id, consumer):
+        event_id = str(event_id)
+        subscribers = self._subscribers.get(event_id)
+        if subscribers is None:
+            return
+        subscribers.discard(consumer)
+        if subscribers:
+            return
+        del self._subscribers[event_id]
+        reader = self._readers.pop(event_id)
+        if reader["task"] is not None:
+            reader["task"].cancel()
+        await get_channel_layer().group_discard(reader["group"], reader["channel"])
+
+    def subscriber_count(self, event_id):
+        return len(self._subscribers.get(str(event_id), ()))
+
+    async def _read(self, layer, event_id, channel):
+        while True:
+            message = await layer.receive(channel)
+            self.upstream[event_id] += 1
+            for consumer in list(self._subscribers.get(event_id, ())):
+                consumer.deliver(message)
+
+
+relay = LocalRelay()
@@ -0,0 +1,21 @@
+# backend/core/fastjson.py
+"""
+JSON encoding for WebSocket frames: orjson when installed, stdlib otherwise.
+Both produce compact text.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+def dumps(obj):
+    """Serialize `obj` to a compact JSON str."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj).decode()
+        except TypeError:
+            pass  # types orjson refuses (e.g. Decimal) go through the stdlib path
+    return json.dumps(obj, separators=(",", ":"), default=str)
@@ -0,0 +1,309 @@
+# backend/core/features.py
+"""
+NumPy feature engine for the crowd model.
+
+Each event keeps an hourly ring buffer (sum and count of headcounts per hour)
+covering the model's 49-hour look-back. Buffers are topped up incrementally
+with only the snapshots written since the last request (a new buffer starts
+from the hourly rollups, see core.rollups), and the lag/rolling
+features for the latest hour are computed straight from the buffer, so the
+request path never builds a DataFrame.
+
+`pandas_feature_frame` is the original pandas pipeline, kept as the reference
+implementation for parity tests and benchmarks only.
+"""
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+
+from . import rollups
+from .models import HeadcountSnapshot, HourRollup
+
+LAGS = (1, 2, 3, 6, 12, 24, 48)
+ROLLING_WINDOWS = (3, 6, 12, 24)
+WINDOW_HOURS = 49  # hours of history fetched for one prediction
+MIN_SNAPSHOTS = 10
+
+# Fallback static features for events without a venue; core.venues.static_features
+# supplies real per-venue values when Event.venue is set.
+STATIC_FEATURES = {
+    'is_special_day': 0,  # no special festival day assumed
+    'weather_impact_score': 0.5,  # neutral weather (core.venues.DEFAULT_WEATHER_IMPACT)
+    'is_mumbai': 1,  # assumes a Mumbai venue, as the original model did
+    'festival_progress': 0.2,  # day 2 of a 10-day festival
+    'days_to_visarjan': 8,  # days left in that festival
+    'mandal_encoded': 12,  # registry code outside core.venues.VENUES (unknown venue)
+}
+
+
+def _epoch_hour(ts):
+    return int(ts.timestamp()) // 3600
+
+
+class HourlyRingBuffer:
+    """
+    Fixed-size ring of hourly (sum, count) bins ending at the newest hour seen.
+    """
+
+    def __init__(self, capacity=WINDOW_HOURS):
+        self.capacity = capacity
+        self.sums = np.zeros(capacity, dtype=np.float64)
+        self.counts = np.zeros(capacity, dtype=np.int64)
+        self.last_hour = None
+
+    def add(self, hour, value):
+        """Add one headcount reading to epoch-hour `hour`."""
+        self.add_bin(hour, value, 1)
+
+    def add_bin(self, hour, total, count):
+        """Add `count` readings summing to `total` to epoch-hour `hour`."""
+        if self.last_hour is None:
+            self.last_hour = hour
+        elif hour > self.last_hour:
+            # Clear the slots of every hour we skipped over (at most one full lap).
+            for h in range(self.last_hour + 1, min(hour, self.last_hour + self.capacity) + 1):
+                self.sums[h % self.capacity] = 0.0
+                self.counts[h % self.capacity] = 0
+            self.last_hour = hour
+        elif hour <= self.last_hour - self.capacity:
+            return  # older than the buffer reaches
+        slot = hour % self.capacity
+        self.sums[slot] += total
+        self.counts[slot] += count
+
+    def window(self, start_hour):
+        """
+        Hourly means (NaN for empty hours) from max(start_hour, oldest slot) to last_hour,
+        plus the number of readings in that range.
+        """
+        if self.last_hour is None:
+            return np.empty(0), 0
+        first = max(start_hour, self.last_hour - self.capacity + 1)
+        if first > self.last_hour:
+            return np.empty(0), 0
+        slots = np.arange(first, self.last_hour + 1) % self.capacity
+        sums, counts = self.sums[slots], self.counts[slots]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+        return means, int(counts.sum())
+
+
+def feature_row(hourly, last_hour, static=None):
+    """
+    Features for the last hour of `hourly` (oldest-first hourly means, no NaNs,
+    at least max(LAGS)+1 long). Mirrors pandas_feature_frame(...).tail(1).
+    """
+    static = STATIC_FEATURES if static is None else static
+    ts = datetime.fromtimestamp(last_hour * 3600, tz=dt_timezone.utc)
+    hour, dow = ts.hour, ts.weekday()
+    is_weekend = int(dow >= 5)
+
+    row = dict(static)
+    row.update({
+        'hour': hour,
+        'day_of_week': dow,
+        'is_weekend': is_weekend,
+        'hour_sin': np.sin(2 * np.pi * hour / 24),
+        'hour_cos': np.cos(2 * np.pi * hour / 24),
+        'day_sin': np.sin(2 * np.pi * dow / 7),
+        'day_cos': np.cos(2 * np.pi * dow / 7),
+        'is_peak_hour': int(17 <= hour < 21),
+        'is_late_night': int(hour >= 23 or hour < 5),
+    })
+    n = len(hourly)
+    for lag in LAGS:
+        row[f'headcount_lag_{lag}h'] = hourly[n - 1 - lag]
+    for window in ROLLING_WINDOWS:
+        past = hourly[n - 1 - window:n - 1]
+        row[f'headcount_rolling_mean_{window}h'] = past.mean()
+        row[f'headcount_rolling_std_{window}h'] = past.std(ddof=1)
+    row['hour_x_weekend'] = hour * is_weekend
+    row['hour_x_special'] = hour * row['is_special_day']
+    row['weather_x_weekend'] = row['weather_impact_score'] * is_weekend
+    return row
+
+
+def hourly_series(buffer, start_hour):
+    """
+    Gap-free hourly means ending at buffer.last_hour, long enough for every lag.
+    Returns (means, None) or (None, fallback_reason).
+    """
+    means, n_readings = buffer.window(start_hour)
+    if n_readings < MIN_SNAPSHOTS:
+        return None, 'heuristic_insufficient_data'
+
+    observed = np.flatnonzero(~np.isnan(means))
+    means = means[observed[0]:]  # the pandas pipeline starts at the first reading
+    if len(means) < max(LAGS) + 1:
+        return None, 'heuristic_nan_after_feature_eng'
+    gaps = np.isnan(means)
+    if gaps.any():
+        positions = np.arange(len(means))
+        means = means.copy()
+        means[gaps] = np.interp(positions[gaps], positions[~gaps], means[~gaps])
+    return means, None
+
+
+def features_from_buffer(buffer, start_hour, static=None):
+    """
+    Returns (feature dict, None) or (None, fallback_reason) for a ring buffer.
+    """
+    means, reason = hourly_series(buffer, start_hour)
+    if means is None:
+        return None, reason
+    return feature_row(means, buffer.last_hour, static), None
+
+
+class FeatureEngine:
+    """
+    Per-process cache of event ring buffers, refreshed with only the
+    snapshots whose id is above the last settled one.
+
+    Ids may become visible out of order (see core.rollups), so a buffer
+    remembers the ids it applied above its settled id and re-reads that
+    range on the next top-up: a smaller id that commits late is still
+    picked up. The settled id only moves to an id seen at least
+    rollups.safety_lag() seconds ago.
+    """
+
+    def __init__(self, window_hours=WINDOW_HOURS):
+        self.window_hours = window_hours
+        self._lock = threading.Lock()
+        self._buffers = {}  # event_id -> (buffer, settled_snapshot_id, ids applied above it)
+        self._seen = deque()  # (monotonic time, highest id read then)
+        self._settled = 0
+
+    def reset(self, event_id=None):
+        with self._lock:
+            if event_id is None:
+                self._buffers.clear()
+                self._seen.clear()
+                self._settled = 0
+            else:
+                self._buffers.pop(event_id, None)
+
+    def _settled_id(self, latest, lag):
+        """Record `latest` as seen now; return the highest id seen at least `lag` seconds ago."""
+        now = time.monotonic()
+        self._seen.append((now, latest))
+        while self._seen and now - self._seen[0][0] >= lag:
+            self._settled = max(self._settled, self._seen.popleft()[1])
+        return self._settled
+
+    def buffers_for(self, event_ids, now):
+        """
+        Ring buffers for several events, topped up with a single query.
+        Returns {event_id: HourlyRingBuffer}.
+        """
+        start = now - timedelta(hours=self.window_hours)
+        with self._lock:
+            state = {
+                event_id: self._buffers.get(event_id) or (HourlyRingBuffer(self.window_hours + 1), 0, set())
+                for event_id in event_ids
+            }
+            if not state:
+                return {}
+            self._seed_from_rollups(
+                [event_id for event_id in state if event_id not in self._buffers], state, start
+            )
+            floor = min(settled for _, settled, _ in state.values())
+            rows = (
+                HeadcountSnapshot.objects.filter(
+                    event_id__in=list(state), pk__gt=floor, timestamp__gte=start
+                )
+                .order_by('pk')
+                .values_list('event_id', 'pk', 'timestamp', 'headcount')
+            )
+            latest = floor
+            for event_id, pk, ts, headcount in rows:
+                buffer, settled, applied = state[event_id]
+                latest = pk
+                if pk <= settled or pk in applied:
+                    continue  # already applied to this event's buffer
+                buffer.add(_epoch_hour(ts), headcount)
+                applied.add(pk)
+            # Every id up to `settled` was visible to the query above.
+            settled_now = self._settled_id(latest, rollups.safety_lag())
+            for event_id, (buffer, settled, applied) in state.items():
+                settled = max(settled, settled_now)
+                self._buffers[event_id] = (buffer, settled, {pk for pk in applied if pk > settled})
+            return {event_id: buffer for event_id, (buffer, _, _) in state.items()}
+
+    def _seed_from_rollups(self, event_ids, state, start):
+        """Fill new buffers from HourRollup up to the rollup watermark."""
+        if not event_ids or not rollups.enabled():
+            return
+        mark = rollups.watermark()
+        if not mark:
+            return
+        rows = (
+            HourRollup.objects.filter(
+                event_id__in=event_ids, bucket__gte=start - timedelta(seconds=start.timestamp() % 3600)
+            )
+            .order_by('bucket')
+            .values_list('event_id', 'bucket', 'total', 'samples')
+        )
+        for event_id, bucket, total, samples in rows:
+            state[event_id][0].add_bin(_epoch_hour(bucket), total, samples)
+        for event_id in event_ids:
+            state[event_id] = (state[event_id][0], mark, set())
+
+    def start_hour(self, now):
+        return _epoch_hour(now - timedelta(hours=self.window_hours))
+
+    def features(self, event, now, static=None):
+        """(feature dict, None) or (None, fallback_reason) for `event` at `now`."""
+        buffer = self.buffers_for([event.pk], now)[event.pk]
+        return features_from_buffer(buffer, self.start_hour(now), static)
+
+
+feature_engine = FeatureEngine()
+
+
+def pandas_feature_frame(rows, static=None):
+    """
+    Reference pandas pipeline (the original run_ml_predict code). `rows` are
+    (timestamp, headcount) pairs. Not used on the request path.
+    """
+    import pandas as pd
+
+    static = STATIC_FEATURES if static is None else static
+    df = pd.DataFrame(list(rows), columns=['timestamp', 'count'])
+    df['timestamp'] = pd.to_datetime(df['timestamp'], utc=True)
+    df = df.set_index('timestamp').resample('1h').mean().interpolate()  # Resample to hourly freq
+
+    # Time-based features
+    df['hour'] = df.index.hour
+    df['day_of_week'] = df.index.dayofweek
+    df['is_weekend'] = (df['day_of_week'] >= 5).astype(int)
+
+    # Cyclical time features (sine/cosine transformations)
+    df['hour_sin'] = np.sin(2 * np.pi * df['hour'] / 24)
+    df['hour_cos'] = np.cos(2 * np.pi * df['hour'] / 24)
+    df['day_sin'] = np.sin(2 * np.pi * df['day_of_week'] / 7)
+    df['day_cos'] = np.cos(2 * np.pi * df['day_of_week'] / 7)
+
+    # Lag features (past values of headcount)
+    for lag in LAGS:
+        df[f'headcount_lag_{lag}h'] = df['count'].shift(lag)
+
+    # Rolling window features (mean/std over past hours)
+    for window in ROLLING_WINDOWS:
+        df[f'headcount_rolling_mean_{window}h'] = df['count'].shift(1).rolling(window=window).mean()
+        df[f'headcount_rolling_std_{window}h'] = df['count'].shift(1).rolling(window=window).std()
+
+    for name, value in static.items():
+        df[name] = value
+
+    # Interaction features seen in your model file
+    df['hour_x_weekend'] = df['hour'] * df['is_weekend']
+    df['hour_x_special'] = df['hour'] * df['is_special_day']
+    df['weather_x_weekend'] = df['weather_impact_score'] * df['is_weekend']
+    df['is_peak_hour'] = ((df['hour'] >= 17) & (df['hour'] < 21)).astype(int)
+    df['is_late_night'] = ((df['hour'] >= 23) | (df['hour'] < 5)).astype(int)
+
+    # Drop rows with NaN values created by lags/rolling windows
+    return df.dropna()
@@ -0,0 +1,336 @@
+# backend/core/instrumentation.py
+"""
+Always-on performance metrics, exported in Prometheus text format at
+/api/metrics/.
+
+- MetricsMiddleware: latency histogram per (route pattern, method, status
+  class) plus DB query count and time per route.
+- instrument_consumer(): the same for WebSocket consumer handlers.
+- record_ml(): model inference time and prediction outcome/fallback reason.
+- Cache hit/miss counters are read from their owners at scrape time.
+
+DB queries are counted by one execute wrapper installed on every connection
+(see CoreConfig.ready). It finds the current request through a ContextVar,
+which asgiref carries into sync_to_async threads, and costs two clock reads
+per query. Requests slower than SLOW_REQUEST_SECONDS are logged to
+`core.slow_requests` for a sampled fraction, with the first SQL statements.
+
+    INSTRUMENTATION = {
+        "ENABLED": True,
+        "SLOW_REQUEST_SECONDS": 1.0,
+        "SLOW_SAMPLE_RATE": 0.1,
+        "MAX_TRACED_QUERIES": 20,
+    }
+"""
+import bisect
+import contextvars
+import logging
+import random
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+slow_logger = logging.getLogger("core.slow_requests")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current = contextvars.ContextVar("instrumentation_stats", default=None)
+
+
+def _config():
+    return getattr(settings, "INSTRUMENTATION", {})
+
+
+def enabled():
+    return _config().get("ENABLED", True)
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Counters and histograms keyed by (name, sorted label tuple)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._help = {}
+
+    def describe(self, name, kind, text):
+        self._help[name] = (kind, text)
+
+    def inc(self, name, labels=(), amount=1):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, labels, value):
+        key = (name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def help_for(self, name):
+        return self._help.get(name, ("untyped", ""))
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def counter_value(self, name, labels=()):
+        with self._lock:
+            return self._counters.get((name, labels), 0)
+
+    def histogram(self, name, labels=()):
+        with self._lock:
+            return self._histograms.get((name, labels))
+
+    def samples(self):
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {
+                key: (list(h.counts), h.sum, h.count) for key, h in self._histograms.items()
+            }
+        return counters, histograms
+
+
+metrics = MetricsRegistry()
+metrics.describe("http_request_duration_seconds", "histogram", "HTTP request latency by route.")
+metrics.describe("http_db_queries_total", "counter", "SQL queries run while serving HTTP requests.")
+metrics.describe("http_db_query_seconds_total", "counter", "Time spent in SQL while serving HTTP requests.")
+metrics.describe("ws_handler_duration_seconds", "histogram", "WebSocket consumer handler latency.")
+metrics.describe("ws_db_queries_total", "counter", "SQL queries run by WebSocket consumer handlers.")
+metrics.describe("ml_inference_seconds", "histogram", "model.predict time.")
+metrics.describe("ml_predictions_total", "counter", "Predictions by outcome (model or fallback reason).")
+metrics.describe("cache_requests_total", "counter", "Cache lookups by cache and result.")
+metrics.describe("ws_connections", "gauge", "Live WebSocket connections per event in this process.")
+
+
+# -----------------------
+# SQL accounting
+# -----------------------
+class _Stats:
+    __slots__ = ("queries", "db_seconds", "trace")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.trace = []
+
+
+def query_hook(execute, sql, params, many, context):
+    """Connection execute wrapper: charge the query to the current request/handler."""
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        stats.queries += 1
+        stats.db_seconds += elapsed
+        if len(stats.trace) < _config().get("MAX_TRACED_QUERIES", 20):
+            stats.trace.append((sql, elapsed))
+
+
+def install_query_hook(sender=None, connection=None, **kwargs):
+    """connection_created receiver."""
+    if query_hook not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_hook)
+
+
+def _status_class(status):
+    return f"{status // 100}xx" if status else "error"
+
+
+def _maybe_log_slow(kind, route, elapsed, stats):
+    config = _config()
+    if elapsed < config.get("SLOW_REQUEST_SECONDS", 1.0):
+        return
+    if random.random() >= config.get("SLOW_SAMPLE_RATE", 0.1):
+        return
+    slow_logger.warning(
+        "slow %s %s: %.3fs, %d queries (%.3fs in SQL)\n%s",
+        kind, route, elapsed, stats.queries, stats.db_seconds,
+        "\n".join(f"  {seconds * 1e3:8.2f}ms {sql}" for sql, seconds in stats.trace),
+    )
+
+
+# -----------------------
+# HTTP
+# -----------------------
+class MetricsMiddleware:
+    """Per-route latency and SQL accounting; works in sync and async stacks."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not enabled():
+            return self.get_response(request)
+        stats, start = _Stats(), time.perf_counter()
+        token = _current.set(stats)
+        response = None
+        try:
+            response = self.get_response(request)
+            return response
+        finally:
+            _current.reset(token)
+            self._record(request, response, stats, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        if not enabled():
+            return await self.get_response(request)
+        stats, start = _Stats(), time.perf_counter()
+        token = _current.set(stats)
+        response = None
+        try:
+            response = await self.get_response(request)
+            return response
+        finally:
+            _current.reset(token)
+            self._record(request, response, stats, time.perf_counter() - start)
+
+    def _record(self, request, response, stats, elapsed):
+        match = getattr(request, "resolver_match", None)
+        route = "/" + match.route if match is not None and match.route else "unmatched"
+        status = _status_class(getattr(response, "status_code", None))
+        metrics.observe(
+            "http_request_duration_seconds",
+            (("method", request.method), ("route", route), ("status", status)),
+            elapsed,
+        )
+        labels = (("route", route),)
+        metrics.inc("http_db_queries_total", labels, stats.queries)
+        metrics.inc("http_db_query_seconds_total", labels, stats.db_seconds)
+        _maybe_log_slow("request", f"{request.method} {route}", elapsed, stats)
+
+
+# -----------------------
+# WebSocket
+# -----------------------
+def instrument_consumer(consumer_class):
+    """Subclass of an async consumer that times every dispatched handler."""
+    name = consumer_class.__name__
+
+    class Instrumented(consumer_class):
+        async def dispatch(self, message):
+            if not enabled():
+                return await super().dispatch(message)
+            stats, start = _Stats(), time.perf_counter()
+            token = _current.set(stats)
+            try:
+                return await super().dispatch(message)
+            finally:
+                _current.reset(token)
+                elapsed = time.perf_counter() - start
+                labels = (("consumer", name), ("type", message.get("type", "")))
+                metrics.observe("ws_handler_duration_seconds", labels, elapsed)
+                if stats.queries:
+                    metrics.inc("ws_db_queries_total", labels, stats.queries)
+                _maybe_log_slow("ws handler", f"{name} {message.get('type')}", elapsed, stats)
+
+    Instrumented.__name__ = Instrumented.__qualname__ = name
+    return Instrumented
+
+
+# -----------------------
+# ML
+# -----------------------
+def fallback_label(reason):
+    """Bounded label for a run_ml_predict reason ('heuristic_error_<msg>' -> 'heuristic_error')."""
+    return "heuristic_error" if reason.startswith("heuristic_error") else reason
+
+
+def record_ml(path, seconds=None, reasons=()):
+    """Record one model.predict call (`seconds`) and the outcome of each prediction."""
+    if seconds is not None:
+        metrics.observe("ml_inference_seconds", (("path", path),), seconds)
+    for reason in reasons:
+        metrics.inc("ml_predictions_total", (("path", path), ("reason", fallback_label(reason))))
+
+
+# -----------------------
+# Prometheus text exposition
+# -----------------------
+def _labels(labels, extra=()):
+    pairs = tuple(labels) + tuple(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for k, v in pairs
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def _scrape_time_samples():
+    """Values owned elsewhere, read only when scraped."""
+    from .fanout import connections
+    from .prediction_cache import cache_stats
+    from .qr_cache import qr_cache_stats
+
+    counters, gauges = {}, {}
+    for cache, stats in (("predictions", cache_stats()), ("qr", qr_cache_stats())):
+        counters[("cache_requests_total", (("cache", cache), ("result", "hit")))] = stats["hits"]
+        counters[("cache_requests_total", (("cache", cache), ("result", "miss")))] = stats["misses"]
+    for event_id, count in connections.counts().items():
+        gauges[("ws_connections", (("event", event_id),))] = count
+    return counters, gauges
+
+
+def render_prometheus():
+    counters, histograms = metrics.samples()
+    extra_counters, gauges = _scrape_time_samples()
+    counters.update(extra_counters)
+
+    # name -> [(label set, lines)]; series are sorted by label set only, so a
+    # histogram's lines stay in bucket order followed by _sum and _count.
+    by_name = {}
+    for (name, labels), value in counters.items():
+        by_name.setdefault(name, []).append((labels, [f"{name}{_labels(labels)} {value}"]))
+    for (name, labels), value in gauges.items():
+        by_name.setdefault(name, []).append((labels, [f"{name}{_labels(labels)} {value}"]))
+    for (name, labels), (counts, total, count) in histograms.items():
+        lines = []
+        cumulative = 0
+        for bound, bucket in zip(LATENCY_BUCKETS + ("+Inf",), counts):
+            cumulative += bucket
+            lines.append(f"{name}_bucket{_labels(labels, (('le', bound),))} {cumulative}")
+        lines.append(f"{name}_sum{_labels(labels)} {total}")
+        lines.append(f"{name}_count{_labels(labels)} {count}")
+        by_name.setdefault(name, []).append((labels, lines))
+
+    out = []
+    for name in sorted(by_name):
+        kind, text = metrics.help_for(name)
+        out.append(f"# HELP {name} {text}")
+        out.append(f"# TYPE {name} {kind}")
+        for _, lines in sorted(by_name[name], key=lambda series: [(k, str(v)) for k, v in series[0]]):
+            out.extend(lines)
+    return "\n".join(out) + "\n"
@@ -0,0 +1,126 @@
+# backend/core/layers.py
+"""
+Minimal Redis-backed channel layer.
+
+Implements the channel layer interface EventConsumer and core.fanout need
+(send/receive/new_channel, groups, flush) on plain Redis lists and sorted
+sets, so several ASGI processes can share groups. Messages must be
+JSON-serializable (everything this app sends is).
+
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "core.layers.RedisChannelLayer",
+            "CONFIG": {"url": "redis://localhost:6379/0"},
+        }
+    }
+
+Capacity is checked and the message pushed in one server-side script
+(PUSH_SCRIPT), so concurrent senders cannot overfill a channel.
+
+Any client exposing the redis.asyncio API (eval/blpop/llen/expire/zadd/
+zrem/zrangebyscore/delete/scan_iter/pipeline) can be passed as `client`,
+which is how the tests run it against an in-memory fake.
+"""
+import json
+import time
+import uuid
+
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+
+from .fastjson import dumps
+
+# KEYS[1] channel list; ARGV: message, capacity, expiry. Returns 1 if pushed,
+# 0 if the channel was full.
+PUSH_SCRIPT = """
+if redis.call('LLEN', KEYS[1]) >= tonumber(ARGV[2]) then
+    return 0
+end
+redis.call('RPUSH', KEYS[1], ARGV[1])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+
+
+class RedisChannelLayer(BaseChannelLayer):
+    extensions = ["groups", "flush"]
+
+    def __init__(self, url="redis://localhost:6379/0", prefix="crowd:layer", client=None,
+                 expiry=60, group_expiry=86400, capacity=100, channel_capacity=None,
+                 receive_timeout=5):
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity)
+        if client is None:
+            import redis.asyncio as redis  # optional dependency, only needed for this layer
+
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+        self.group_expiry = group_expiry
+        self.receive_timeout = receive_timeout
+
+    def _channel_key(self, channel):
+        return f"{self.prefix}:channel:{channel}"
+
+    def _group_key(self, group):
+        return f"{self.prefix}:group:{group}"
+
+    # Channels
+    async def new_channel(self, prefix="specific"):
+        return f"{prefix}.{uuid.uuid4().hex}"
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), "message is not a dict"
+        self.require_valid_channel_name(channel)
+        pushed = await self.client.eval(
+            PUSH_SCRIPT, 1, self._channel_key(channel), dumps(message),
+            self.get_capacity(channel), int(self.expiry),
+        )
+        if not pushed:
+            raise ChannelFull(channel)
+
+    async def receive(self, channel):
+        self.require_valid_channel_name(channel)
+        key = self._channel_key(channel)
+        while True:
+            item = await self.client.blpop([key], timeout=self.receive_timeout)
+            if item is not None:
+                return json.loads(item[1])
+
+    async def flush(self):
+        async for key in self.client.scan_iter(match=f"{self.prefix}:*"):
+            await self.client.delete(key)
+
+    # Groups
+    async def group_add(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        key = self._group_key(group)
+        await self.client.zadd(key, {channel: time.time()})
+        await self.client.expire(key, int(self.group_expiry))
+
+    async def group_discard(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        await self.client.zrem(self._group_key(group), channel)
+
+    async def group_send(self, group, message):
+        """
+        Push `message` to every live member in one pipeline. Full channels
+        are skipped, as with the stock layers.
+        """
+        assert isinstance(message, dict), "message is not a dict"
+        self.require_valid_group_name(group)
+        members = await self.client.zrangebyscore(
+            self._group_key(group), time.time() - self.group_expiry, "+inf"
+        )
+        if not members:
+            return
+        payload = dumps(message)
+        channels = [m.decode() if isinstance(m, bytes) else m for m in members]
+        async with self.client.pipeline(transaction=False) as pipe:
+            for channel in channels:
+                pipe.eval(
+                    PUSH_SCRIPT, 1, self._channel_key(channel), payload,
+                    self.get_capacity(channel), int(self.expiry),
+                )
+            await pipe.execute()
@@ -0,0 +1,14 @@
+# backend/core/loadtest/__init__.py
+"""
+In-process load test for scan ingestion, dashboard polling and WebSocket
+fan-out, driven straight against crowd_mgmt.asgi (no server, no external
+services). Run it with `python manage.py loadtest`.
+
+    asgi.py    minimal ASGI HTTP/WebSocket clients
+    runner.py  the scenario: scanners, pollers and WebSocket viewers
+    report.py  latency percentiles, JSON results and run comparison
+"""
+from .runner import run_load_test
+from .report import compare_results, load_results, save_results
+
+__all__ = ["run_load_test", "compare_results", "load_results", "save_results"]
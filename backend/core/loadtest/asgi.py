@@ -0,0 +1,115 @@
+# backend/core/loadtest/asgi.py
+"""
+Just enough of an ASGI server to call the app in-process.
+"""
+import asyncio
+import json
+import time
+
+_HEADERS = [(b"host", b"localhost")]
+
+
+async def http_request(app, method, path, body=None, query_string=""):
+    """
+    One HTTP request through `app`. `body` is JSON-encoded when given.
+    Returns (status, response body bytes).
+    """
+    payload = json.dumps(body).encode() if body is not None else b""
+    headers = list(_HEADERS)
+    if body is not None:
+        headers += [(b"content-type", b"application/json"), (b"content-length", str(len(payload)).encode())]
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query_string.encode(),
+        "headers": headers,
+        "client": ("127.0.0.1", 50000),
+        "server": ("localhost", 80),
+    }
+    done = asyncio.Event()
+    sent_body = False
+    response = {"status": None, "body": []}
+
+    async def receive():
+        nonlocal sent_body
+        if not sent_body:
+            sent_body = True
+            return {"type": "http.request", "body": payload, "more_body": False}
+        await done.wait()  # Django listens for disconnect while the view runs
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            response["body"].append(message.get("body", b""))
+            if not message.get("more_body"):
+                done.set()
+
+    try:
+        await app(scope, receive, send)
+    finally:
+        done.set()
+    return response["status"], b"".join(response["body"])
+
+
+class WebSocketViewer:
+    """
+    A WebSocket client for /ws/event/<id>/ that keeps the latest headcount
+    it has seen and the time each frame arrived.
+    """
+
+    def __init__(self, app, event_id):
+        self.app = app
+        self.event_id = event_id
+        self.accepted = asyncio.Event()
+        self.closed = False
+        self.frames = 0
+        self.headcount = None
+        self.last_frame_at = None
+        self._inbox = asyncio.Queue()
+        self._task = None
+
+    async def connect(self, timeout=10):
+        scope = {
+            "type": "websocket",
+            "path": f"/ws/event/{self.event_id}/",
+            "raw_path": f"/ws/event/{self.event_id}/".encode(),
+            "query_string": b"",
+            "headers": list(_HEADERS),
+            "subprotocols": [],
+            "client": ("127.0.0.1", 50000),
+            "server": ("localhost", 80),
+        }
+        self._task = asyncio.ensure_future(self.app(scope, self._inbox.get, self._send))
+        await self._inbox.put({"type": "websocket.connect"})
+        start = time.perf_counter()
+        await asyncio.wait_for(self.accepted.wait(), timeout)
+        return time.perf_counter() - start
+
+    async def _send(self, message):
+        if message["type"] == "websocket.accept":
+            self.accepted.set()
+        elif message["type"] == "websocket.close":
+            self.closed = True
+            self.accepted.set()
+        elif message["type"] == "websocket.send":
+            self.frames += 1
+            self.last_frame_at = time.perf_counter()
+            frame = json.loads(message["text"]) if message.get("text") else {}
+            if frame.get("headcount") is not None:
+                self.headcount = frame["headcount"]
+
+    async def close(self):
+        if self._task is None:
+            return
+        await self._inbox.put({"type": "websocket.disconnect", "code": 1000})
+        try:
+            await asyncio.wait_for(self._task, 5)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            self._task.cancel()
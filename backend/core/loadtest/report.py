@@ -0,0 +1,56 @@
+# backend/core/loadtest/report.py
+import json
+
+import numpy as np
+
+
+def latency_summary(samples, elapsed):
+    """
+    p50/p95/p99/max/mean latency in milliseconds plus throughput for a list
+    of (seconds, ok) samples collected over `elapsed` seconds.
+    """
+    latencies = np.array([s for s, _ in samples], dtype=np.float64) * 1e3
+    errors = sum(1 for _, ok in samples if not ok)
+    if not len(latencies):
+        return {"count": 0, "errors": 0}
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        "count": len(latencies),
+        "errors": errors,
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "max_ms": round(float(latencies.max()), 3),
+        "mean_ms": round(float(latencies.mean()), 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+    }
+
+
+def save_results(results, path):
+    with open(path, "w") as fh:
+        json.dump(results, fh, indent=2, sort_keys=True)
+
+
+def load_results(path):
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def compare_results(current, baseline):
+    """
+    Per-route change in p50/p95/p99 and throughput, as
+    {route: {metric: (baseline, current, percent change)}}.
+    """
+    diff = {}
+    for route, stats in current.get("http", {}).items():
+        before = baseline.get("http", {}).get(route)
+        if not before:
+            continue
+        diff[route] = {}
+        for metric in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps"):
+            old, new = before.get(metric), stats.get(metric)
+            if old is None or new is None:
+                continue
+            change = (new - old) / old * 100 if old else None
+            diff[route][metric] = (old, new, round(change, 1) if change is not None else None)
+    return diff
@@ -0,0 +1,163 @@
+# backend/core/loadtest/runner.py
+"""
+The load-test scenario.
+
+1. Create throwaway events and connect WebSocket viewers spread across them.
+2. Concurrently: gate scanners POST /api/api/scan-by-token/ (closed loop,
+   one request in flight per scanner) while dashboards poll /api/status/
+   and /api/events/.
+3. Drain the background task queue, flush the headcount counter and check
+   that every accepted scan is in EventState (lost counts) and that every
+   viewer converged on its event's final headcount.
+"""
+import asyncio
+import logging
+import platform
+import time
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+
+import django
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection
+
+from core import tasks
+from core.counters import flush_headcounts
+from core.models import Event, EventState
+
+from .asgi import WebSocketViewer, http_request
+from .report import latency_summary
+
+
+def run_load_test(events=3, scanners=20, scans_per_scanner=50, dashboards=5, poll_interval=0.05,
+                  ws_clients=500, settle=5.0, keep=False, log=print):
+    """Run the scenario and return the results dict (see report.save_results)."""
+    from crowd_mgmt.asgi import application
+
+    config = {
+        "events": events,
+        "scanners": scanners,
+        "scans_per_scanner": scans_per_scanner,
+        "dashboards": dashboards,
+        "poll_interval": poll_interval,
+        "ws_clients": ws_clients,
+        "settle": settle,
+    }
+    created = [Event.objects.create(name=f"loadtest-{i}") for i in range(events)]
+    # Status polls 404 until an event's first snapshot lands; keep that out of the console.
+    request_logger = logging.getLogger("django.request")
+    level = request_logger.level
+    request_logger.setLevel(logging.ERROR)
+    try:
+        results = asyncio.run(_run(application, created, config, log))
+    finally:
+        request_logger.setLevel(level)
+        if not keep:
+            Event.objects.filter(pk__in=[e.pk for e in created]).delete()
+    results.update({
+        "started_at": datetime.now(dt_timezone.utc).isoformat(),
+        "config": config,
+        "environment": {
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "channel_layer": settings.CHANNEL_LAYERS["default"]["BACKEND"],
+            "ws_broadcast_tick": getattr(settings, "WS_BROADCAST_TICK", 1.0),
+        },
+    })
+    return results
+
+
+async def _run(app, events, config, log):
+    viewers = [WebSocketViewer(app, events[i % len(events)].pk) for i in range(config["ws_clients"])]
+    log(f"connecting {len(viewers)} WebSocket viewers")
+    connect_samples = []
+    for viewer in viewers:
+        try:
+            connect_samples.append((await viewer.connect(), not viewer.closed))
+        except asyncio.TimeoutError:
+            connect_samples.append((10.0, False))
+
+    samples = {"scan_by_token": [], "status": [], "events": []}
+    status_codes = {route: Counter() for route in samples}
+    accepted = Counter()
+    scanning = True
+
+    async def timed(route, method, path, body=None, query_string=""):
+        start = time.perf_counter()
+        status, payload = await http_request(app, method, path, body, query_string)
+        samples[route].append((time.perf_counter() - start, status is not None and status < 500))
+        status_codes[route][str(status)] += 1
+        return status
+
+    async def scanner(index):
+        event = events[index % len(events)]
+        for _ in range(config["scans_per_scanner"]):
+            status = await timed("scan_by_token", "POST", "/api/api/scan-by-token/", {"token": event.qr_token})
+            if status == 200:
+                accepted[event.pk] += 1
+
+    async def dashboard(index):
+        event = events[index % len(events)]
+        while scanning:
+            await timed("status", "GET", "/api/status/", query_string=f"event_id={event.pk}")
+            await timed("events", "GET", "/api/events/")
+            await asyncio.sleep(config["poll_interval"])
+
+    log(f"running {config['scanners']} scanners and {config['dashboards']} dashboards")
+    started = time.perf_counter()
+    pollers = [asyncio.ensure_future(dashboard(i)) for i in range(config["dashboards"])]
+    await asyncio.gather(*(scanner(i) for i in range(config["scanners"])))
+    scan_elapsed = time.perf_counter() - started
+    scanning = False
+    await asyncio.gather(*pollers)
+    poll_elapsed = time.perf_counter() - started
+
+    await sync_to_async(tasks.get_task_queue().drain, thread_sensitive=False)()
+    await sync_to_async(flush_headcounts)()
+    recorded = await sync_to_async(
+        lambda: dict(EventState.objects.filter(event__in=events).values_list("event_id", "headcount"))
+    )()
+    scans_done = time.perf_counter()
+
+    # Coalescing holds the trailing frame for up to one tick; give viewers time to converge.
+    def converged():
+        return [v for v in viewers if not v.closed and v.headcount == accepted[v.event_id]]
+
+    while len(converged()) < len(viewers) and time.perf_counter() - scans_done < config["settle"]:
+        await asyncio.sleep(0.05)
+    on_time = converged()
+    last_frame = max((v.last_frame_at for v in on_time if v.last_frame_at), default=scans_done)
+
+    for viewer in viewers:
+        await viewer.close()
+
+    per_event = {
+        str(e.pk): {"expected": accepted[e.pk], "recorded": recorded.get(e.pk, 0)} for e in events
+    }
+    frames = sum(v.frames for v in viewers)
+    return {
+        "elapsed_seconds": round(poll_elapsed, 3),
+        "http": {
+            "scan_by_token": latency_summary(samples["scan_by_token"], scan_elapsed),
+            "status": latency_summary(samples["status"], poll_elapsed),
+            "events": latency_summary(samples["events"], poll_elapsed),
+        },
+        "status_codes": {route: dict(codes) for route, codes in status_codes.items()},
+        "websocket": {
+            "clients": len(viewers),
+            "connect": latency_summary(connect_samples, None),
+            "frames": frames,
+            "frames_per_second": round(frames / poll_elapsed, 1) if poll_elapsed else None,
+            "converged": len(on_time),
+            "stale": len(viewers) - len(on_time),
+            "convergence_seconds": round(max(0.0, last_frame - scans_done), 3),
+        },
+        "correctness": {
+            "per_event": per_event,
+            "expected_total": sum(accepted.values()),
+            "recorded_total": sum(recorded.values()),
+            "lost_counts": sum(accepted.values()) - sum(recorded.get(e.pk, 0) for e in events),
+        },
+    }
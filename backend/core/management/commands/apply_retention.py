@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.retention import apply_retention
+
+
+class Command(BaseCommand):
+    help = (
+        "Archive raw headcount snapshots older than the retention window, compact them to one "
+        "reading per bucket and drop expired minute rollups (once, or every --interval seconds)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--raw-days", type=float, help="Keep full-resolution snapshots this many days.")
+        parser.add_argument("--compact-seconds", type=int, help="Bucket width of compacted snapshots.")
+        parser.add_argument("--minute-rollup-days", type=float, help="Keep minute rollups this many days.")
+        parser.add_argument("--archive-dir", help="Directory for archive files.")
+        parser.add_argument("--format", choices=["auto", "parquet", "csv"], help="Archive file format.")
+        parser.add_argument("--no-archive", action="store_true", help="Compact without writing archives.")
+        parser.add_argument("--chunk-size", type=int, help="Snapshots per archive file and delete transaction.")
+        parser.add_argument("--pause", type=float, help="Seconds to sleep between chunks.")
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0,
+            help="Keep running and apply retention every N seconds. 0 (default) runs once and exits.",
+        )
+
+    def handle(self, *args, **options):
+        overrides = {
+            "RAW_DAYS": options["raw_days"],
+            "COMPACT_SECONDS": options["compact_seconds"],
+            "MINUTE_ROLLUP_DAYS": options["minute_rollup_days"],
+            "ARCHIVE_DIR": options["archive_dir"],
+            "FORMAT": options["format"],
+            "CHUNK_SIZE": options["chunk_size"],
+            "PAUSE": options["pause"],
+        }
+        while True:
+            start = time.perf_counter()
+            stats = apply_retention(archive=not options["no_archive"], log=self.stdout.write, **overrides)
+            self.stdout.write(
+                f"Archived {stats['archived']} snapshot(s) to {len(stats['files'])} file(s), "
+                f"deleted {stats['deleted']}, kept {stats['kept']} compacted, "
+                f"dropped {stats['minute_rollups_deleted']} minute rollup(s) "
+                f"in {time.perf_counter() - start:.2f}s."
+            )
+            if not options["interval"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,45 @@
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand
+
+from core.features import HourlyRingBuffer, WINDOW_HOURS, features_from_buffer, pandas_feature_frame
+
+
+class Command(BaseCommand):
+    help = "Microbenchmark the NumPy ring-buffer features against the reference pandas pipeline."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--per-hour", type=int, default=60, help="Snapshots per hour in the 49h window.")
+        parser.add_argument("--repeat", type=int, default=200, help="Feature computations to time.")
+
+    def handle(self, *args, **options):
+        per_hour, repeat = options["per_hour"], options["repeat"]
+        start = datetime(2025, 9, 5, tzinfo=dt_timezone.utc)
+        rows = [
+            (start + timedelta(seconds=i * 3600 // per_hour), 1000 + (i * 37) % 500)
+            for i in range(WINDOW_HOURS * per_hour)
+        ]
+        start_hour = int(start.timestamp()) // 3600
+
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            pandas_feature_frame(rows).tail(1)
+        pandas_s = (time.perf_counter() - t0) / repeat
+
+        buffer = HourlyRingBuffer(WINDOW_HOURS + 1)
+        t0 = time.perf_counter()
+        for ts, value in rows:
+            buffer.add(int(ts.timestamp()) // 3600, value)
+        add_s = (time.perf_counter() - t0) / len(rows)
+
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            features_from_buffer(buffer, start_hour)
+        numpy_s = (time.perf_counter() - t0) / repeat
+
+        self.stdout.write(f"{len(rows)} snapshots in window")
+        self.stdout.write(f"pandas pipeline:    {pandas_s * 1e3:8.3f} ms/prediction")
+        self.stdout.write(f"ring buffer:        {numpy_s * 1e3:8.3f} ms/prediction")
+        self.stdout.write(f"incremental add:    {add_s * 1e6:8.3f} us/snapshot")
+        self.stdout.write(f"speedup:            {pandas_s / numpy_s:8.1f}x")
@@ -0,0 +1,65 @@
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand
+
+from core.aggregation import bucket_snapshots
+from core.models import Event, HeadcountSnapshot
+
+
+def python_buckets(event_id, interval):
+    """The previous approach: load every snapshot and keep the last per bucket in Python."""
+    buckets = {}
+    for snap in HeadcountSnapshot.objects.filter(event_id=event_id).order_by("timestamp"):
+        buckets[int(snap.timestamp.timestamp()) // interval * interval] = snap.headcount
+    return sorted(buckets.items())
+
+
+class Command(BaseCommand):
+    help = "Benchmark SQL heatmap bucketing against loading snapshots into Python."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--snapshots", type=int, default=1_000_000, help="Snapshots to generate.")
+        parser.add_argument("--interval", type=int, default=300, help="Bucket width in seconds.")
+        parser.add_argument("--spacing", type=float, default=1.0, help="Seconds between generated snapshots.")
+        parser.add_argument("--skip-python", action="store_true", help="Only time the SQL path.")
+        parser.add_argument("--keep", action="store_true", help="Keep the benchmark event and its snapshots.")
+
+    def handle(self, *args, **options):
+        total, interval = options["snapshots"], options["interval"]
+        event = Event.objects.create(name="benchmark-heatmap")
+        start = datetime(2025, 9, 1, tzinfo=dt_timezone.utc)
+        try:
+            t0 = time.perf_counter()
+            batch = 20000
+            for offset in range(0, total, batch):
+                HeadcountSnapshot.objects.bulk_create([
+                    HeadcountSnapshot(
+                        event=event,
+                        headcount=1000 + (i * 37) % 500,
+                        source="qr",
+                        timestamp=start + timedelta(seconds=i * options["spacing"]),
+                    )
+                    for i in range(offset, min(offset + batch, total))
+                ])
+            self.stdout.write(f"inserted {total} snapshots in {time.perf_counter() - t0:.1f}s")
+
+            t0 = time.perf_counter()
+            rows = bucket_snapshots(event.pk, interval, limit=None)
+            sql_s = time.perf_counter() - t0
+            self.stdout.write(f"SQL buckets:    {sql_s:8.3f}s  ({len(rows)} buckets, last/avg/max/min)")
+
+            if not options["skip_python"]:
+                t0 = time.perf_counter()
+                reference = python_buckets(event.pk, interval)
+                python_s = time.perf_counter() - t0
+                self.stdout.write(f"Python buckets: {python_s:8.3f}s  ({len(reference)} buckets, last only)")
+                self.stdout.write(f"speedup:        {python_s / sql_s:8.1f}x")
+                mismatched = sum(
+                    1 for row, (bucket, last) in zip(rows, reference)
+                    if int(row["bucket"].timestamp()) != bucket or row["last"] != last
+                )
+                self.stdout.write(f"mismatched buckets: {mismatched + abs(len(rows) - len(reference))}")
+        finally:
+            if not options["keep"]:
+                event.delete()
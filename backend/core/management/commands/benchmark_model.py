@@ -0,0 +1,88 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.ml import COMPILED_MODEL_PATH, MODEL_PATH
+
+# Run in a fresh interpreter per sample, so imports and RSS are a worker's cold start.
+COLD_START = """
+import json, resource, sys, time
+t0 = time.perf_counter()
+import numpy as np
+sys.path.insert(0, {backend!r})
+baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if {compiled!r}:
+    from core.compiled_model import load
+    model = load({path!r})
+else:
+    import joblib
+    model = joblib.load({path!r})
+model.predict(np.zeros((1, {n_features})))
+print(json.dumps({{
+    "seconds": time.perf_counter() - t0,
+    "rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "model_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline,
+    "modules": len(sys.modules),
+}}))
+"""
+
+
+def cold_start(path, compiled, n_features):
+    code = COLD_START.format(backend=str(settings.BASE_DIR), compiled=compiled, path=str(path), n_features=n_features)
+    out = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True)
+    return json.loads(out.stdout)
+
+
+class Command(BaseCommand):
+    help = "Compare worker cold start, RSS and predict latency of the joblib model and its compiled export."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--model", default=MODEL_PATH, help="Trained joblib model.")
+        parser.add_argument("--compiled", default=COMPILED_MODEL_PATH, help="Compiled .npz export.")
+        parser.add_argument("--repeat", type=int, default=5, help="Cold starts per format.")
+        parser.add_argument("--batch", type=int, default=1000, help="Rows per batched predict.")
+
+    def handle(self, *args, **options):
+        import joblib
+        from core.compiled_model import load
+
+        for path in (options["model"], options["compiled"]):
+            if not os.path.exists(path):
+                raise CommandError(f"{path} not found (train_model / export_model first)")
+        formats = {"joblib": (options["model"], False), "compiled": (options["compiled"], True)}
+        models = {"joblib": joblib.load(options["model"]), "compiled": load(options["compiled"])}
+        n_features = len(models["compiled"].feature_names_in_)
+        rng = np.random.default_rng(0)
+        X = rng.uniform(0, 50_000, size=(options["batch"], n_features))
+
+        error = float(np.max(np.abs(models["joblib"].predict(X) - models["compiled"].predict(X))))
+        self.stdout.write(f"max |difference| over {len(X)} rows: {error:.3g}")
+        self.stdout.write(f"{'':10} {'file KB':>9} {'cold start':>11} {'RSS MB':>8} {'+model MB':>10} "
+                          f"{'modules':>8} {'1 row':>9} {f'{len(X)} rows':>10}")
+        for name, (path, compiled) in formats.items():
+            runs = [cold_start(path, compiled, n_features) for _ in range(options["repeat"])]
+            model = models[name]
+            single = _per_call(lambda: model.predict(X[:1]))
+            batch = _per_call(lambda: model.predict(X), number=20)
+            self.stdout.write(
+                f"{name:10} {os.path.getsize(path) / 1024:9.0f} "
+                f"{statistics.median(r['seconds'] for r in runs) * 1e3:9.1f}ms "
+                f"{statistics.median(r['rss_kb'] for r in runs) / 1024:8.1f} "
+                f"{statistics.median(r['model_kb'] for r in runs) / 1024:10.1f} "
+                f"{runs[0]['modules']:8d} {single * 1e6:7.0f}us {batch * 1e3:8.2f}ms"
+            )
+
+
+def _per_call(fn, number=200):
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(number):
+        fn()
+    return (time.perf_counter() - t0) / number
@@ -0,0 +1,53 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+from core.counters import flush_headcounts
+from core.models import Event
+
+
+class Command(BaseCommand):
+    help = "Compare per-scan POST /api/api/scan/ against the batched /api/api/scan/bulk/ endpoint."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scans", type=int, default=2000, help="Total scans to send per path.")
+        parser.add_argument("--events", type=int, default=3, help="Number of throwaway events to spread scans over.")
+        parser.add_argument("--batch", type=int, default=200, help="Scans per bulk request.")
+        parser.add_argument("--keep", action="store_true", help="Keep the benchmark events instead of deleting them.")
+
+    def handle(self, *args, **options):
+        total, batch = options["scans"], options["batch"]
+        events = [Event.objects.create(name=f"benchmark-scan-{i}") for i in range(options["events"])]
+        client = Client(HTTP_HOST="localhost")
+        try:
+            start = time.perf_counter()
+            for i in range(total):
+                client.post(
+                    "/api/api/scan/",
+                    json.dumps({"event_id": events[i % len(events)].id}),
+                    content_type="application/json",
+                )
+            flush_headcounts()
+            single = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for offset in range(0, total, batch):
+                scans = [
+                    {"event_id": events[i % len(events)].id}
+                    for i in range(offset, min(offset + batch, total))
+                ]
+                client.post("/api/api/scan/bulk/", json.dumps({"scans": scans}), content_type="application/json")
+            bulk = time.perf_counter() - start
+
+            counts = {e.id: e.snapshots.order_by("-timestamp").first().headcount for e in events}
+            self.stdout.write(f"per-scan: {total} scans in {single:.3f}s ({total / single:.0f} scans/s)")
+            self.stdout.write(f"bulk:     {total} scans in {bulk:.3f}s ({total / bulk:.0f} scans/s, batch={batch})")
+            self.stdout.write(f"speedup:  {single / bulk:.1f}x")
+            expected = 2 * total
+            lost = expected - sum(counts.values())
+            self.stdout.write(f"final headcounts: {counts} (lost counts: {lost})")
+        finally:
+            if not options["keep"]:
+                Event.objects.filter(pk__in=[e.id for e in events]).delete()
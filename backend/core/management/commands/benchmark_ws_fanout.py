@@ -0,0 +1,79 @@
+import asyncio
+import json
+import time
+
+from asgiref.testing import ApplicationCommunicator
+from channels.layers import InMemoryChannelLayer, channel_layers
+from channels.routing import URLRouter
+from django.core.management.base import BaseCommand
+
+from core.consumers import headcount_frame
+from core.fanout import apublish
+from core.fastjson import dumps
+from core.routing import websocket_urlpatterns
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive N in-process EventConsumers through an in-memory channel layer and time "
+        "group fan-out with per-socket encoding versus a prebuilt frame."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=500, help="Sockets subscribed to one event.")
+        parser.add_argument("--messages", type=int, default=50, help="Group messages to broadcast.")
+
+    def handle(self, *args, **options):
+        # Published straight to the layer (no producer coalescing), so every message reaches every socket.
+        asyncio.run(self._run(options["clients"], options["messages"]))
+
+    async def _run(self, clients, messages):
+        layer = InMemoryChannelLayer(capacity=messages + 10)
+        channel_layers.set("default", layer)
+        app = URLRouter(websocket_urlpatterns)
+        sockets = []
+        try:
+            for _ in range(clients):
+                comm = ApplicationCommunicator(app, {
+                    "type": "websocket", "path": "/ws/event/1/", "query_string": b"",
+                    "headers": [], "subprotocols": [],
+                })
+                await comm.send_input({"type": "websocket.connect"})
+                await comm.receive_output(5)  # accept
+                await comm.receive_output(5)  # connection_established
+                sockets.append(comm)
+
+            results = {}
+            for label, prebuilt in (("per-socket encode", False), ("prebuilt frame", True)):
+                t0 = time.perf_counter()
+                for i in range(messages):
+                    data = {"headcount": i, "timestamp": None, "source": "qr", "event_id": 1}
+                    message = {"type": "headcount_update", "data": data}
+                    if prebuilt:
+                        message["frame"] = dumps(headcount_frame(data))
+                    await apublish(1, message, layer)
+                    for comm in sockets:
+                        await comm.receive_output(5)
+                results[label] = time.perf_counter() - t0
+        finally:
+            for comm in sockets:
+                await comm.send_input({"type": "websocket.disconnect", "code": 1000})
+            for comm in sockets:
+                await comm.wait(5)
+            channel_layers.backends.pop("default", None)
+
+        frames = clients * messages
+        self.stdout.write(f"{clients} sockets x {messages} messages = {frames} frames")
+        for label, seconds in results.items():
+            self.stdout.write(
+                f"{label:18s} {seconds:8.3f} s  {frames / seconds:10.0f} frames/s  "
+                f"{seconds / frames * 1e6:7.2f} us/frame"
+            )
+        data = {"headcount": 1234, "timestamp": "2025-09-05T18:00:00+00:00", "source": "qr", "event_id": 1}
+        for label, encode in (("json.dumps", json.dumps), ("fastjson.dumps", dumps)):
+            t0 = time.perf_counter()
+            for _ in range(frames):
+                encode(headcount_frame(data))
+            self.stdout.write(f"{label:18s} {(time.perf_counter() - t0) / frames * 1e6:8.2f} us/frame encode")
+        base = results["per-socket encode"]
+        self.stdout.write(f"speedup:           {base / results['prebuilt frame']:8.2f}x")
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.ml import FORECAST_HORIZONS
+from core.models import Event
+from core.services import active_events, refresh_forecasts
+
+
+class Command(BaseCommand):
+    help = "Precompute multi-horizon forecasts into the Forecast table (once, or every --interval seconds)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--horizons", type=int, default=FORECAST_HORIZONS, help="Hours ahead to forecast.")
+        parser.add_argument("--event", type=int, action="append", help="Only these event ids (repeatable).")
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0,
+            help="Keep running and refresh every N seconds. 0 (default) runs once and exits.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            events = Event.objects.filter(pk__in=options["event"]) if options["event"] else active_events()
+            start = time.perf_counter()
+            rows = refresh_forecasts(events, options["horizons"])
+            self.stdout.write(f"Wrote {len(rows)} forecast(s) in {time.perf_counter() - start:.2f}s.")
+            if not options["interval"]:
+                return
+            time.sleep(options["interval"])
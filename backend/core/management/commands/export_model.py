@@ -0,0 +1,35 @@
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from core.ml import COMPILED_MODEL_PATH, DEFAULT_MODEL_FEATURES, MODEL_PATH
+from core.training.export import export_model
+
+
+class Command(BaseCommand):
+    help = "Compile the joblib crowd model into the NumPy-only .npz that core.ml serves."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--model", default=MODEL_PATH, help="Trained joblib model to compile.")
+        parser.add_argument("--output", default=COMPILED_MODEL_PATH, help="Compiled .npz to write.")
+        parser.add_argument("--check-rows", type=int, default=10_000,
+                            help="Random rows to compare predictions on before writing (0 to skip).")
+        parser.add_argument("--tolerance", type=float, default=1e-3,
+                            help="Largest absolute prediction difference accepted.")
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(0)
+        # Hour-scale values for the calendar features, headcount-scale for the rest,
+        # so the check reaches both sides of most splits.
+        X = rng.uniform(0, 50_000, size=(options["check_rows"], len(DEFAULT_MODEL_FEATURES)))
+        X[:, :15] = rng.uniform(-1, 24, size=(len(X), 15))
+        try:
+            compiled, max_error = export_model(options["model"], options["output"], DEFAULT_MODEL_FEATURES,
+                                               X, tolerance=options["tolerance"])
+        except (TypeError, ValueError) as exc:
+            raise CommandError(str(exc)) from exc
+        self.stdout.write(
+            f"{compiled.source}: {compiled.n_trees} trees, {len(compiled.value)} nodes, depth {compiled.depth}"
+        )
+        if max_error is not None:
+            self.stdout.write(f"max |difference| over {len(X)} rows: {max_error:.3g}")
+        self.stdout.write(f"Wrote {options['output']}")
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.counters import LocalCounter, flush_headcounts, get_counter
+
+
+class Command(BaseCommand):
+    help = (
+        "Flush running scan counters into HeadcountSnapshot rows (once, or every --interval seconds). "
+        "Needs a shared counter backend; LocalCounter totals are flushed by the worker itself."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0,
+            help="Keep running and flush every N seconds. 0 (default) flushes once and exits.",
+        )
+
+    def handle(self, *args, **options):
+        if isinstance(get_counter(), LocalCounter):
+            raise CommandError(
+                "HEADCOUNT_COUNTER uses LocalCounter, whose totals live in each server process; "
+                "those processes flush them on a timer and at exit."
+            )
+        interval = options["interval"]
+        while True:
+            snaps = flush_headcounts()
+            if snaps or not interval:
+                self.stdout.write(f"Flushed {len(snaps)} event counter(s).")
+            if not interval:
+                return
+            time.sleep(interval)
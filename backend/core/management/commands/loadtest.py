@@ -0,0 +1,63 @@
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand
+
+from core.loadtest import compare_results, load_results, run_load_test, save_results
+
+
+class Command(BaseCommand):
+    help = (
+        "In-process load test of scan_by_token, dashboard polling and WebSocket fan-out "
+        "against crowd_mgmt.asgi. Writes results as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--events", type=int, default=3, help="Throwaway events to spread load over.")
+        parser.add_argument("--scanners", type=int, default=20, help="Concurrent gate scanners.")
+        parser.add_argument("--scans", type=int, default=50, help="Scans per scanner.")
+        parser.add_argument("--dashboards", type=int, default=5, help="Concurrent dashboards polling /status/ and /events/.")
+        parser.add_argument("--poll-interval", type=float, default=0.05, help="Seconds between dashboard polls.")
+        parser.add_argument("--ws-clients", type=int, default=500, help="WebSocket viewers.")
+        parser.add_argument("--settle", type=float, default=5.0, help="Seconds to wait for viewers to converge.")
+        parser.add_argument("--output", help="Results path (default loadtest-<UTC timestamp>.json).")
+        parser.add_argument("--compare", help="Earlier results file to compare against.")
+        parser.add_argument("--keep", action="store_true", help="Keep the load-test events instead of deleting them.")
+
+    def handle(self, *args, **options):
+        results = run_load_test(
+            events=options["events"],
+            scanners=options["scanners"],
+            scans_per_scanner=options["scans"],
+            dashboards=options["dashboards"],
+            poll_interval=options["poll_interval"],
+            ws_clients=options["ws_clients"],
+            settle=options["settle"],
+            keep=options["keep"],
+            log=self.stdout.write,
+        )
+        path = options["output"] or f"loadtest-{datetime.now(dt_timezone.utc):%Y%m%dT%H%M%SZ}.json"
+        save_results(results, path)
+
+        for route, stats in results["http"].items():
+            if not stats["count"]:
+                continue
+            self.stdout.write(
+                f"{route:14s} n={stats['count']:6d} err={stats['errors']:4d} "
+                f"p50={stats['p50_ms']:8.2f}ms p95={stats['p95_ms']:8.2f}ms p99={stats['p99_ms']:8.2f}ms "
+                f"{stats['throughput_rps']:8.1f} req/s"
+            )
+        ws = results["websocket"]
+        self.stdout.write(
+            f"websocket      clients={ws['clients']} frames={ws['frames']} converged={ws['converged']} "
+            f"stale={ws['stale']} convergence={ws['convergence_seconds']}s"
+        )
+        correctness = results["correctness"]
+        self.stdout.write(
+            f"scans accepted={correctness['expected_total']} recorded={correctness['recorded_total']} "
+            f"lost={correctness['lost_counts']}"
+        )
+        if options["compare"]:
+            for route, metrics in compare_results(results, load_results(options["compare"])).items():
+                for metric, (before, after, change) in metrics.items():
+                    self.stdout.write(f"{route:14s} {metric:15s} {before:10.2f} -> {after:10.2f} ({change:+.1f}%)")
+        self.stdout.write(f"results written to {path}")
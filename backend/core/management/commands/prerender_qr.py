@@ -0,0 +1,45 @@
+import os
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.text import slugify
+
+from core.models import Event
+from core.qr_cache import FORMATS, cached_qr, config
+
+
+class Command(BaseCommand):
+    help = "Render every event's scan QR code to files for gate signage (and warm the QR cache)."
+
+    def add_arguments(self, parser):
+        conf = config()
+        parser.add_argument("--format", action="append", choices=FORMATS,
+                            help=f"Image type (repeatable; default {conf['FORMAT']}).")
+        parser.add_argument("--box-size", type=int, default=None, help="Pixels per QR module (default from QR_CODES).")
+        parser.add_argument("--border", type=int, default=None, help="Quiet-zone width in modules.")
+        parser.add_argument("--event", type=int, action="append", help="Only this event id (repeatable).")
+        parser.add_argument("--output-dir", default=conf.get("SIGNAGE_DIR"), help="Directory to write images to.")
+
+    def handle(self, *args, **options):
+        if not options["output_dir"]:
+            raise CommandError("--output-dir is required (or set QR_CODES['SIGNAGE_DIR'])")
+        output = Path(options["output_dir"])
+        output.mkdir(parents=True, exist_ok=True)
+        formats = options["format"] or [config()["FORMAT"]]
+
+        events = Event.objects.order_by("pk")
+        if options["event"]:
+            events = events.filter(pk__in=options["event"])
+        written = unchanged = 0
+        for pk, name, token in events.values_list("pk", "name", "qr_token").iterator():
+            for fmt in formats:
+                body, _, _ = cached_qr(token, fmt, options["box_size"], options["border"])
+                path = output / f"event-{pk}-{slugify(name) or 'event'}.{fmt}"
+                if path.exists() and path.read_bytes() == body:
+                    unchanged += 1
+                    continue
+                tmp = path.with_name(path.name + ".tmp")
+                tmp.write_bytes(body)
+                os.replace(tmp, path)
+                written += 1
+        self.stdout.write(f"Wrote {written} image(s), {unchanged} unchanged, in {output}")
@@ -0,0 +1,42 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from core.startup import ENTRY_POINTS, config, profile_imports
+
+
+class Command(BaseCommand):
+    help = "Report import time per module for a cold start of the ASGI and WSGI entry points."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--module", action="append", choices=ENTRY_POINTS,
+                            help="Entry point to profile (repeatable; default: both).")
+        parser.add_argument("--top", type=int, default=25, help="Modules to list per entry point.")
+        parser.add_argument("--sort", choices=("cumulative", "self"), default="cumulative")
+        parser.add_argument("--no-urls", action="store_true", help="Do not import the URLconf.")
+        parser.add_argument("--repeat", type=int, default=3, help="Cold starts per entry point; the fastest is kept.")
+        parser.add_argument("--json", action="store_true", help="Print the full profiles as JSON.")
+
+    def handle(self, *args, **options):
+        budget = config()["BUDGET_SECONDS"]
+        profiles = []
+        for module in options["module"] or ENTRY_POINTS:
+            runs = [profile_imports(module, urls=not options["no_urls"]) for _ in range(max(1, options["repeat"]))]
+            profiles.append(min(runs, key=lambda run: run["seconds"]))
+        if options["json"]:
+            self.stdout.write(json.dumps(profiles, indent=2))
+            return
+
+        column = 1 if options["sort"] == "self" else 2
+        for profile in profiles:
+            over = " OVER BUDGET" if profile["seconds"] > budget else ""
+            self.stdout.write(
+                f"{profile['module']}: {profile['seconds'] * 1e3:.0f} ms importing "
+                f"({profile['process_seconds'] * 1e3:.0f} ms with interpreter start-up), "
+                f"{len(profile['imports'])} modules, budget {budget * 1e3:.0f} ms{over}"
+            )
+            if profile["heavy"]:
+                self.stdout.write(f"  heavy modules loaded: {', '.join(profile['heavy'])}")
+            self.stdout.write(f"  {'self ms':>9} {'cumul. ms':>10}  module")
+            for name, self_us, cumulative_us, _ in sorted(profile["imports"], key=lambda row: -row[column])[:options["top"]]:
+                self.stdout.write(f"  {self_us / 1e3:9.1f} {cumulative_us / 1e3:10.1f}  {name}")
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Event, EventState
+
+
+class Command(BaseCommand):
+    help = "Backfill or repair the denormalized EventState rows from HeadcountSnapshot."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--event", type=int, action="append", help="Only rebuild these event ids (repeatable).")
+
+    def handle(self, *args, **options):
+        events = Event.objects.all()
+        if options["event"]:
+            events = events.filter(pk__in=options["event"])
+        rebuilt = EventState.rebuild(events)
+        self.stdout.write(f"Rebuilt state for {rebuilt} event(s).")
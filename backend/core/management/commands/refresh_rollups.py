@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.rollups import refresh_rollups
+
+
+class Command(BaseCommand):
+    help = "Fold new headcount snapshots into the minute/hour rollup tables (once, or every --interval seconds)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=None, help="Snapshots per transaction.")
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0,
+            help="Keep running and refresh every N seconds. 0 (default) runs once and exits.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            start = time.perf_counter()
+            folded, mark = refresh_rollups(options["batch_size"])
+            self.stdout.write(
+                f"Folded {folded} snapshot(s) up to id {mark} in {time.perf_counter() - start:.2f}s."
+            )
+            if not options["interval"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,29 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.retention import restore_archive
+
+
+class Command(BaseCommand):
+    help = "Reinsert archived headcount snapshots (files written by apply_retention). Existing ids are skipped."
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", help="Archive files or directories of them.")
+
+    def handle(self, *args, **options):
+        files = []
+        for raw in options["paths"]:
+            path = Path(raw)
+            if path.is_dir():
+                files.extend(sorted(p for p in path.iterdir() if p.name.endswith((".parquet", ".csv.gz"))))
+            elif path.exists():
+                files.append(path)
+            else:
+                raise CommandError(f"{path} does not exist")
+        total = 0
+        for path in files:
+            count = restore_archive(path)
+            total += count
+            self.stdout.write(f"  {path.name}: {count} row(s)")
+        self.stdout.write(f"Restored {total} snapshot row(s) from {len(files)} file(s).")
@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.ml import DEFAULT_MODEL_FEATURES, MODEL_PATH
+from core.training.pipeline import ESTIMATORS, train
+
+
+class Command(BaseCommand):
+    help = "Train the crowd model from the model_data CSVs and write ml_models/crowd_predictor.joblib."
+
+    def add_arguments(self, parser):
+        config = getattr(settings, "ML_TRAINING", {})
+        parser.add_argument("--data-dir", default=config.get("DATA_DIR"), help="Directory of dataset CSVs.")
+        parser.add_argument("--cache-dir", default=config.get("CACHE_DIR"), help="Feature matrix cache directory.")
+        parser.add_argument("--output", default=MODEL_PATH, help="Model file to write.")
+        parser.add_argument("--estimator", choices=ESTIMATORS, default="gbm")
+        parser.add_argument("--n-estimators", type=int, help="Trees to fit.")
+        parser.add_argument("--max-depth", type=int, help="Maximum tree depth.")
+        parser.add_argument("--learning-rate", type=float, help="Boosting learning rate (gbm only).")
+        parser.add_argument("--no-cache", action="store_true", help="Rebuild features without the cache.")
+
+    def handle(self, *args, **options):
+        params = {
+            name: options[name]
+            for name in ("n_estimators", "max_depth", "learning_rate")
+            if options[name] is not None
+        }
+        report = train(
+            options["data_dir"],
+            options["output"],
+            options["cache_dir"],
+            DEFAULT_MODEL_FEATURES,
+            estimator=options["estimator"],
+            use_cache=not options["no_cache"],
+            log=self.stdout.write,
+            **params,
+        )
+        mae = report["mae"]
+        self.stdout.write(
+            f"{report['estimator']}: validation MAE {mae['validation']:,.0f}, test MAE {mae['test']:,.0f} "
+            f"({report['rows']['train']} training rows)"
+        )
+        seconds, memory = report["seconds"], report["memory"]
+        rss = f"{memory['max_rss_mb']} MB" if memory["max_rss_mb"] is not None else "n/a"
+        self.stdout.write(
+            f"Trained in {seconds['total']:.2f}s (fit {seconds['fit']:.2f}s), "
+            f"peak traced memory {memory['peak_traced_mb']} MB, max RSS {rss}."
+        )
+        self.stdout.write(f"Wrote {options['output']}")
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.6 on 2026-10-17 02:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_event_state(apps, schema_editor):
+    Event = apps.get_model('core', 'Event')
+    EventState = apps.get_model('core', 'EventState')
+    HeadcountSnapshot = apps.get_model('core', 'HeadcountSnapshot')
+    for event in Event.objects.iterator():
+        last = HeadcountSnapshot.objects.filter(event=event).order_by('-timestamp').first()
+        if last is None:
+            continue
+        if last.headcount >= event.crowded_threshold:
+            status = 'Red'
+        elif last.headcount >= event.safe_threshold:
+            status = 'Yellow'
+        else:
+            status = 'Green'
+        EventState.objects.create(
+            event=event, headcount=last.headcount, source=last.source,
+            timestamp=last.timestamp, status=status, snapshot_id=last.pk,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_alter_alert_event_alter_event_manager_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventState',
+            fields=[
+                ('event', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='state', serialize=False, to='core.event')),
+                ('headcount', models.IntegerField(default=0)),
+                ('source', models.CharField(blank=True, max_length=10)),
+                ('timestamp', models.DateTimeField(blank=True, null=True)),
+                ('status', models.CharField(default='Green', max_length=10)),
+                ('snapshot_id', models.BigIntegerField(blank=True, null=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_event_state, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.6 on 2026-10-17 02:09
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_event_state'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='alert',
+            name='event',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='alerts', to='core.event'),
+        ),
+        migrations.AlterField(
+            model_name='headcountsnapshot',
+            name='event',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='core.event'),
+        ),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['event', 'resolved', '-created_at'], name='alert_event_open_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['-created_at'], name='alert_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['-date'], name='event_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='headcountsnapshot',
+            index=models.Index(fields=['event', 'timestamp', 'headcount'], name='snapshot_event_ts_idx'),
+        ),
+    ]
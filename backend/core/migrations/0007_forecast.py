@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-17 02:13
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Forecast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('horizon_hours', models.PositiveSmallIntegerField()),
+                ('target_time', models.DateTimeField()),
+                ('predicted_headcount', models.IntegerField()),
+                ('method', models.CharField(max_length=100)),
+                ('model_version', models.CharField(blank=True, max_length=64)),
+                ('generated_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='forecasts', to='core.event')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('event', 'horizon_hours'), name='forecast_event_horizon_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.6 on 2026-10-17 02:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_forecast'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_snapshot_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='HourRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField()),
+                ('samples', models.PositiveIntegerField(default=0)),
+                ('total', models.BigIntegerField(default=0)),
+                ('min_headcount', models.IntegerField()),
+                ('max_headcount', models.IntegerField()),
+                ('last_headcount', models.IntegerField()),
+                ('last_timestamp', models.DateTimeField()),
+                ('event', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.event')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('event', 'bucket'), name='hour_rollup_event_bucket_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='MinuteRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField()),
+                ('samples', models.PositiveIntegerField(default=0)),
+                ('total', models.BigIntegerField(default=0)),
+                ('min_headcount', models.IntegerField()),
+                ('max_headcount', models.IntegerField()),
+                ('last_headcount', models.IntegerField()),
+                ('last_timestamp', models.DateTimeField()),
+                ('event', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.event')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('event', 'bucket'), name='minute_rollup_event_bucket_uniq')],
+            },
+        ),
+    ]
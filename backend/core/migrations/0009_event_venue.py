@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 02:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='venue',
+            field=models.CharField(blank=True, default='', help_text="Key in core.venues.VENUES; gives the model this venue's static features. When set, `date` is read as the festival's first day.", max_length=64),
+        ),
+    ]
@@ -1,127 +1,210 @@
+import logging
 import os
-import joblib
+import time
 import numpy as np
-import pandas as pd
-from datetime import timedelta
 from django.conf import settings
 from django.utils import timezone
 from .models import Event, HeadcountSnapshot
+from .model_registry import ModelRegistry
+from datetime import datetime, timedelta, timezone as dt_timezone
+from .features import feature_engine, feature_row, features_from_buffer, hourly_series
+from .instrumentation import record_ml
+from .venues import event_static
+
+logger = logging.getLogger(__name__)
 
 # Path to your sophisticated model
 MODEL_PATH = os.path.join(settings.BASE_DIR, 'ml_models', 'crowd_predictor.joblib')
+# Its NumPy-only export (core.compiled_model); served instead when present and up to date
+COMPILED_MODEL_PATH = os.path.join(settings.BASE_DIR, 'ml_models', 'crowd_predictor.npz')
+
+# Used when the model does not store feature_names_in_. MUST MATCH TRAINING ORDER.
+DEFAULT_MODEL_FEATURES = [
+    'is_weekend', 'is_special_day', 'weather_impact_score', 'hour_sin', 'hour_cos',
+    'day_sin', 'day_cos', 'hour_x_weekend', 'hour_x_special', 'weather_x_weekend',
+    'is_peak_hour', 'is_late_night', 'festival_progress', 'days_to_visarjan',
+    'is_mumbai', 'headcount_lag_1h', 'headcount_lag_2h', 'headcount_lag_3h',
+    'headcount_lag_6h', 'headcount_lag_12h', 'headcount_lag_24h', 'headcount_lag_48h',
+    'headcount_rolling_mean_3h', 'headcount_rolling_std_3h',
+    'headcount_rolling_mean_6h', 'headcount_rolling_std_6h',
+    'headcount_rolling_mean_12h', 'headcount_rolling_std_12h',
+    'headcount_rolling_mean_24h', 'headcount_rolling_std_24h', 'mandal_encoded'
+]
+
+# Hours ahead covered by the precomputed Forecast table
+FORECAST_HORIZONS = 6
+
+# Loaded once per process; reloaded when the file on disk changes.
+model_registry = ModelRegistry(
+    MODEL_PATH,
+    default_features=DEFAULT_MODEL_FEATURES,
+    mmap_mode=getattr(settings, 'ML_MODEL_MMAP_MODE', None),
+    check_interval=getattr(settings, 'ML_MODEL_CHECK_INTERVAL', 5.0),
+    compiled_path=COMPILED_MODEL_PATH if getattr(settings, 'ML_SERVE_COMPILED', True) else None,
+)
 
 
 def run_ml_predict(event: Event, now: timezone.datetime):
     """
     Predicts crowd count using the sophisticated 'crowd_predictor.joblib' model.
 
-    This function performs the necessary feature engineering by fetching historical
-    data to create lags, rolling means, and other time-based features that the
-    model was trained on.
+    Features (lags, rolling means/stds, time-based features) come from the
+    per-event hourly ring buffers in core.features, which are topped up with
+    only the snapshots written since the previous call. No pandas is involved.
+    Venue context (city, festival day, venue code) comes from core.venues.
 
     If feature engineering fails (e.g., not enough data), it falls back to a
     simple heuristic.
     """
     try:
-        # --- 1. Fetch Historical Data ---
-        # Fetch the last 48 hours of data to build all required features.
-        start_time = now - timedelta(hours=49)
-        snapshots = HeadcountSnapshot.objects.filter(
-            event=event,
-            timestamp__gte=start_time
-        ).order_by('timestamp').values('timestamp', 'count')
-
-        # We need at least a few data points to compute rolling averages.
-        if len(snapshots) < 10:
-            print("Not enough historical data for ML model. Falling back to heuristic.")
-            return _heuristic_prediction(event, now), 'heuristic_insufficient_data'
-
-        df = pd.DataFrame(list(snapshots))
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        df = df.set_index('timestamp').resample('1H').mean().interpolate()  # Resample to hourly freq
-
-        latest_count = df['count'].iloc[-1]
-
-        # --- 2. Feature Engineering ---
-        # Recreate the features exactly as they were created for model training.
-
-        # Time-based features
-        df['hour'] = df.index.hour
-        df['day_of_week'] = df.index.dayofweek
-        df['is_weekend'] = (df['day_of_week'] >= 5).astype(int)
-
-        # Cyclical time features (sine/cosine transformations)
-        df['hour_sin'] = np.sin(2 * np.pi * df['hour'] / 24)
-        df['hour_cos'] = np.cos(2 * np.pi * df['hour'] / 24)
-        df['day_sin'] = np.sin(2 * np.pi * df['day_of_week'] / 7)
-        df['day_cos'] = np.cos(2 * np.pi * df['day_of_week'] / 7)
-
-        # Lag features (past values of headcount)
-        for lag in [1, 2, 3, 6, 12, 24, 48]:
-            df[f'headcount_lag_{lag}h'] = df['count'].shift(lag)
-
-        # Rolling window features (mean/std over past hours)
-        for window in [3, 6, 12, 24]:
-            df[f'headcount_rolling_mean_{window}h'] = df['count'].shift(1).rolling(window=window).mean()
-            df[f'headcount_rolling_std_{window}h'] = df['count'].shift(1).rolling(window=window).std()
-
-        # TODO: Add your logic for placeholder features
-        # These features are specific to your event's context.
-        # You must provide the logic to generate them.
-        df['is_special_day'] = 0  # e.g., check if now.date() is a known festival
-        df['weather_impact_score'] = 0.5  # e.g., fetch from a weather API
-        df['is_mumbai'] = 1  # e.g., based on event location
-        df['festival_progress'] = 0.2  # e.g., day 2 of a 10-day festival
-        df['days_to_visarjan'] = 8  # e.g., calculate from a known date
-        df['mandal_encoded'] = 12  # e.g., a unique ID for the event organizer
-
-        # Interaction features seen in your model file
-        df['hour_x_weekend'] = df['hour'] * df['is_weekend']
-        df['hour_x_special'] = df['hour'] * df['is_special_day']
-        df['weather_x_weekend'] = df['weather_impact_score'] * df['is_weekend']
-        df['is_peak_hour'] = ((df['hour'] >= 17) & (df['hour'] < 21)).astype(int)
-        df['is_late_night'] = ((df['hour'] >= 23) | (df['hour'] < 5)).astype(int)
-
-        # Drop rows with NaN values created by lags/rolling windows
-        df = df.dropna()
-        if df.empty:
-            print("Not enough data after feature engineering. Falling back.")
-            return _heuristic_prediction(event, now), 'heuristic_nan_after_feature_eng'
-
-        # --- 3. Prediction ---
-        model = joblib.load(MODEL_PATH)
-
-        # Get the feature names from the model's memory (if available)
-        try:
-            model_features = model.feature_names_in_
-        except AttributeError:
-            # Manually list features if not stored in model. MUST MATCH TRAINING ORDER.
-            model_features = [
-                'is_weekend', 'is_special_day', 'weather_impact_score', 'hour_sin', 'hour_cos',
-                'day_sin', 'day_cos', 'hour_x_weekend', 'hour_x_special', 'weather_x_weekend',
-                'is_peak_hour', 'is_late_night', 'festival_progress', 'days_to_visarjan',
-                'is_mumbai', 'headcount_lag_1h', 'headcount_lag_2h', 'headcount_lag_3h',
-                'headcount_lag_6h', 'headcount_lag_12h', 'headcount_lag_24h', 'headcount_lag_48h',
-                'headcount_rolling_mean_3h', 'headcount_rolling_std_3h',
-                'headcount_rolling_mean_6h', 'headcount_rolling_std_6h',
-                'headcount_rolling_mean_12h', 'headcount_rolling_std_12h',
-                'headcount_rolling_mean_24h', 'headcount_rolling_std_24h', 'mandal_encoded'
-            ]
+        features, reason = feature_engine.features(event, now, event_static(event, now))
+        if features is None:
+            logger.debug("Not enough data for ML model (%s). Falling back to heuristic.", reason)
+            record_ml("single", reasons=(reason,))
+            return _heuristic_prediction(event, now), reason
 
-        # Prepare the final feature vector for prediction (the most recent complete row)
-        final_features = df[model_features].tail(1)
+        model, model_features = model_registry.get()
 
+        # Feature vector in the model's training order
+        final_features = np.array([[features[name] for name in model_features]], dtype=np.float64)
+
+        start = time.perf_counter()
         prediction = model.predict(final_features)
+        record_ml("single", time.perf_counter() - start, ('model',))
         predicted_count = max(0, int(prediction[0]))
 
         return predicted_count, 'model'
 
     except Exception as e:
-        print(f"ML model prediction failed: {e}. Falling back to heuristic.")
+        logger.warning("ML model prediction failed: %s. Falling back to heuristic.", e)
+        record_ml("single", reasons=('heuristic_error',))
         return _heuristic_prediction(event, now), f'heuristic_error_{e}'
 
 
-def _heuristic_prediction(event: Event, now: timezone.datetime) -> int:
+def run_ml_predict_batch(events, now: timezone.datetime):
+    """
+    Batched run_ml_predict for many events: one snapshot query for all of
+    them, one feature matrix and a single model.predict call.
+
+    `events` should be fetched with select_related('state') so the heuristic
+    fallback can use the latest headcount without extra queries.
+    Returns {event_id: (predicted_count, reason)}.
+    """
+    events = list(events)
+    buffers = feature_engine.buffers_for([event.pk for event in events], now)
+    start_hour = feature_engine.start_hour(now)
+
+    results, rows, row_events = {}, [], []
+    for event in events:
+        features, reason = features_from_buffer(buffers[event.pk], start_hour, event_static(event, now))
+        if features is None:
+            results[event.pk] = (_heuristic_prediction(event, now, _state_headcount(event)), reason)
+        else:
+            rows.append(features)
+            row_events.append(event)
+
+    record_ml("batch", reasons=[reason for _, reason in results.values()])
+    if not rows:
+        return results
+    try:
+        model, model_features = model_registry.get()
+        matrix = np.array([[row[name] for name in model_features] for row in rows], dtype=np.float64)
+        start = time.perf_counter()
+        predictions = model.predict(matrix)
+        record_ml("batch", time.perf_counter() - start, ['model'] * len(rows))
+        for event, prediction in zip(row_events, predictions):
+            results[event.pk] = (max(0, int(prediction)), 'model')
+    except Exception as e:
+        logger.warning("Batch ML prediction failed: %s. Falling back to heuristic.", e)
+        record_ml("batch", reasons=['heuristic_error'] * len(row_events))
+        for event in row_events:
+            results[event.pk] = (_heuristic_prediction(event, now, _state_headcount(event)), f'heuristic_error_{e}')
+    return results
+
+
+def forecast_horizons(events, now: timezone.datetime, horizons: int = FORECAST_HORIZONS):
+    """
+    Forecasts 1..`horizons` hours ahead for every event.
+
+    A multi-output model (e.g. MultiOutputRegressor) is used directly when it
+    returns at least `horizons` columns. A single-output model is rolled
+    forward: step h predicts the row for hour last_hour + h, then its
+    prediction is appended to the hourly series so the next hour's lags
+    include it. Every step is one
+    model.predict call over all events.
+
+    Returns {event_id: [(horizon, target_time, predicted_count, method), ...]}.
+    """
+    events = list(events)
+    buffers = feature_engine.buffers_for([event.pk for event in events], now)
+    start_hour = feature_engine.start_hour(now)
+
+    results, series = {}, {}
+    for event in events:
+        means, reason = hourly_series(buffers[event.pk], start_hour)
+        if means is None:
+            results[event.pk] = _heuristic_horizons(event, now, horizons, reason)
+        else:
+            series[event.pk] = (list(means), buffers[event.pk].last_hour, event)
+
+    if not series:
+        return results
+    try:
+        model, model_features = model_registry.get()
+        pending = {event_id: [] for event_id in series}
+        for step in range(horizons):
+            # A row's target is its own hour, which feature_row never reads:
+            # step 0 describes last_hour + 1, with a placeholder for its value.
+            rows = [
+                feature_row(np.append(values, np.nan), last_hour + 1 + step,
+                            event_static(event, _hour_start(last_hour + 1 + step)))
+                for values, last_hour, event in series.values()
+            ]
+            matrix = np.array([[row[name] for name in model_features] for row in rows], dtype=np.float64)
+            start = time.perf_counter()
+            predictions = np.asarray(model.predict(matrix), dtype=np.float64)
+            record_ml("horizons", time.perf_counter() - start)
+            if step == 0 and predictions.ndim == 2 and predictions.shape[1] >= horizons:
+                for event_id, outputs in zip(series, predictions):
+                    pending[event_id] = [max(0, int(v)) for v in outputs[:horizons]]
+                break
+            predictions = predictions.reshape(len(rows), -1)[:, 0]
+            for event_id, value in zip(series, predictions):
+                series[event_id][0].append(value)
+                pending[event_id].append(max(0, int(value)))
+        for event_id, values in pending.items():
+            last_hour = series[event_id][1]
+            results[event_id] = [
+                (h, _hour_start(last_hour + h), value, 'model')
+                for h, value in enumerate(values, start=1)
+            ]
+    except Exception as e:
+        logger.warning("Multi-horizon ML prediction failed: %s. Falling back to heuristic.", e)
+        for event in events:
+            if event.pk in series:
+                results[event.pk] = _heuristic_horizons(event, now, horizons, f'heuristic_error_{e}')
+    return results
+
+
+def _hour_start(epoch_hour):
+    return datetime.fromtimestamp(epoch_hour * 3600, tz=dt_timezone.utc)
+
+
+def _heuristic_horizons(event, now, horizons, reason):
+    base = now.replace(minute=0, second=0, microsecond=0)
+    latest = _state_headcount(event)
+    return [
+        (h, base + timedelta(hours=h), _heuristic_prediction(event, base + timedelta(hours=h), latest), reason)
+        for h in range(1, horizons + 1)
+    ]
+
+
+def _state_headcount(event):
+    state = event.current_state()
+    return state.headcount if state else None
+
+
+def _heuristic_prediction(event: Event, now: timezone.datetime, latest_headcount=None) -> int:
     """
     A simple time-based heuristic used as a fallback.
     """
@@ -129,9 +212,11 @@ def _heuristic_prediction(event: Event, now: timezone.datetime) -> int:
     base_headcount = 50  # A safe default
 
     # Try to get the latest actual count as a better base
-    latest = HeadcountSnapshot.objects.filter(event=event).order_by('-timestamp').first()
-    if latest:
-        base_headcount = latest.count
+    if latest_headcount is None:
+        latest = HeadcountSnapshot.objects.filter(event=event).order_by('-timestamp').first()
+        latest_headcount = latest.headcount if latest else None
+    if latest_headcount is not None:
+        base_headcount = latest_headcount
 
     if 17 <= hour < 21:  # Peak hours
         return int(base_headcount * 1.2)
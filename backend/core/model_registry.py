@@ -0,0 +1,145 @@
+# backend/core/model_registry.py
+"""
+Process-wide cache for the trained crowd model.
+
+The model is unpickled once per process and reused across requests. The file
+is re-checked at most every `check_interval` seconds: a changed mtime/size
+triggers a content hash, and a changed hash triggers a reload, so replacing
+`crowd_predictor.joblib` on disk is picked up without restarting workers.
+
+When a compiled export (core.compiled_model, `manage.py export_model`)
+exists and is at least as new as the joblib file, it is served instead:
+loading it needs only NumPy. A joblib file written after the export wins,
+so retraining without re-exporting never serves a stale model.
+"""
+import hashlib
+import os
+import threading
+import time
+
+from django.utils import timezone
+
+
+def _file_hash(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModelRegistry:
+    def __init__(self, path, default_features=None, mmap_mode=None, check_interval=5.0, compiled_path=None):
+        self.path = path
+        self.compiled_path = compiled_path
+        self.default_features = list(default_features or [])
+        self.mmap_mode = mmap_mode
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        self._model = None
+        self._features = None
+        self._stat = None
+        self._hash = None
+        self._source = None
+        self._last_check = 0.0
+        self.loaded_at = None
+        self.load_seconds = None
+        self.load_count = 0
+        self.last_error = None
+
+    def get(self):
+        """Return (model, feature_names), loading or reloading if the file changed."""
+        now = time.monotonic()
+        if self._model is not None and now - self._last_check < self.check_interval:
+            return self._model, self._features
+
+        with self._lock:
+            self._last_check = now
+            try:
+                path, st = self._resolve()
+            except OSError as exc:
+                self.last_error = str(exc)
+                if self._model is None:
+                    raise
+                return self._model, self._features  # keep serving the last good model
+
+            stat_key = (path, st.st_mtime_ns, st.st_size)
+            if self._model is not None and stat_key == self._stat:
+                return self._model, self._features
+
+            digest = _file_hash(path)
+            if self._model is not None and digest == self._hash:
+                self._stat = stat_key  # touched, not changed
+                return self._model, self._features
+
+            self._load(path, stat_key, digest)
+            return self._model, self._features
+
+    def _resolve(self):
+        """(path, stat) of the file to serve: the compiled export unless the joblib file is newer."""
+        compiled = None
+        if self.compiled_path:
+            try:
+                compiled = os.stat(self.compiled_path)
+            except OSError:
+                pass
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            if compiled is None:
+                raise
+            return self.compiled_path, compiled
+        if compiled is not None and compiled.st_mtime_ns >= st.st_mtime_ns:
+            return self.compiled_path, compiled
+        return self.path, st
+
+    def _load(self, path, stat_key, digest):
+        start = time.perf_counter()
+        try:
+            if path == self.compiled_path:
+                from .compiled_model import load
+
+                model = load(path)
+            else:
+                import joblib
+
+                model = joblib.load(path, mmap_mode=self.mmap_mode)
+        except Exception as exc:
+            self.last_error = str(exc)
+            if self._model is None:
+                raise
+            return
+        try:
+            features = list(model.feature_names_in_)
+        except AttributeError:
+            features = list(self.default_features)
+
+        self._model, self._features = model, features
+        self._stat, self._hash, self._source = stat_key, digest, path
+        self.load_seconds = time.perf_counter() - start
+        self.loaded_at = timezone.now()
+        self.load_count += 1
+        self.last_error = None
+
+    @property
+    def version(self):
+        """Short content hash of the loaded model file, or None."""
+        return self._hash[:12] if self._hash else None
+
+    def info(self):
+        """Introspection data for the /ml/model/ endpoint."""
+        return {
+            "loaded": self._model is not None,
+            "file": os.path.basename(self._source or self.path),
+            "compiled": self._source is not None and self._source == self.compiled_path,
+            "version": self.version,
+            "sha256": self._hash,
+            "model_class": type(self._model).__name__ if self._model is not None else None,
+            "n_features": len(self._features) if self._features is not None else None,
+            "loaded_at": self.loaded_at,
+            "load_seconds": self.load_seconds,
+            "load_count": self.load_count,
+            "mmap_mode": self.mmap_mode,
+            "last_error": self.last_error,
+        }
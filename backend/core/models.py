@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from django.contrib.auth.models import User
 import uuid
@@ -23,16 +23,67 @@ class Event(models.Model):
         help_text="The user responsible for managing this event."
     )
 
-    qr_token = models.CharField(max_length=64, unique=True, default=default_qr_token)
+    qr_token = models.CharField(max_length=64, unique=True, default=default_qr_token)  # unique => indexed
+
+    venue = models.CharField(
+        max_length=64,
+        blank=True,
+        default='',
+        help_text="Key in core.venues.VENUES; gives the model this venue's static features. "
+                  "When set, `date` is read as the festival's first day."
+    )
+
+    class Meta:
+        indexes = [
+            # Event lists are ordered by -date (PublicEventViewSet, EventViewSet)
+            models.Index(fields=['-date'], name='event_date_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.date})"
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Thresholds may have changed, so re-derive the cached status colour.
+        for state in EventState.objects.filter(event_id=self.pk):
+            status = self.crowd_status(state.headcount)
+            if status != state.status:
+                state.status = status
+                state.save(update_fields=["status"])
+
+    def crowd_status(self, headcount):
+        """Green / Yellow / Red for a headcount against this event's thresholds."""
+        try:
+            if headcount >= self.crowded_threshold:
+                return "Red"
+            elif headcount >= self.safe_threshold:
+                return "Yellow"
+            return "Green"
+        except TypeError:
+            return "Unknown"
+
+    def current_state(self):
+        """The denormalized EventState, or None if no snapshot was ever written."""
+        try:
+            return self.state
+        except EventState.DoesNotExist:
+            return None
+
+
+class HeadcountSnapshotQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        with transaction.atomic():
+            created = super().bulk_create(objs, *args, **kwargs)
+            EventState.apply_snapshots(created)
+        return created
+
+
 class HeadcountSnapshot(models.Model):
     event = models.ForeignKey(
         Event,
         on_delete=models.CASCADE,
-        related_name='snapshots'  # ADDED: For cleaner queries (e.g., event.snapshots.all())
+        related_name='snapshots',  # ADDED: For cleaner queries (e.g., event.snapshots.all())
+        db_index=False  # covered by snapshot_event_ts_idx
     )
     headcount = models.IntegerField()
     source = models.CharField(
@@ -41,20 +92,213 @@ class HeadcountSnapshot(models.Model):
     )
     timestamp = models.DateTimeField(default=timezone.now)
 
+    objects = HeadcountSnapshotQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Every hot path filters by event and orders/ranges by timestamp.
+            # headcount is appended so "latest headcount" and history/feature
+            # fetches can be answered from the index alone.
+            models.Index(fields=['event', 'timestamp', 'headcount'], name='snapshot_event_ts_idx'),
+        ]
+
     def __str__(self):
         return f"{self.event.name} - {self.headcount} ({self.get_source_display()})"
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            EventState.apply_snapshots([self])
+
+
+class EventState(models.Model):
+    """
+    Latest headcount per event, maintained in the same transaction as every
+    HeadcountSnapshot write so list/status views never scan the snapshot table.
+    Rebuild with `manage.py rebuild_event_state`.
+    """
+    event = models.OneToOneField(
+        Event,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='state'
+    )
+    headcount = models.IntegerField(default=0)
+    source = models.CharField(max_length=10, blank=True)
+    timestamp = models.DateTimeField(null=True, blank=True)
+    status = models.CharField(max_length=10, default="Green")
+    snapshot_id = models.BigIntegerField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.event_id}: {self.headcount} ({self.status})"
+
+    @classmethod
+    def apply_snapshots(cls, snapshots):
+        """
+        Move each event's state forward to the newest of `snapshots`.
+        Older snapshots (e.g. backdated sensor readings) never overwrite newer state.
+        """
+        latest = {}
+        for snap in snapshots:
+            current = latest.get(snap.event_id)
+            if current is None or snap.timestamp >= current.timestamp:
+                latest[snap.event_id] = snap
+        if not latest:
+            return
+
+        missing = [
+            event_id for event_id, snap in latest.items()
+            if not HeadcountSnapshot.event.is_cached(snap)
+        ]
+        events = Event.objects.in_bulk(missing) if missing else {}
+
+        for event_id, snap in latest.items():
+            event = snap.event if HeadcountSnapshot.event.is_cached(snap) else events.get(event_id)
+            if event is None:
+                continue
+            values = {
+                "headcount": snap.headcount,
+                "source": snap.source,
+                "timestamp": snap.timestamp,
+                "status": event.crowd_status(snap.headcount),
+                "snapshot_id": snap.pk,
+            }
+            updated = cls.objects.filter(
+                models.Q(timestamp__lte=snap.timestamp) | models.Q(timestamp__isnull=True),
+                event_id=event_id,
+            ).update(**values)
+            if not updated:
+                cls.objects.get_or_create(event_id=event_id, defaults=values)
+
+    @classmethod
+    def rebuild(cls, events=None):
+        """Recompute state from the snapshot table. Returns the number of events rebuilt."""
+        events = Event.objects.all() if events is None else events
+        rebuilt = 0
+        for event in events.iterator():
+            last = HeadcountSnapshot.objects.filter(event=event).order_by("-timestamp").first()
+            if last is None:
+                cls.objects.filter(event=event).delete()
+                continue
+            cls.objects.update_or_create(
+                event=event,
+                defaults={
+                    "headcount": last.headcount,
+                    "source": last.source,
+                    "timestamp": last.timestamp,
+                    "status": event.crowd_status(last.headcount),
+                    "snapshot_id": last.pk,
+                },
+            )
+            rebuilt += 1
+        return rebuilt
+
 class Alert(models.Model):
     event = models.ForeignKey(
         "Event",
         on_delete=models.CASCADE,
-        related_name='alerts'  # ADDED: For cleaner queries (e.g., event.alerts.all())
+        related_name='alerts',  # ADDED: For cleaner queries (e.g., event.alerts.all())
+        db_index=False  # covered by alert_event_open_idx
     )
     alert_type = models.CharField(max_length=50)
     message = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     resolved = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # Open alerts per event, newest first
+            models.Index(fields=['event', 'resolved', '-created_at'], name='alert_event_open_idx'),
+            # AlertViewSet lists all alerts by -created_at
+            models.Index(fields=['-created_at'], name='alert_created_idx'),
+        ]
+
     def __str__(self):
         return f"[{self.alert_type}] {self.message[:50]}"
 
+
+
+class Forecast(models.Model):
+    """
+    Precomputed headcount forecast for one event and horizon, written by
+    `manage.py compute_forecasts`. Only the latest run is kept per horizon.
+    """
+    event = models.ForeignKey(
+        Event,
+        on_delete=models.CASCADE,
+        related_name='forecasts'
+    )
+    horizon_hours = models.PositiveSmallIntegerField()
+    target_time = models.DateTimeField()
+    predicted_headcount = models.IntegerField()
+    method = models.CharField(max_length=100)  # 'model' or the heuristic fallback reason
+    model_version = models.CharField(max_length=64, blank=True)
+    generated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'horizon_hours'], name='forecast_event_horizon_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.event_id} +{self.horizon_hours}h: {self.predicted_headcount} ({self.method})"
+
+
+class HeadcountRollup(models.Model):
+    """
+    Per-event headcount aggregate for one fixed time bucket, maintained
+    incrementally from HeadcountSnapshot by `manage.py refresh_rollups`
+    (see core.rollups). avg = total / samples, so buckets can be merged.
+    """
+    GRAIN_SECONDS = None
+
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, db_index=False, related_name='+')
+    bucket = models.DateTimeField()  # bucket start, aligned to the Unix epoch
+    samples = models.PositiveIntegerField(default=0)
+    total = models.BigIntegerField(default=0)
+    min_headcount = models.IntegerField()
+    max_headcount = models.IntegerField()
+    last_headcount = models.IntegerField()
+    last_timestamp = models.DateTimeField()
+
+    class Meta:
+        abstract = True
+
+    @property
+    def avg_headcount(self):
+        return self.total / self.samples if self.samples else None
+
+    def __str__(self):
+        return f"{self.event_id} @ {self.bucket}: last {self.last_headcount} ({self.samples} samples)"
+
+
+class MinuteRollup(HeadcountRollup):
+    GRAIN_SECONDS = 60
+
+    class Meta:
+        constraints = [
+            # Also the index for (event, bucket range) reads.
+            models.UniqueConstraint(fields=['event', 'bucket'], name='minute_rollup_event_bucket_uniq'),
+        ]
+
+
+class HourRollup(HeadcountRollup):
+    GRAIN_SECONDS = 3600
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'bucket'], name='hour_rollup_event_bucket_uniq'),
+        ]
+
+
+class RollupWatermark(models.Model):
+    """Highest HeadcountSnapshot id already folded into the rollup tables."""
+    name = models.CharField(max_length=50, unique=True)
+    last_snapshot_id = models.BigIntegerField(default=0)
+    # Highest id seen at pending_since; folded once it is SAFETY_LAG old (see core.rollups).
+    pending_snapshot_id = models.BigIntegerField(default=0)
+    pending_since = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.last_snapshot_id}"
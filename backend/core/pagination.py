@@ -0,0 +1,15 @@
+from rest_framework.pagination import CursorPagination
+
+MAX_PAGE_SIZE = 1000
+
+
+class SnapshotCursorPagination(CursorPagination):
+    """
+    Keyset pagination over snapshots, newest first. The cursor encodes the
+    last timestamp seen, so every page is one range scan on
+    snapshot_event_ts_idx however deep the client pages.
+    """
+    ordering = ("-timestamp", "-id")
+    page_size = 100
+    page_size_query_param = "limit"
+    max_page_size = MAX_PAGE_SIZE
@@ -0,0 +1,74 @@
+# backend/core/prediction_cache.py
+"""
+Caches run_ml_predict results so polling viewers share one inference.
+
+Keys combine the event, the target hour bucket and the id of the event's
+latest snapshot (from EventState). A new snapshot changes the key, so a
+write invalidates the cached forecast without an explicit delete, and the
+stale entry ages out of the LRU cache. Concurrent misses for the same key
+in one process are collapsed into a single model call.
+"""
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+
+_stats = {"hits": 0, "misses": 0}
+_stats_lock = threading.Lock()
+_key_locks = {}
+_key_locks_lock = threading.Lock()
+
+
+def _cache():
+    return caches[getattr(settings, "PREDICTION_CACHE_ALIAS", "default")]
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def prediction_key(event_id, target, snapshot_id):
+    bucket = target.replace(minute=0, second=0, microsecond=0)
+    return f"pred:{event_id}:{bucket:%Y%m%d%H}:{snapshot_id or 0}"
+
+
+def cached_prediction(event, target, snapshot_id, compute):
+    """
+    Return compute(event, target) (a (prediction, reason) tuple), cached per
+    (event, target hour, latest snapshot id).
+    """
+    key = prediction_key(event.pk, target, snapshot_id)
+    cache = _cache()
+    result = cache.get(key)
+    if result is not None:
+        _count("hits")
+        return result
+
+    with _key_locks_lock:
+        lock = _key_locks.setdefault(key, threading.Lock())
+    try:
+        with lock:
+            result = cache.get(key)  # another thread may have filled it
+            if result is not None:
+                _count("hits")
+                return result
+            _count("misses")
+            result = tuple(compute(event, target))
+            cache.set(key, result, getattr(settings, "PREDICTION_CACHE_TTL", 300))
+            return result
+    finally:
+        with _key_locks_lock:
+            _key_locks.pop(key, None)
+
+
+def cache_stats():
+    with _stats_lock:
+        hits, misses = _stats["hits"], _stats["misses"]
+    total = hits + misses
+    return {"hits": hits, "misses": misses, "hit_rate": hits / total if total else None}
+
+
+def reset_cache_stats():
+    with _stats_lock:
+        _stats.update(hits=0, misses=0)
@@ -0,0 +1,122 @@
+# backend/core/qr_cache.py
+"""
+Caches rendered QR images for qr_for_event and the raw image endpoint.
+
+Keys combine the event's qr_token, the output format, box size, border and
+the frontend URL the code points at. Each of these changes the image, so
+a new token or FRONTEND_BASE_URL simply misses and the old entry ages out
+of the LRU cache (see the 'qr' alias in settings.CACHES). The ETag is a
+hash of the key, so a conditional GET can be answered with 304 before
+anything is rendered or fetched.
+
+SVG output is rendered by qrcode's pure-Python SVG factory and never
+imports PIL. PNG needs Pillow or pypng, as before.
+
+    QR_CODES = {
+        "CACHE_ALIAS": "qr",
+        "FORMAT": "png",         # default output: "png" or "svg"
+        "BOX_SIZE": 6,
+        "BORDER": 2,
+        "SIGNAGE_DIR": BASE_DIR / "qr_signage",  # `manage.py prerender_qr` output
+    }
+"""
+import base64
+import hashlib
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .utils import render_qr
+
+FORMATS = {
+    "png": "image/png",
+    "svg": "image/svg+xml",
+}
+DEFAULTS = {"CACHE_ALIAS": "qr", "FORMAT": "png", "BOX_SIZE": 6, "BORDER": 2}
+# Bump when render_qr's output changes for the same inputs (invalidates ETags).
+RENDER_VERSION = 1
+
+_stats = {"hits": 0, "misses": 0}
+_stats_lock = threading.Lock()
+
+
+def config():
+    return {**DEFAULTS, **getattr(settings, "QR_CODES", {})}
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def frontend_url():
+    return getattr(settings, "FRONTEND_BASE_URL", "http://localhost:3000")
+
+
+def scan_url(token, base_url=None):
+    return f"{base_url or frontend_url()}/scan/{token}"
+
+
+def qr_key(token, fmt, box_size, border, base_url):
+    digest = hashlib.sha256(
+        f"{RENDER_VERSION}|{token}|{fmt}|{box_size}|{border}|{base_url}".encode()
+    ).hexdigest()[:32]
+    return f"qr:{digest}"
+
+
+def _params(fmt, box_size, border, base_url):
+    """Fills in defaults from settings; validates the format."""
+    conf = config()
+    fmt = fmt or conf["FORMAT"]
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown QR format {fmt!r}; choose from {', '.join(FORMATS)}")
+    return (
+        fmt,
+        conf["BOX_SIZE"] if box_size is None else box_size,
+        conf["BORDER"] if border is None else border,
+        base_url or frontend_url(),
+    )
+
+
+def _etag(key):
+    return f'"{key.split(":", 1)[1]}"'
+
+
+def qr_etag(token, fmt=None, box_size=None, border=None, base_url=None):
+    """Strong ETag for the image with these parameters (no rendering needed)."""
+    return _etag(qr_key(token, *_params(fmt, box_size, border, base_url)))
+
+
+def cached_qr(token, fmt=None, box_size=None, border=None, base_url=None):
+    """
+    (image bytes, content type, etag) for an event token, rendered at most
+    once per key while it stays in the cache.
+    """
+    fmt, box_size, border, base_url = _params(fmt, box_size, border, base_url)
+    key = qr_key(token, fmt, box_size, border, base_url)
+    cache = caches[config()["CACHE_ALIAS"]]
+    body = cache.get(key)
+    if body is None:
+        _count("misses")
+        body = render_qr(scan_url(token, base_url), fmt, box_size, border)
+        cache.set(key, body, None)  # the key changes with its inputs; only LRU eviction removes it
+    else:
+        _count("hits")
+    return body, FORMATS[fmt], _etag(key)
+
+
+def data_uri(body, content_type):
+    return f"data:{content_type};base64,{base64.b64encode(body).decode()}"
+
+
+def qr_cache_stats():
+    with _stats_lock:
+        hits, misses = _stats["hits"], _stats["misses"]
+    total = hits + misses
+    return {"hits": hits, "misses": misses, "hit_rate": hits / total if total else None}
+
+
+def reset_qr_cache_stats():
+    with _stats_lock:
+        _stats.update(hits=0, misses=0)
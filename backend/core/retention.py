@@ -0,0 +1,225 @@
+# backend/core/retention.py
+"""
+Retention for raw HeadcountSnapshot rows.
+
+`apply_retention()` walks snapshots older than RAW_DAYS in id order, in
+chunks of CHUNK_SIZE:
+
+1. every row of the chunk is written to a compressed archive file under
+   ARCHIVE_DIR (Parquet when pyarrow is installed, gzip CSV otherwise);
+2. the chunk is compacted: only the latest reading per event and
+   COMPACT_SECONDS bucket is kept, the rest are deleted in one short
+   transaction, then the job pauses for PAUSE seconds so scan writers
+   are never locked out for long.
+
+Snapshots are folded into the rollups (core.rollups) before they are
+compacted, and never past the rollup watermark, so minute/hour aggregates
+stay exact. Progress is kept in a RollupWatermark row, so each snapshot is
+only visited once. Minute rollups older than MINUTE_ROLLUP_DAYS are deleted
+too; hour rollups are kept.
+
+`restore_archive()` reinserts archived rows with their original ids.
+
+    RETENTION = {
+        "RAW_DAYS": 7,
+        "COMPACT_SECONDS": 60,
+        "MINUTE_ROLLUP_DAYS": 90,
+        "ARCHIVE_DIR": BASE_DIR / "archive",
+        "FORMAT": "auto",        # "parquet", "csv" or "auto"
+        "CHUNK_SIZE": 5000,
+        "PAUSE": 0.05,
+    }
+"""
+import csv
+import gzip
+import os
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import rollups
+from .models import HeadcountSnapshot, MinuteRollup, RollupWatermark
+
+WATERMARK = "snapshot_retention"
+COLUMNS = ("id", "event_id", "timestamp", "headcount", "source")
+
+DEFAULTS = {
+    "RAW_DAYS": 7,
+    "COMPACT_SECONDS": 60,
+    "MINUTE_ROLLUP_DAYS": 90,
+    "ARCHIVE_DIR": "archive",
+    "FORMAT": "auto",
+    "CHUNK_SIZE": 5000,
+    "PAUSE": 0.05,
+}
+
+
+def config(**overrides):
+    """RETENTION settings merged over DEFAULTS, then non-None `overrides`."""
+    merged = dict(DEFAULTS, **getattr(settings, "RETENTION", {}))
+    merged.update({key: value for key, value in overrides.items() if value is not None})
+    return merged
+
+
+# -----------------------
+# Archive files
+# -----------------------
+def _have_pyarrow():
+    try:
+        import pyarrow  # noqa: F401  optional dependency
+    except ImportError:
+        return False
+    return True
+
+
+def archive_format(requested="auto"):
+    if requested == "auto":
+        return "parquet" if _have_pyarrow() else "csv"
+    if requested == "parquet" and not _have_pyarrow():
+        raise RuntimeError("Parquet archives need pyarrow; install it or use FORMAT='csv'.")
+    return requested
+
+
+def write_archive(rows, directory, fmt):
+    """
+    Write snapshot rows (tuples in COLUMNS order) to a new archive file and
+    return its path. The file is written under a temporary name and renamed,
+    so a crash never leaves a partial archive behind.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    suffix = ".parquet" if fmt == "parquet" else ".csv.gz"
+    path = directory / f"headcount_snapshots_{rows[0][0]:012d}-{rows[-1][0]:012d}{suffix}"
+    tmp = path.with_name(path.name + ".tmp")
+    if fmt == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        columns = list(zip(*rows))
+        table = pa.table({name: list(values) for name, values in zip(COLUMNS, columns)})
+        pq.write_table(table, tmp, compression="zstd")
+    else:
+        with gzip.open(tmp, "wt", newline="") as fh:
+            writer = csv.writer(fh)
+            writer.writerow(COLUMNS)
+            for pk, event_id, ts, headcount, source in rows:
+                writer.writerow((pk, event_id, ts.isoformat(), headcount, source))
+    os.replace(tmp, path)
+    return path
+
+
+def _archive_records(path):
+    if path.suffix == ".parquet":
+        import pyarrow.parquet as pq
+
+        yield from pq.read_table(path).to_pylist()
+        return
+    with gzip.open(path, "rt", newline="") as fh:
+        yield from csv.DictReader(fh)
+
+
+def read_archive(path):
+    """Yield HeadcountSnapshot objects (with their original ids) from an archive file."""
+    for record in _archive_records(Path(path)):
+        ts = record["timestamp"]
+        yield HeadcountSnapshot(
+            id=int(record["id"]),
+            event_id=int(record["event_id"]),
+            timestamp=datetime.fromisoformat(ts) if isinstance(ts, str) else ts,
+            headcount=int(record["headcount"]),
+            source=record["source"],
+        )
+
+
+def restore_archive(path, batch_size=5000):
+    """Reinsert the rows of one archive file, skipping ids still present. Returns rows read."""
+    restored, batch = 0, []
+    for snap in read_archive(path):
+        batch.append(snap)
+        if len(batch) >= batch_size:
+            HeadcountSnapshot.objects.bulk_create(batch, ignore_conflicts=True)
+            restored += len(batch)
+            batch = []
+    if batch:
+        HeadcountSnapshot.objects.bulk_create(batch, ignore_conflicts=True)
+        restored += len(batch)
+    return restored
+
+
+# -----------------------
+# Compaction
+# -----------------------
+def _keepers(rows, compact_seconds):
+    """Ids of the latest reading per (event, bucket) among `rows`; ties go to the newer id."""
+    latest = {}
+    for pk, event_id, ts, _, _ in rows:
+        epoch = int(ts.timestamp())
+        key = (event_id, epoch - epoch % compact_seconds)
+        current = latest.get(key)
+        if current is None or ts >= current[1]:
+            latest[key] = (pk, ts)
+    return {pk for pk, _ in latest.values()}
+
+
+def apply_retention(now=None, archive=True, log=None, **overrides):
+    """
+    Archive and compact raw snapshots older than RAW_DAYS, and drop expired
+    minute rollups. Returns counts: archived, deleted, kept, files, minute_rollups_deleted.
+    """
+    options = config(**overrides)
+    now = now or timezone.now()
+    cutoff = now - timedelta(days=options["RAW_DAYS"])
+    fmt = archive_format(options["FORMAT"]) if archive else None
+    chunk_size = options["CHUNK_SIZE"]
+    stats = {"archived": 0, "deleted": 0, "kept": 0, "files": [], "minute_rollups_deleted": 0}
+
+    rollups.refresh_rollups()
+    ceiling = rollups.watermark()
+    mark, _ = RollupWatermark.objects.get_or_create(name=WATERMARK)
+    while True:
+        rows = list(
+            HeadcountSnapshot.objects.filter(pk__gt=mark.last_snapshot_id, pk__lte=ceiling)
+            .order_by("pk")
+            .values_list(*COLUMNS)[:chunk_size]
+        )
+        # Ids grow with time, so stop at the first snapshot inside the retention window.
+        expired = []
+        for row in rows:
+            if row[2] >= cutoff:
+                break
+            expired.append(row)
+        if not expired:
+            break
+
+        if fmt is not None:
+            stats["files"].append(str(write_archive(expired, options["ARCHIVE_DIR"], fmt)))
+            stats["archived"] += len(expired)
+        keep = _keepers(expired, options["COMPACT_SECONDS"])
+        doomed = [row[0] for row in expired if row[0] not in keep]
+        with transaction.atomic():
+            HeadcountSnapshot.objects.filter(pk__in=doomed).delete()
+            mark.last_snapshot_id = expired[-1][0]
+            mark.save(update_fields=["last_snapshot_id", "updated_at"])
+        stats["deleted"] += len(doomed)
+        stats["kept"] += len(keep)
+        if log:
+            log(f"  ids {expired[0][0]}-{expired[-1][0]}: kept {len(keep)}, deleted {len(doomed)}")
+        if len(expired) < len(rows) or len(rows) < chunk_size:
+            break
+        if options["PAUSE"]:
+            time.sleep(options["PAUSE"])
+
+    minute_cutoff = now - timedelta(days=options["MINUTE_ROLLUP_DAYS"])
+    while True:
+        ids = list(
+            MinuteRollup.objects.filter(bucket__lt=minute_cutoff).values_list("pk", flat=True)[:chunk_size]
+        )
+        if not ids:
+            break
+        MinuteRollup.objects.filter(pk__in=ids).delete()
+        stats["minute_rollups_deleted"] += len(ids)
+    return stats
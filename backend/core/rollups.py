@@ -0,0 +1,173 @@
+# backend/core/rollups.py
+"""
+Incremental minute/hour rollups of HeadcountSnapshot.
+
+`refresh_rollups()` folds every settled snapshot with an id above the
+watermark into MinuteRollup and HourRollup (count, sum, min, max, last per
+event and bucket), then advances the watermark. Rollup rows are mergeable,
+so snapshots that arrive late with an older timestamp are simply added to
+their (possibly already written) bucket. Run it from
+`manage.py refresh_rollups --interval 60`.
+
+With concurrent writers (PostgreSQL, MySQL) ids do not become visible in
+order: id N can commit after N+1 has been read. So the watermark never
+passes ids that were not yet settled: each refresh records the highest id
+it can see, and a later refresh at least SAFETY_LAG seconds on folds up to
+that recorded id. Every smaller id has committed or rolled back by then,
+as long as no snapshot transaction stays open longer than SAFETY_LAG.
+SQLite serializes writers, so there ids are visible in order and the lag
+defaults to 0.
+
+Readers combine the rollups (everything up to the watermark) with the raw
+snapshots above it, so results stay exact between refreshes; see
+core.aggregation.bucket_snapshots.
+
+    ROLLUPS = {
+        "ENABLED": True,      # read paths use the rollup tables
+        "BATCH_SIZE": 50000,  # snapshots folded per transaction
+        "SAFETY_LAG": None,   # seconds; None = 0 on SQLite, DEFAULT_SAFETY_LAG elsewhere
+    }
+"""
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import HeadcountSnapshot, HourRollup, MinuteRollup, RollupWatermark
+
+GRAINS = (HourRollup, MinuteRollup)  # coarsest first
+WATERMARK = "headcount_rollups"
+DEFAULT_SAFETY_LAG = 30.0
+
+
+def _config():
+    return getattr(settings, "ROLLUPS", {})
+
+
+def enabled():
+    return _config().get("ENABLED", True)
+
+
+def safety_lag():
+    """Seconds after which every snapshot id below one seen then is treated as settled."""
+    lag = _config().get("SAFETY_LAG")
+    if lag is None:
+        return 0.0 if connection.vendor == "sqlite" else DEFAULT_SAFETY_LAG
+    return float(lag)
+
+
+def watermark():
+    """Highest snapshot id already folded into the rollups (0 if never run)."""
+    mark = RollupWatermark.objects.filter(name=WATERMARK).values_list("last_snapshot_id", flat=True).first()
+    return mark or 0
+
+
+def grain_for(interval):
+    """The coarsest rollup model whose grain divides `interval` seconds, or None."""
+    for model in GRAINS:
+        if interval % model.GRAIN_SECONDS == 0:
+            return model
+    return None
+
+
+def _bucket_start(ts, grain):
+    epoch = int(ts.timestamp())
+    return datetime.fromtimestamp(epoch - epoch % grain, tz=dt_timezone.utc)
+
+
+def _merge(model, rows):
+    """Fold (event_id, timestamp, headcount) rows, in id order, into `model`."""
+    grain = model.GRAIN_SECONDS
+    acc = {}
+    for event_id, ts, headcount in rows:
+        key = (event_id, _bucket_start(ts, grain))
+        agg = acc.get(key)
+        if agg is None:
+            acc[key] = [1, headcount, headcount, headcount, headcount, ts]
+            continue
+        agg[0] += 1
+        agg[1] += headcount
+        agg[2] = min(agg[2], headcount)
+        agg[3] = max(agg[3], headcount)
+        if ts >= agg[5]:  # equal timestamps: the later id wins
+            agg[4], agg[5] = headcount, ts
+
+    existing = {}
+    for event_id in {event_id for event_id, _ in acc}:
+        buckets = [bucket for e, bucket in acc if e == event_id]
+        for row in model.objects.filter(event_id=event_id, bucket__in=buckets):
+            existing[(event_id, row.bucket)] = row
+
+    objs = []
+    for (event_id, bucket), (samples, total, low, high, last, last_ts) in acc.items():
+        old = existing.get((event_id, bucket))
+        if old is not None:
+            samples += old.samples
+            total += old.total
+            low = min(low, old.min_headcount)
+            high = max(high, old.max_headcount)
+            if old.last_timestamp > last_ts:
+                last, last_ts = old.last_headcount, old.last_timestamp
+        objs.append(model(
+            event_id=event_id, bucket=bucket, samples=samples, total=total,
+            min_headcount=low, max_headcount=high, last_headcount=last, last_timestamp=last_ts,
+        ))
+    model.objects.bulk_create(
+        objs,
+        update_conflicts=True,
+        unique_fields=["event", "bucket"],
+        update_fields=["samples", "total", "min_headcount", "max_headcount", "last_headcount", "last_timestamp"],
+    )
+    return len(objs)
+
+
+def _settled_ceiling(mark, lag):
+    """
+    Highest snapshot id that may be folded now. Records the current highest
+    id on `mark` and returns the one recorded at least `lag` seconds ago.
+    """
+    latest = HeadcountSnapshot.objects.aggregate(latest=Max("pk"))["latest"] or 0
+    if not lag:
+        return latest
+    now = timezone.now()
+    ceiling = mark.last_snapshot_id
+    if mark.pending_since is not None and (now - mark.pending_since).total_seconds() >= lag:
+        ceiling = max(ceiling, mark.pending_snapshot_id)
+        mark.pending_since = None
+    if mark.pending_since is None:
+        mark.pending_snapshot_id, mark.pending_since = latest, now
+        mark.save(update_fields=["pending_snapshot_id", "pending_since", "updated_at"])
+    return ceiling
+
+
+def refresh_rollups(batch_size=None):
+    """
+    Fold settled snapshots above the watermark into the rollup tables, one
+    batch per transaction, until caught up. Returns (snapshots folded, new
+    watermark).
+    """
+    batch_size = batch_size or _config().get("BATCH_SIZE", 50000)
+    folded = 0
+    ceiling = None
+    while True:
+        with transaction.atomic():
+            mark, _ = RollupWatermark.objects.select_for_update().get_or_create(name=WATERMARK)
+            if ceiling is None:
+                ceiling = _settled_ceiling(mark, safety_lag())
+            rows = list(
+                HeadcountSnapshot.objects.filter(pk__gt=mark.last_snapshot_id, pk__lte=ceiling)
+                .order_by("pk")
+                .values_list("pk", "event_id", "timestamp", "headcount")[:batch_size]
+            )
+            if not rows:
+                return folded, mark.last_snapshot_id
+            readings = [row[1:] for row in rows]
+            for model in GRAINS:
+                _merge(model, readings)
+            mark.last_snapshot_id = rows[-1][0]
+            mark.save(update_fields=["last_snapshot_id", "updated_at"])
+        folded += len(rows)
+        if len(rows) < batch_size:
+            return folded, mark.last_snapshot_id
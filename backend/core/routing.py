@@ -1,7 +1,8 @@
 # backend/core/core/routing.py
 from django.urls import re_path
 from . import consumers
+from .instrumentation import instrument_consumer
 
 websocket_urlpatterns = [
-    re_path(r"ws/event/(?P<event_id>\d+)/$", consumers.EventConsumer.as_asgi()),
+    re_path(r"ws/event/(?P<event_id>\d+)/$", instrument_consumer(consumers.EventConsumer).as_asgi()),
 ]
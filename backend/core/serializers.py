@@ -3,6 +3,7 @@ from rest_framework import serializers
 import logging
 
 from .models import Event, HeadcountSnapshot, Alert
+from .venues import VENUES
 
 logger = logging.getLogger(__name__)
 
@@ -22,7 +23,7 @@ class HeadcountSnapshotSerializer(serializers.ModelSerializer):
 class EventSerializer(serializers.ModelSerializer):
     """
     Serializer for Event model.
-    Adds dynamic fields:
+    Adds dynamic fields (read from Event.state):
         - current_headcount: latest snapshot count
         - status: Green / Yellow / Red based on thresholds
     """
@@ -35,6 +36,7 @@ class EventSerializer(serializers.ModelSerializer):
             "id",
             "name",
             "date",
+            "venue",
             "safe_threshold",
             "crowded_threshold",
             "created_at",
@@ -42,48 +44,25 @@ class EventSerializer(serializers.ModelSerializer):
             "status",
         ]
 
+    def validate_venue(self, value):
+        if value and value not in VENUES:
+            raise serializers.ValidationError(f"Unknown venue {value!r}.")
+        return value
+
     def get_current_headcount(self, obj):
         """
-        Returns the latest headcount for the event.
-        Uses related_name 'snapshots' (HeadcountSnapshot.event.related_name).
-        Falls back to querying HeadcountSnapshot if the reverse relation doesn't exist.
+        Returns the latest headcount for the event from its denormalized EventState.
+        Querysets should use select_related("state") so this costs no extra query.
         """
-        try:
-            # Preferred: use the related_name on the model
-            snapshots_manager = getattr(obj, "snapshots", None)
-            if snapshots_manager is not None:
-                latest = snapshots_manager.order_by("-timestamp").first()
-                return latest.headcount if latest else 0
-
-            # Fallback: try default reverse name or direct query
-            alt = getattr(obj, "headcountsnapshot_set", None)
-            if alt is not None:
-                latest = alt.order_by("-timestamp").first()
-                return latest.headcount if latest else 0
-
-            qs = HeadcountSnapshot.objects.filter(event=obj).order_by("-timestamp")
-            latest = qs.first()
-            return latest.headcount if latest else 0
-
-        except Exception as exc:
-            logger.exception("Error getting current headcount for Event id=%s: %s", getattr(obj, "id", "?"), exc)
-            return 0
-
+        state = obj.current_state()
+        return state.headcount if state else 0
 
     def get_status(self, obj):
         """
         Determines crowd status based on thresholds.
         """
-        headcount = self.get_current_headcount(obj)
-        try:
-            if headcount >= obj.crowded_threshold:
-                return "Red"
-            elif headcount >= obj.safe_threshold:
-                return "Yellow"
-            return "Green"
-        except Exception:
-            # If thresholds are missing or invalid, return Unknown
-            return "Unknown"
+        state = obj.current_state()
+        return state.status if state else obj.crowd_status(0)
 
 
 class EventDetailSerializer(EventSerializer):
@@ -129,8 +108,12 @@ class StatusSerializer(serializers.Serializer):
 
 class HeatmapBucketSerializer(serializers.Serializer):
     """
-    Serializer for heatmap aggregation rows.
-    Expects items with keys: 'ts' (timestamp) and 'avg_headcount' (float)
+    Serializer for heatmap aggregation rows (core.aggregation.bucket_snapshots).
+    'ts' is the bucket start; headcounts are the last/avg/max/min within the bucket.
     """
-    ts = serializers.DateTimeField()
-    avg_headcount = serializers.FloatField()
+    ts = serializers.DateTimeField(source="bucket")
+    avg_headcount = serializers.FloatField(source="avg")
+    last_headcount = serializers.IntegerField(source="last")
+    max_headcount = serializers.IntegerField(source="max")
+    min_headcount = serializers.IntegerField(source="min")
+    samples = serializers.IntegerField()
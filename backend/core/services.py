@@ -1,28 +1,115 @@
 from datetime import timedelta
+from django.db import transaction
+from django.db.models import Q
 from django.utils import timezone
-from .models import HeadcountSnapshot
+from .aggregation import bucket_snapshots
+from .counters import parse_increment
+from .models import Event, Forecast
 
 
 def heatmap_for_event(event, minutes=60, interval=10):
     """
     Aggregate headcount snapshots for an event in the last `minutes`.
-    Groups snapshots into buckets of `interval` minutes.
-    Returns list of {"time": ..., "count": ...}.
+    Groups snapshots into buckets of `interval` minutes (bucketed in SQL, see core.aggregation).
+    Returns list of {"time": ..., "count": <last headcount>, "avg": ..., "max": ..., "min": ...}.
     """
     since = timezone.now() - timedelta(minutes=minutes)
-    snaps = HeadcountSnapshot.objects.filter(
-        event=event,
-        timestamp__gte=since
-    ).order_by("timestamp")
-
-    buckets = {}
-    for snap in snaps:
-        bucket_minute = (snap.timestamp.minute // interval) * interval
-        bucket_time = snap.timestamp.replace(
-            minute=bucket_minute, second=0, microsecond=0
-        )
-        # here we just use the last headcount in that bucket
-        # (or sum them, depending on what you want to visualize)
-        buckets[bucket_time] = snap.headcount
+    return [
+        {
+            "time": row["bucket"].isoformat(),
+            "count": row["last"],
+            "avg": row["avg"],
+            "max": row["max"],
+            "min": row["min"],
+        }
+        for row in bucket_snapshots(event.pk, interval * 60, start=since)
+    ]
+
+
+def reduce_scans(scans):
+    """
+    Reduce a batch of scan items into per-event increments.
+    Each item is {"event_id": id} or {"token": qr_token}, with optional "increment" (default 1).
+    Events are resolved with at most two queries for the whole batch. Malformed
+    items (non-string token, bad increment) are reported per item; nothing is
+    incremented here.
+    Returns ({event: total_increment}, [{"index": i, "error": ...}, ...]).
+    """
+    ids, tokens = set(), set()
+    for item in scans:
+        if not isinstance(item, dict):
+            continue
+        if item.get("event_id") is not None:
+            ids.add(str(item["event_id"]))
+        elif isinstance(item.get("token"), str) and item["token"]:
+            tokens.add(item["token"])
+
+    by_id = {str(e.pk): e for e in Event.objects.filter(pk__in=[i for i in ids if i.isdigit()])} if ids else {}
+    by_token = {e.qr_token: e for e in Event.objects.filter(qr_token__in=tokens)} if tokens else {}
+
+    totals, errors = {}, []
+    for index, item in enumerate(scans):
+        if not isinstance(item, dict):
+            errors.append({"index": index, "error": "scan must be an object"})
+            continue
+        if item.get("event_id") is not None:
+            event = by_id.get(str(item["event_id"]))
+        elif item.get("token"):
+            if not isinstance(item["token"], str):
+                errors.append({"index": index, "error": "token must be a string"})
+                continue
+            event = by_token.get(item["token"])
+        else:
+            errors.append({"index": index, "error": "event_id or token required"})
+            continue
+        if event is None:
+            errors.append({"index": index, "error": "event not found"})
+            continue
+        try:
+            increment = parse_increment(item.get("increment"))
+        except ValueError as e:
+            errors.append({"index": index, "error": str(e)})
+            continue
+        totals[event] = totals.get(event, 0) + increment
+    return totals, errors
+
 
-    return [{"time": t.isoformat(), "count": c} for t, c in sorted(buckets.items())]
+def active_events():
+    """Events without a date, or dated today or later."""
+    return Event.objects.filter(Q(date__isnull=True) | Q(date__gte=timezone.localdate()))
+
+
+def refresh_forecasts(events=None, horizons=None):
+    """
+    Recompute multi-horizon forecasts for `events` (default: active events)
+    and replace their Forecast rows in one transaction. Returns the rows written.
+    """
+    from .ml import FORECAST_HORIZONS, forecast_horizons, model_registry
+
+    horizons = horizons or FORECAST_HORIZONS
+    events = list((events if events is not None else active_events()).select_related("state"))
+    now = timezone.now()
+    results = forecast_horizons(events, now, horizons)
+
+    rows = [
+        Forecast(
+            event_id=event_id,
+            horizon_hours=horizon,
+            target_time=target_time,
+            predicted_headcount=predicted,
+            method=method[:100],
+            model_version=model_registry.version or "",
+            generated_at=now,
+        )
+        for event_id, horizon_rows in results.items()
+        for horizon, target_time, predicted, method in horizon_rows
+    ]
+    with transaction.atomic():
+        Forecast.objects.filter(event_id__in=list(results), horizon_hours__gt=horizons).delete()
+        Forecast.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=["event", "horizon_hours"],
+            update_fields=["target_time", "predicted_headcount", "method", "model_version", "generated_at"],
+        )
+    return rows
@@ -0,0 +1,79 @@
+# backend/core/startup.py
+"""
+Import-time profile of the server entry points.
+
+profile_imports() imports `crowd_mgmt.asgi` or `crowd_mgmt.wsgi` in a
+fresh interpreter under `python -X importtime`, plus the URLconf (Django
+imports it on the first request, so a worker pays for it before serving
+anything). It returns the wall time and the per-module import times.
+
+The heavy ML and QR dependencies (HEAVY_MODULES) are imported on first
+use by core.ml, core.utils and the training code. A worker that only
+serves /events/ should never load them, and the tests enforce that.
+
+    STARTUP = {
+        "BUDGET_SECONDS": 3.0,  # cold-start budget enforced by the tests
+    }
+"""
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+
+ENTRY_POINTS = ("crowd_mgmt.asgi", "crowd_mgmt.wsgi")
+HEAVY_MODULES = ("numpy", "pandas", "joblib", "sklearn", "lightgbm", "xgboost", "qrcode", "PIL")
+DEFAULTS = {"BUDGET_SECONDS": 3.0}
+
+CHILD = """
+import importlib, sys, time
+t0 = time.perf_counter()
+importlib.import_module({module!r})
+if {urls!r}:
+    from django.urls import get_resolver
+    get_resolver().url_patterns
+print(time.perf_counter() - t0)
+"""
+
+
+def config():
+    return {**DEFAULTS, **getattr(settings, "STARTUP", {})}
+
+
+def parse_importtime(stderr):
+    """[(module, self_us, cumulative_us, depth)] from `-X importtime` output, in import order."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def profile_imports(module, urls=True):
+    """
+    Imports `module` in a new interpreter. Returns {"module", "seconds" (the
+    import itself), "process_seconds" (including interpreter start-up),
+    "imports" (parse_importtime rows), "heavy" (HEAVY_MODULES loaded)}.
+    """
+    env = {**os.environ, "DJANGO_SETTINGS_MODULE": os.environ.get("DJANGO_SETTINGS_MODULE", "crowd_mgmt.settings")}
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD.format(module=module, urls=urls)],
+        cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+    )
+    process_seconds = time.perf_counter() - started
+    if result.returncode:
+        raise RuntimeError(f"importing {module} failed:\n{result.stderr[-2000:]}")
+    imports = parse_importtime(result.stderr)
+    loaded = {name.split(".")[0] for name, _, _, _ in imports}
+    return {
+        "module": module,
+        "seconds": float(result.stdout.strip().splitlines()[-1]),
+        "process_seconds": process_seconds,
+        "imports": imports,
+        "heavy": sorted(loaded & set(HEAVY_MODULES)),
+    }
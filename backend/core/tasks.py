@@ -0,0 +1,212 @@
+# backend/core/tasks.py
+"""
+In-process background queue for work that should not sit on the request path
+(alert evaluation, WebSocket fan-out).
+
+Tasks are routed to one of WORKERS shards by event id. Each shard is a bounded
+FIFO drained by a single thread, so tasks for the same event always run in
+submission order. When a shard is full, submit() blocks the producer (up to
+SUBMIT_TIMEOUT seconds, then raises queue.Full) instead of growing without
+bound; submit_or_run() runs the task in the caller's thread instead, for
+producers that have already committed to the work. Pending tasks are
+drained when the interpreter starts shutting down, before the thread pools
+that async_to_sync relies on are closed.
+
+Configured through settings.TASK_QUEUE:
+
+    TASK_QUEUE = {
+        "EAGER": False,         # run tasks inline (tests, debugging)
+        "WORKERS": 4,
+        "MAXSIZE": 1000,        # per shard
+        "SUBMIT_TIMEOUT": 5.0,  # seconds a producer may block on a full shard; None = forever
+    }
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class EventTaskQueue:
+    def __init__(self, workers=4, maxsize=1000, submit_timeout=5.0):
+        self.submit_timeout = submit_timeout
+        self._shards = [queue.Queue(maxsize=maxsize) for _ in range(workers)]
+        self._threads = []
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stopped = False
+        self.stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "inline": 0,
+            "overflow": 0,
+            "lag_max": 0.0,
+            "lag_total": 0.0,
+            "lag_last": 0.0,
+        }
+
+    def _ensure_started(self):
+        if self._threads:
+            return
+        with self._start_lock:
+            if self._threads:
+                return
+            for index, shard in enumerate(self._shards):
+                thread = threading.Thread(
+                    target=self._work, args=(shard,), name=f"event-tasks-{index}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, event_id, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs) behind earlier tasks for the same event."""
+        if self._stopped or _eager():
+            self._bump("inline")
+            fn(*args, **kwargs)
+            return
+        self._ensure_started()
+        shard = self._shards[int(event_id) % len(self._shards)]
+        shard.put((time.monotonic(), fn, args, kwargs), timeout=self.submit_timeout)
+        self._bump("submitted")
+
+    def submit_or_run(self, event_id, fn, *args, **kwargs):
+        """
+        submit(), but run the task inline when its shard stays full for
+        SUBMIT_TIMEOUT. The inline run may overtake tasks still queued for
+        the same event.
+        """
+        try:
+            self.submit(event_id, fn, *args, **kwargs)
+        except queue.Full:
+            logger.warning("Task queue shard full; running %r inline", fn)
+            self._bump("overflow")
+            fn(*args, **kwargs)
+
+    def _work(self, shard):
+        while True:
+            item = shard.get()
+            try:
+                if item is _STOP:
+                    return
+                enqueued_at, fn, args, kwargs = item
+                lag = time.monotonic() - enqueued_at
+                try:
+                    fn(*args, **kwargs)
+                    self._bump("completed", lag)
+                except Exception:
+                    logger.exception("Background task %r failed", fn)
+                    self._bump("failed", lag)
+                finally:
+                    close_old_connections()
+            finally:
+                shard.task_done()
+
+    def _bump(self, name, lag=None):
+        with self._stats_lock:
+            self.stats[name] += 1
+            if lag is not None:
+                self.stats["lag_last"] = lag
+                self.stats["lag_total"] += lag
+                self.stats["lag_max"] = max(self.stats["lag_max"], lag)
+
+    def drain(self):
+        """Block until every queued task has run."""
+        for shard in self._shards:
+            shard.join()
+
+    def shutdown(self, timeout=10.0):
+        """Stop accepting queued work, finish what is pending and stop the workers."""
+        if self._stopped:
+            return
+        self._stopped = True
+        for shard in self._shards[:len(self._threads)]:
+            shard.put(_STOP)
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+
+    def metrics(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        done = stats["completed"] + stats["failed"]
+        depths = [shard.qsize() for shard in self._shards]
+        return {
+            "depth": sum(depths),
+            "depth_per_worker": depths,
+            "capacity_per_worker": self._shards[0].maxsize,
+            "workers_running": sum(t.is_alive() for t in self._threads),
+            "submitted": stats["submitted"],
+            "completed": stats["completed"],
+            "failed": stats["failed"],
+            "inline": stats["inline"],
+            "overflow": stats["overflow"],
+            "lag_last_seconds": stats["lag_last"],
+            "lag_max_seconds": stats["lag_max"],
+            "lag_avg_seconds": stats["lag_total"] / done if done else None,
+        }
+
+
+def _config():
+    return getattr(settings, "TASK_QUEUE", {})
+
+
+def at_shutdown(fn):
+    """
+    Call `fn` when the interpreter starts shutting down. Where the private
+    threading._register_atexit exists, hooks run before concurrent.futures
+    closes its executors (so tasks publishing through async_to_sync can
+    still schedule work), in registration order; otherwise fall back to a
+    plain atexit hook.
+    """
+    register = getattr(threading, "_register_atexit", None)
+    if register is None:
+        atexit.register(fn)
+    else:
+        register(fn)
+
+
+def _eager():
+    return _config().get("EAGER", False)
+
+
+_task_queue = None
+_task_queue_lock = threading.Lock()
+
+
+def get_task_queue():
+    """Return the process-wide EventTaskQueue (created on first use)."""
+    global _task_queue
+    if _task_queue is None:
+        with _task_queue_lock:
+            if _task_queue is None:
+                config = _config()
+                _task_queue = EventTaskQueue(
+                    workers=config.get("WORKERS", 4),
+                    maxsize=config.get("MAXSIZE", 1000),
+                    submit_timeout=config.get("SUBMIT_TIMEOUT", 5.0),
+                )
+                at_shutdown(_task_queue.shutdown)
+    return _task_queue
+
+
+def shutdown():
+    """Drain and stop the process-wide queue, if it was ever started."""
+    if _task_queue is not None:
+        _task_queue.shutdown()
+
+
+def submit(event_id, fn, *args, **kwargs):
+    get_task_queue().submit(event_id, fn, *args, **kwargs)
+
+
+def submit_or_run(event_id, fn, *args, **kwargs):
+    get_task_queue().submit_or_run(event_id, fn, *args, **kwargs)
@@ -1,3 +1,1781 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+
+from django.core.cache import caches
+from django.db import connection
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from channels.exceptions import ChannelFull
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .counters import (
+    LocalCounter,
+    RedisCounter,
+    flush_at_exit,
+    flush_headcounts,
+    get_counter,
+    increment_headcount,
+    reset_counter,
+)
+from . import ml, venues
+from .features import (
+    HourlyRingBuffer,
+    feature_engine,
+    feature_row,
+    features_from_buffer,
+    STATIC_FEATURES,
+    pandas_feature_frame,
+)
+from .consumers import BROADCAST_STATS, RESYNC_CLOSE_CODE
+from .compiled_model import CompiledTrees, load as load_compiled
+from .model_registry import ModelRegistry
+from .qr_cache import cached_qr, qr_cache_stats, reset_qr_cache_stats
+from .serializers import EventSerializer
+from .routing import websocket_urlpatterns
+from .prediction_cache import cache_stats, cached_prediction, reset_cache_stats
+from .models import Alert, Event, EventState, Forecast, HeadcountSnapshot, HourRollup, MinuteRollup
+from .services import refresh_forecasts
+from .aggregation import bucket_snapshots
+from .tasks import EventTaskQueue, at_shutdown
+from . import fanout, wsprotocol
+from .layers import PUSH_SCRIPT, RedisChannelLayer
+from .instrumentation import metrics, record_ml
+from .rollups import grain_for, refresh_rollups, watermark
+
+
+class FakeAsyncRedis:
+    """
+    In-memory stand-in for the redis.asyncio commands core.layers uses.
+    """
+
+    def __init__(self):
+        self.lists = {}
+        self.zsets = {}
+
+    async def rpush(self, key, value):
+        self.lists.setdefault(key, []).append(value.encode() if isinstance(value, str) else value)
+        return len(self.lists[key])
+
+    async def llen(self, key):
+        return len(self.lists.get(key, ()))
+
+    async def blpop(self, keys, timeout=0):
+        deadline = asyncio.get_running_loop().time() + (timeout or 3600)
+        while True:
+            for key in keys:
+                if self.lists.get(key):
+                    return key.encode(), self.lists[key].pop(0)
+            if asyncio.get_running_loop().time() >= deadline:
+                return None
+            await asyncio.sleep(0.001)
+
+    async def expire(self, key, seconds):
+        return True
+
+    async def eval(self, script, numkeys, *args):
+        # Only core.layers.PUSH_SCRIPT is ever run; emulate it atomically.
+        assert script == PUSH_SCRIPT
+        key, message, capacity, expiry = args
+        if await self.llen(key) >= int(capacity):
+            return 0
+        await self.rpush(key, message)
+        return 1
+
+    async def zadd(self, key, mapping):
+        self.zsets.setdefault(key, {}).update(mapping)
+
+    async def zrem(self, key, member):
+        self.zsets.get(key, {}).pop(member, None)
+
+    async def zrangebyscore(self, key, low, high):
+        return [m.encode() for m, score in self.zsets.get(key, {}).items() if score >= low]
+
+    async def delete(self, key):
+        self.lists.pop(key, None)
+        self.zsets.pop(key, None)
+
+    async def scan_iter(self, match):
+        prefix = match.rstrip("*")
+        for key in [k for k in (*self.lists, *self.zsets) if k.startswith(prefix)]:
+            yield key
+
+    def pipeline(self, transaction=True):
+        return FakeAsyncPipeline(self)
+
+
+class FakeAsyncPipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+        return queue
+
+    async def execute(self):
+        calls, self.calls = self.calls, []
+        return [await getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in calls]
+
+
+class ConstantModel:
+    """Picklable stand-in for the trained regressor."""
+
+    def __init__(self, value, features=("a", "b")):
+        self.value = value
+        self.feature_names_in_ = list(features)
+
+    def predict(self, X):
+        return [self.value] * len(X)
+
+
+class FakeRedis:
+    """
+    Minimal in-memory stand-in for the redis-py commands the app uses.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.data = {}
+        self.sets = {}
+
+    def get(self, key):
+        with self._lock:
+            value = self.data.get(key)
+            return str(value).encode() if value is not None else None
+
+    def set(self, key, value, nx=False):
+        with self._lock:
+            if nx and key in self.data:
+                return None
+            self.data[key] = int(value)
+            return True
+
+    def incrby(self, key, amount):
+        with self._lock:
+            self.data[key] = self.data.get(key, 0) + int(amount)
+            return self.data[key]
+
+    def sadd(self, key, *members):
+        with self._lock:
+            bucket = self.sets.setdefault(key, set())
+            added = len(set(str(m).encode() for m in members) - bucket)
+            bucket.update(str(m).encode() for m in members)
+            return added
+
+    def srem(self, key, *members):
+        with self._lock:
+            bucket = self.sets.setdefault(key, set())
+            removed = 0
+            for m in members:
+                if str(m).encode() in bucket:
+                    bucket.discard(str(m).encode())
+                    removed += 1
+            return removed
+
+    def spop(self, key, count=None):
+        with self._lock:
+            bucket = self.sets.get(key, set())
+            popped = [bucket.pop() for _ in range(min(count or 1, len(bucket)))]
+            return popped if count is not None else (popped[0] if popped else None)
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+class CounterBackendTests(TestCase):
+    def _hammer(self, counter, threads=8, per_thread=250):
+        def work():
+            for _ in range(per_thread):
+                counter.incr(1)
+
+        workers = [threading.Thread(target=work) for _ in range(threads)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        return threads * per_thread
+
+    def test_local_counter_concurrent_increments(self):
+        counter = LocalCounter()
+        expected = self._hammer(counter)
+        self.assertEqual(counter.get(1), expected)
+        self.assertEqual(counter.drain_dirty(), {1: expected})
+        self.assertEqual(counter.drain_dirty(), {})
+
+    def test_redis_counter_concurrent_increments(self):
+        counter = RedisCounter(client=FakeRedis())
+        expected = self._hammer(counter)
+        self.assertEqual(counter.get(1), expected)
+        self.assertEqual(counter.drain_dirty(), {1: expected})
+        self.assertEqual(counter.drain_dirty(), {})
+
+    def test_drain_selected_events(self):
+        for counter in (LocalCounter(), RedisCounter(client=FakeRedis())):
+            counter.incr(1, 2)
+            counter.incr(2, 3)
+            self.assertEqual(counter.drain_dirty([2, 3]), {2: 3})
+            self.assertEqual(counter.drain_dirty(), {1: 2})
+            counter.mark_dirty([2])
+            self.assertEqual(counter.drain_dirty(), {2: 3})
+
+    def test_seed_does_not_overwrite(self):
+        for counter in (LocalCounter(), RedisCounter(client=FakeRedis())):
+            counter.seed(5, 10)
+            counter.seed(5, 99)
+            self.assertEqual(counter.incr(5, 2), 12)
+            counter.set(5, 40)
+            self.assertEqual(counter.get(5), 40)
+            self.assertEqual(counter.drain_dirty(), {})
+
+
+@override_settings(HEADCOUNT_COUNTER={"FLUSH_INTERVAL": 0}, TASK_QUEUE={"EAGER": True}, WS_BROADCAST_TICK=0)
+class ScanCounterTests(TestCase):
+    def setUp(self):
+        reset_counter(LocalCounter())
+        self.event = Event.objects.create(name="Gate test")
+        HeadcountSnapshot.objects.create(event=self.event, headcount=10, source="admin")
+        self.client = APIClient()
+
+    def tearDown(self):
+        reset_counter()
+
+    def test_counter_seeds_from_latest_snapshot(self):
+        self.assertEqual(increment_headcount(self.event.id, 3), 13)
+
+    def test_scan_endpoints_count_without_writing(self):
+        for _ in range(5):
+            self.client.post("/api/api/scan/", {"event_id": self.event.id}, format="json")
+        resp = self.client.post(
+            "/api/api/scan-by-token/", {"token": self.event.qr_token, "increment": 2}, format="json"
+        )
+        self.assertEqual(resp.data["headcount"], 17)
+        self.assertEqual(HeadcountSnapshot.objects.filter(event=self.event).count(), 1)
+
+        flushed = flush_headcounts()
+        self.assertEqual([s.headcount for s in flushed], [17])
+        latest = HeadcountSnapshot.objects.filter(event=self.event).order_by("-timestamp").first()
+        self.assertEqual((latest.headcount, latest.source), (17, "qr"))
+        self.assertEqual(flush_headcounts(), [])
+
+
+    def test_out_of_range_or_non_integer_increment_is_rejected(self):
+        for increment in (10**20, -10**20, "abc", 1.5, [1]):
+            resp = self.client.post("/api/api/scan/", {"event_id": self.event.id, "increment": increment},
+                                    format="json")
+            self.assertEqual(resp.status_code, 400, increment)
+        self.assertIsNone(get_counter().get(self.event.id))  # nothing was counted
+        resp = self.client.post("/api/api/scan-by-token/", {"token": self.event.qr_token, "increment": "3"},
+                                format="json")
+        self.assertEqual(resp.data["headcount"], 13)
+
+    def test_failed_flush_keeps_totals_dirty(self):
+        increment_headcount(self.event.id, 4)
+        with mock.patch.object(HeadcountSnapshot.objects, "bulk_create", side_effect=RuntimeError("locked")):
+            with self.assertRaises(RuntimeError):
+                flush_headcounts()
+        self.assertEqual([s.headcount for s in flush_headcounts()], [14])
+
+@override_settings(HEADCOUNT_COUNTER={"FLUSH_INTERVAL": 0}, TASK_QUEUE={"EAGER": True}, WS_BROADCAST_TICK=0)
+class BulkScanTests(TestCase):
+    def setUp(self):
+        reset_counter(LocalCounter())
+        self.a = Event.objects.create(name="A")
+        self.b = Event.objects.create(name="B")
+        HeadcountSnapshot.objects.create(event=self.b, headcount=100, source="admin")
+        self.client = APIClient()
+
+    def tearDown(self):
+        reset_counter()
+
+    def test_bulk_scan_reduces_per_event(self):
+        scans = [{"event_id": self.a.id}] * 4 + [{"token": self.b.qr_token, "increment": 3}, {"event_id": 999999}, {}]
+        resp = self.client.post("/api/api/scan/bulk/", {"scans": scans}, format="json")
+        self.assertEqual(resp.status_code, 200)
+        results = {r["event_id"]: r["headcount"] for r in resp.data["results"]}
+        self.assertEqual(results, {self.a.id: 4, self.b.id: 103})
+        self.assertEqual([e["index"] for e in resp.data["errors"]], [5, 6])
+        self.assertEqual(HeadcountSnapshot.objects.filter(event=self.a).get().headcount, 4)
+
+    def test_bulk_scan_flushes_only_its_events_and_alerts_on_the_written_rows(self):
+        other = Event.objects.create(name="Other")
+        increment_headcount(other.id, 5)  # dirty, but not part of the batch
+        resp = self.client.post("/api/api/scan/bulk/", {"scans": [{"event_id": self.b.id, "increment": 60}]},
+                                format="json")
+        self.assertEqual(resp.data["results"][0]["headcount"], 160)
+        self.assertFalse(HeadcountSnapshot.objects.filter(event=other).exists())
+        self.assertEqual(HeadcountSnapshot.objects.filter(event=self.b).count(), 2)
+        self.assertTrue(Alert.objects.filter(event=self.b, alert_type="spike").exists())
+        self.assertEqual([s.event_id for s in flush_headcounts()], [other.id])
+
+    def test_malformed_items_are_reported_without_counting(self):
+        scans = [{"token": ["a"]}, {"event_id": self.a.id, "increment": 10**20},
+                 {"event_id": self.a.id, "increment": "x"}, {"event_id": self.a.id, "increment": 2}]
+        resp = self.client.post("/api/api/scan/bulk/", {"scans": scans}, format="json")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([e["index"] for e in resp.data["errors"]], [0, 1, 2])
+        self.assertEqual(resp.data["results"], [{"event_id": self.a.id, "increment": 2, "headcount": 2}])
+
+    def test_bulk_scan_rejects_empty(self):
+        resp = self.client.post("/api/api/scan/bulk/", {"scans": []}, format="json")
+        self.assertEqual(resp.status_code, 400)
+
+
+@override_settings(HEADCOUNT_COUNTER={"FLUSH_INTERVAL": 0.2}, TASK_QUEUE={"EAGER": True}, WS_BROADCAST_TICK=0)
+class TimedFlushTests(TransactionTestCase):
+    def setUp(self):
+        reset_counter(LocalCounter())
+        self.event = Event.objects.create(name="Burst")
+        self.client = APIClient()
+
+    def tearDown(self):
+        reset_counter()
+
+    def test_burst_is_flushed_without_another_scan(self):
+        for _ in range(5):
+            resp = self.client.post("/api/api/scan/", {"event_id": self.event.id}, format="json")
+        self.assertEqual(resp.data["headcount"], 5)
+        # Only the first scan found the interval elapsed.
+        self.assertEqual(EventState.objects.get(event=self.event).headcount, 1)
+
+        deadline = time.monotonic() + 3.0
+        while EventState.objects.get(event=self.event).headcount != 5 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(EventState.objects.get(event=self.event).headcount, 5)
+        self.assertEqual(
+            list(HeadcountSnapshot.objects.filter(event=self.event).order_by("timestamp", "id")
+                 .values_list("headcount", flat=True)),
+            [1, 5],
+        )
+
+    def test_pending_counts_are_flushed_at_exit(self):
+        increment_headcount(self.event.id)
+        increment_headcount(self.event.id, 2)
+        flush_at_exit()
+        self.assertEqual(EventState.objects.get(event=self.event).headcount, 3)
+        self.assertEqual(flush_headcounts(), [])
+
+
+class EventStateTests(TestCase):
+    def setUp(self):
+        self.event = Event.objects.create(name="State", safe_threshold=10, crowded_threshold=20)
+
+    def test_state_follows_snapshot_writes(self):
+        HeadcountSnapshot.objects.create(event=self.event, headcount=12, source="admin")
+        state = EventState.objects.get(event=self.event)
+        self.assertEqual((state.headcount, state.source, state.status), (12, "admin", "Yellow"))
+
+        HeadcountSnapshot.objects.bulk_create([
+            HeadcountSnapshot(event_id=self.event.id, headcount=25, source="qr"),
+        ])
+        state.refresh_from_db()
+        self.assertEqual((state.headcount, state.status), (25, "Red"))
+
+    def test_older_snapshot_does_not_rewind_state(self):
+        HeadcountSnapshot.objects.create(event=self.event, headcount=5, source="qr")
+        old = timezone.now() - timedelta(hours=1)
+        HeadcountSnapshot.objects.create(event=self.event, headcount=50, source="admin", timestamp=old)
+        self.assertEqual(EventState.objects.get(event=self.event).headcount, 5)
+
+    def test_threshold_change_updates_status(self):
+        HeadcountSnapshot.objects.create(event=self.event, headcount=15, source="qr")
+        self.event.crowded_threshold = 15
+        self.event.save()
+        self.assertEqual(EventState.objects.get(event=self.event).status, "Red")
+
+    def test_rebuild_repairs_state(self):
+        HeadcountSnapshot.objects.create(event=self.event, headcount=7, source="qr")
+        EventState.objects.all().delete()
+        self.assertEqual(EventState.rebuild(), 1)
+        self.assertEqual(EventState.objects.get(event=self.event).headcount, 7)
+
+    def test_event_list_is_constant_queries(self):
+        for i in range(5):
+            event = Event.objects.create(name=f"E{i}")
+            HeadcountSnapshot.objects.create(event=event, headcount=i, source="qr")
+        client = APIClient()
+        with self.assertNumQueries(1):
+            resp = client.get("/api/events/")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.data), 6)
+
+
+class QueryPlanTests(TestCase):
+    """
+    Guards the hot-path indexes and per-endpoint query counts.
+    Plan assertions only run on SQLite, whose EXPLAIN QUERY PLAN output names the index used.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.event = Event.objects.create(name="Plans")
+        HeadcountSnapshot.objects.bulk_create([
+            HeadcountSnapshot(event=cls.event, headcount=i, source="qr",
+                              timestamp=timezone.now() - timedelta(minutes=i))
+            for i in range(20)
+        ])
+        Alert.objects.create(event=cls.event, alert_type="capacity", message="full")
+
+    def assertUsesIndex(self, queryset, index_name):
+        if connection.vendor != "sqlite":
+            self.skipTest("query plan assertions are written for SQLite")
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, plan)
+        self.assertNotIn("SCAN core_headcountsnapshot\n", plan + "\n", plan)
+
+    def test_latest_snapshot_uses_composite_index(self):
+        qs = HeadcountSnapshot.objects.filter(event=self.event).order_by("-timestamp")[:1]
+        self.assertUsesIndex(qs, "snapshot_event_ts_idx")
+
+    def test_snapshot_window_uses_composite_index(self):
+        qs = HeadcountSnapshot.objects.filter(
+            event=self.event, timestamp__gte=timezone.now() - timedelta(hours=49)
+        ).order_by("timestamp").values("timestamp", "headcount")
+        self.assertUsesIndex(qs, "snapshot_event_ts_idx")
+
+    def test_open_alerts_use_index(self):
+        qs = Alert.objects.filter(event=self.event, resolved=False).order_by("-created_at")
+        self.assertUsesIndex(qs, "alert_event_open_idx")
+
+    def test_heatmap_buckets_use_composite_index(self):
+        from .aggregation import bucket_queryset
+
+        self.assertUsesIndex(bucket_queryset(self.event.pk, 300), "snapshot_event_ts_idx")
+
+    def test_qr_token_lookup_uses_unique_index(self):
+        qs = Event.objects.filter(qr_token=self.event.qr_token)
+        self.assertUsesIndex(qs, "qr_token")
+
+    def test_endpoint_query_counts(self):
+        client = APIClient()
+        eid = self.event.id
+        budgets = [
+            ("/api/events/", 1),
+            (f"/api/history/?event_id={eid}", 2),
+            (f"/api/heatmap/?event_id={eid}", 3),  # rollup watermark + buckets + last readings
+            (f"/api/alerts/?event_id={eid}", 1),
+        ]
+        for url, expected in budgets:
+            with self.subTest(url=url), self.assertNumQueries(expected):
+                self.assertEqual(client.get(url).status_code, 200)
+
+
+class ModelRegistryTests(TestCase):
+    def setUp(self):
+        import joblib
+
+        self.joblib = joblib
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "model.joblib")
+        joblib.dump(ConstantModel(1), self.path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_loads_once_and_reloads_on_change(self):
+        registry = ModelRegistry(self.path, check_interval=0)
+        model, features = registry.get()
+        self.assertEqual((model.value, features), (1, ["a", "b"]))
+        self.assertIs(registry.get()[0], model)
+        self.assertEqual(registry.load_count, 1)
+
+        # Same bytes with a new mtime: hashed but not reloaded
+        os.utime(self.path, ns=(1, 1))
+        self.assertIs(registry.get()[0], model)
+        self.assertEqual(registry.load_count, 1)
+
+        self.joblib.dump(ConstantModel(2, features=("c",)), self.path)
+        os.utime(self.path, ns=(2, 2))
+        model, features = registry.get()
+        self.assertEqual((model.value, features, registry.load_count), (2, ["c"], 2))
+
+    def test_missing_file_is_reported(self):
+        registry = ModelRegistry(os.path.join(self.tmp.name, "absent.joblib"))
+        with self.assertRaises(OSError):
+            registry.get()
+        self.assertFalse(registry.info()["loaded"])
+        self.assertIsNotNone(registry.info()["last_error"])
+
+    def test_compiled_export_is_served_unless_joblib_is_newer(self):
+        compiled_path = os.path.join(self.tmp.name, "model.npz")
+        CompiledTrees.from_trees([[[-1, 0.0, -1, -1, 5.0]]], 2.0, feature_names=["a", "b"]).save(compiled_path)
+        os.utime(self.path, ns=(1, 1))
+        os.utime(compiled_path, ns=(2, 2))
+        registry = ModelRegistry(self.path, check_interval=0, compiled_path=compiled_path)
+        model, features = registry.get()
+        self.assertIsInstance(model, CompiledTrees)
+        self.assertEqual((list(model.predict([[0, 0]])), features), ([7.0], ["a", "b"]))
+        self.assertTrue(registry.info()["compiled"])
+
+        os.utime(self.path, ns=(3, 3))  # retrained without re-exporting
+        model, _ = registry.get()
+        self.assertEqual(model.value, 1)
+        self.assertEqual(registry.info()["file"], "model.joblib")
+
+    def test_model_info_endpoint(self):
+        resp = APIClient().get("/api/ml/model/")
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn("version", resp.data)
+
+
+class StatusViewTests(TestCase):
+    def setUp(self):
+        feature_engine.reset()
+
+    @override_settings(FORECAST_INLINE_FALLBACK=True)
+    def test_status_falls_back_to_heuristic(self):
+        event = Event.objects.create(name="Status")
+        HeadcountSnapshot.objects.create(event=event, headcount=100, source="admin")
+        resp = APIClient().get(f"/api/status/?event_id={event.id}")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data["headcount"], 100)
+        self.assertIsNotNone(resp.data["predicted_next_hour"])
+
+
+class PredictionCacheTests(TestCase):
+    def setUp(self):
+        caches["predictions"].clear()
+        reset_cache_stats()
+        feature_engine.reset()
+        self.event = Event.objects.create(name="Cache")
+        self.calls = 0
+
+    def compute(self, event, target):
+        self.calls += 1
+        return self.calls, "model"
+
+    def test_hits_until_new_snapshot(self):
+        target = timezone.now()
+        self.assertEqual(cached_prediction(self.event, target, 1, self.compute), (1, "model"))
+        self.assertEqual(cached_prediction(self.event, target, 1, self.compute), (1, "model"))
+        self.assertEqual(cached_prediction(self.event, target, 2, self.compute), (2, "model"))
+        self.assertEqual(cached_prediction(self.event, target + timedelta(hours=1), 2, self.compute), (3, "model"))
+        self.assertEqual(cache_stats(), {"hits": 1, "misses": 3, "hit_rate": 0.25})
+
+    @override_settings(FORECAST_INLINE_FALLBACK=True)
+    def test_status_view_polls_share_one_inference(self):
+        HeadcountSnapshot.objects.create(event=self.event, headcount=40, source="qr")
+        client = APIClient()
+        for _ in range(5):
+            self.assertEqual(client.get(f"/api/status/?event_id={self.event.id}").status_code, 200)
+        self.assertEqual(cache_stats()["misses"], 1)
+        HeadcountSnapshot.objects.create(event=self.event, headcount=41, source="qr")
+        client.get(f"/api/status/?event_id={self.event.id}")
+        self.assertEqual(cache_stats(), {"hits": 4, "misses": 2, "hit_rate": 4 / 6})
+
+
+def synthetic_readings(hours=60, per_hour=4, gap=(20, 23), start=None):
+    """(timestamp, headcount) pairs every 60/per_hour minutes, with a gap of empty hours."""
+    start = start or datetime(2025, 9, 5, 0, 0, tzinfo=dt_timezone.utc)
+    rows = []
+    for h in range(hours):
+        if gap[0] <= h < gap[1]:
+            continue
+        for k in range(per_hour):
+            ts = start + timedelta(hours=h, minutes=k * 60 // per_hour)
+            rows.append((ts, 100 + 37 * ((h * per_hour + k) % 11) + 5 * h))
+    return rows
+
+
+class FeatureEngineTests(TestCase):
+    def test_parity_with_pandas_pipeline(self):
+        rows = synthetic_readings()
+        now = rows[-1][0].replace(minute=0) + timedelta(hours=1)
+        start = now - timedelta(hours=49)
+        window_rows = [r for r in rows if r[0] >= start]
+
+        expected = pandas_feature_frame(window_rows).tail(1).iloc[0]
+        buffer = HourlyRingBuffer(50)
+        for ts, value in rows:
+            buffer.add(int(ts.timestamp()) // 3600, value)
+        features, reason = features_from_buffer(buffer, int(start.timestamp()) // 3600)
+
+        self.assertIsNone(reason)
+        for name in ml.DEFAULT_MODEL_FEATURES:
+            self.assertAlmostEqual(features[name], float(expected[name]), places=9, msg=name)
+
+    def test_fallback_reasons(self):
+        buffer = HourlyRingBuffer(50)
+        for ts, value in synthetic_readings(hours=2):
+            buffer.add(int(ts.timestamp()) // 3600, value)
+        self.assertEqual(features_from_buffer(buffer, 0)[1], "heuristic_insufficient_data")
+        for ts, value in synthetic_readings(hours=30, gap=(0, 0)):
+            buffer.add(int(ts.timestamp()) // 3600, value)
+        self.assertEqual(features_from_buffer(buffer, 0)[1], "heuristic_nan_after_feature_eng")
+
+    def test_run_ml_predict_reads_new_snapshots_incrementally(self):
+        event = Event.objects.create(name="Features")
+        rows = synthetic_readings(gap=(0, 0))
+        HeadcountSnapshot.objects.bulk_create(
+            [HeadcountSnapshot(event=event, headcount=v, source="qr", timestamp=ts) for ts, v in rows]
+        )
+        now = rows[-1][0] + timedelta(hours=1)
+        feature_engine.reset()
+        model = ConstantModel(321, features=ml.DEFAULT_MODEL_FEATURES)
+        with mock.patch.object(ml.model_registry, "get", return_value=(model, ml.DEFAULT_MODEL_FEATURES)):
+            self.assertEqual(ml.run_ml_predict(event, now), (321, "model"))
+            HeadcountSnapshot.objects.create(event=event, headcount=5, source="qr", timestamp=rows[-1][0])
+            with self.assertNumQueries(1):
+                ml.run_ml_predict(event, now)
+        feature_engine.reset()
+
+    def test_model_failure_is_logged_not_printed(self):
+        event = Event.objects.create(name="Broken model")
+        rows = synthetic_readings(gap=(0, 0))
+        HeadcountSnapshot.objects.bulk_create(
+            [HeadcountSnapshot(event=event, headcount=v, source="qr", timestamp=ts) for ts, v in rows]
+        )
+        feature_engine.reset()
+        with mock.patch.object(ml.model_registry, "get", side_effect=RuntimeError("no model")), \
+                self.assertLogs("core.ml", "WARNING") as logs:
+            _, reason = ml.run_ml_predict(event, rows[-1][0] + timedelta(hours=1))
+        feature_engine.reset()
+        self.assertEqual(reason, "heuristic_error_no model")
+        self.assertIn("ML model prediction failed: no model", logs.output[0])
+
+
+class BatchForecastTests(TestCase):
+    def setUp(self):
+        feature_engine.reset()
+        rows = synthetic_readings(gap=(0, 0))
+        self.now = rows[-1][0] + timedelta(hours=1)
+        self.full = [Event.objects.create(name=f"Full {i}") for i in range(3)]
+        self.sparse = Event.objects.create(name="Sparse")
+        snaps = [
+            HeadcountSnapshot(event=event, headcount=v + i, source="qr", timestamp=ts)
+            for i, event in enumerate(self.full) for ts, v in rows
+        ]
+        snaps.append(HeadcountSnapshot(event=self.sparse, headcount=80, source="qr", timestamp=rows[-1][0]))
+        HeadcountSnapshot.objects.bulk_create(snaps)
+
+    def tearDown(self):
+        feature_engine.reset()
+
+    def test_one_query_and_one_predict_call(self):
+        model = ConstantModel(500, features=ml.DEFAULT_MODEL_FEATURES)
+        events = list(Event.objects.select_related("state"))
+        with mock.patch.object(ml.model_registry, "get", return_value=(model, ml.DEFAULT_MODEL_FEATURES)), \
+                mock.patch.object(model, "predict", wraps=model.predict) as predict, \
+                self.assertNumQueries(2):  # cold buffers also read the rollup watermark
+            results = ml.run_ml_predict_batch(events, self.now)
+        predict.assert_called_once()
+        self.assertEqual(predict.call_args[0][0].shape, (3, len(ml.DEFAULT_MODEL_FEATURES)))
+        for event in self.full:
+            self.assertEqual(results[event.id], (500, "model"))
+        self.assertEqual(results[self.sparse.id][1], "heuristic_insufficient_data")
+
+    def test_model_failure_is_logged(self):
+        events = list(Event.objects.select_related("state"))
+        with mock.patch.object(ml.model_registry, "get", side_effect=RuntimeError("no model")), \
+                self.assertLogs("core.ml", "WARNING") as logs:
+            results = ml.run_ml_predict_batch(events, self.now)
+        self.assertEqual(results[self.full[0].id][1], "heuristic_error_no model")
+        self.assertIn("Batch ML prediction failed: no model", logs.output[0])
+
+    def test_static_features_come_from_the_venue_registry(self):
+        Event.objects.filter(pk=self.full[0].pk).update(venue="lalbaugcha_raja")
+        Event.objects.filter(pk=self.full[1].pk).update(venue="kashi_vishwanath", date=self.now.date() - timedelta(days=2))
+        model = ConstantModel(500, features=ml.DEFAULT_MODEL_FEATURES)
+        events = list(Event.objects.select_related("state").filter(pk__in=[e.pk for e in self.full]).order_by("pk"))
+        with mock.patch.object(ml.model_registry, "get", return_value=(model, ml.DEFAULT_MODEL_FEATURES)), \
+                mock.patch.object(model, "predict", wraps=model.predict) as predict:
+            ml.run_ml_predict_batch(events, self.now)
+        matrix = predict.call_args[0][0]
+        column = {name: matrix[:, j] for j, name in enumerate(ml.DEFAULT_MODEL_FEATURES)}
+        self.assertEqual(list(column["mandal_encoded"]), [3, 7, STATIC_FEATURES["mandal_encoded"]])
+        self.assertEqual(list(column["is_mumbai"]), [1, 0, 1])
+        self.assertAlmostEqual(column["festival_progress"][1], 3 / 9)
+        self.assertEqual(column["days_to_visarjan"][1], 6)
+        self.assertEqual(column["is_special_day"][1], 1)  # every Navratri day is special at Kashi
+
+        serializer = EventSerializer(data={"name": "Elsewhere", "venue": "atlantis"})
+        self.assertFalse(serializer.is_valid())
+        self.assertIn("venue", serializer.errors)
+
+    def test_batch_endpoint(self):
+        ids = ",".join(str(e.id) for e in self.full[:2])
+        resp = APIClient().get(f"/api/forecast/batch/?event_ids={ids}")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([f["event_id"] for f in resp.data["forecasts"]], [e.id for e in self.full[:2]])
+        self.assertEqual(APIClient().get("/api/forecast/batch/?event_ids=x").status_code, 400)
+
+
+class MultiOutputModel(ConstantModel):
+    def predict(self, X):
+        return [[self.value + h for h in range(6)] for _ in range(len(X))]
+
+
+class ForecastTests(TestCase):
+    def setUp(self):
+        feature_engine.reset()
+        self.rows = synthetic_readings(gap=(0, 0), start=timezone.now().replace(
+            minute=0, second=0, microsecond=0) - timedelta(hours=59))
+        self.event = Event.objects.create(name="Forecast")
+        HeadcountSnapshot.objects.bulk_create(
+            [HeadcountSnapshot(event=self.event, headcount=v, source="qr", timestamp=ts) for ts, v in self.rows]
+        )
+
+    def tearDown(self):
+        feature_engine.reset()
+
+    def _refresh(self, model):
+        with mock.patch.object(ml.model_registry, "get", return_value=(model, ml.DEFAULT_MODEL_FEATURES)):
+            return refresh_forecasts(Event.objects.all())
+
+    def test_single_output_model_is_rolled_forward(self):
+        model = ConstantModel(200, features=ml.DEFAULT_MODEL_FEATURES)
+        with mock.patch.object(model, "predict", wraps=model.predict) as predict:
+            self._refresh(model)
+        self.assertEqual(predict.call_count, ml.FORECAST_HORIZONS)
+        stored = list(Forecast.objects.filter(event=self.event).order_by("horizon_hours"))
+        self.assertEqual([f.horizon_hours for f in stored], [1, 2, 3, 4, 5, 6])
+        self.assertEqual({f.method for f in stored}, {"model"})
+        last_hour = self.rows[-1][0].replace(minute=0)
+        self.assertEqual(stored[0].target_time, last_hour + timedelta(hours=1))
+
+    def test_each_horizon_predicts_the_row_for_its_target_hour(self):
+        class HourModel(ConstantModel):
+            def predict(self, X):
+                return [row[self.feature_names_in_.index("hour")] + 1000 for row in X]
+
+        features = ml.DEFAULT_MODEL_FEATURES + ["hour"]
+        with mock.patch.object(ml.model_registry, "get", return_value=(HourModel(0, features), features)):
+            refresh_forecasts(Event.objects.all())
+        stored = Forecast.objects.filter(event=self.event).order_by("horizon_hours")
+        self.assertEqual([f.predicted_headcount for f in stored], [f.target_time.hour + 1000 for f in stored])
+
+    def test_model_failure_is_logged(self):
+        with mock.patch.object(ml.model_registry, "get", side_effect=RuntimeError("no model")), \
+                self.assertLogs("core.ml", "WARNING") as logs:
+            refresh_forecasts(Event.objects.all())
+        methods = set(Forecast.objects.filter(event=self.event).values_list("method", flat=True))
+        self.assertEqual(methods, {"heuristic_error_no model"})
+        self.assertIn("Multi-horizon ML prediction failed: no model", logs.output[0])
+
+    def test_multi_output_model_and_rerun_overwrites(self):
+        self._refresh(ConstantModel(1, features=ml.DEFAULT_MODEL_FEATURES))
+        self._refresh(MultiOutputModel(300, features=ml.DEFAULT_MODEL_FEATURES))
+        values = list(Forecast.objects.filter(event=self.event).order_by("horizon_hours")
+                      .values_list("predicted_headcount", flat=True))
+        self.assertEqual(values, [300, 301, 302, 303, 304, 305])
+
+    def test_status_and_forecast_endpoints_serve_stored_rows(self):
+        self._refresh(MultiOutputModel(300, features=ml.DEFAULT_MODEL_FEATURES))
+        client = APIClient()
+        with mock.patch("core.ml.run_ml_predict") as inline:
+            resp = client.get(f"/api/status/?event_id={self.event.id}")
+        inline.assert_not_called()
+        self.assertIn(resp.data["predicted_next_hour"], (300, 301))
+        resp = client.get(f"/api/forecast/?event_id={self.event.id}")
+        self.assertEqual(len(resp.data["forecasts"]), 6)
+
+        Forecast.objects.update(generated_at=timezone.now() - timedelta(hours=1))
+        resp = client.get(f"/api/status/?event_id={self.event.id}")
+        self.assertIsNone(resp.data["predicted_next_hour"])  # stale forecasts are not served
+
+
+@override_settings(TASK_QUEUE={"EAGER": False})
+class EventTaskQueueTests(TestCase):
+    def test_per_event_order_and_drain(self):
+        tasks = EventTaskQueue(workers=3, maxsize=50)
+        seen = {1: [], 2: []}
+        for i in range(40):
+            tasks.submit(1, seen[1].append, i)
+            tasks.submit(2, seen[2].append, i)
+        tasks.drain()
+        self.assertEqual(seen, {1: list(range(40)), 2: list(range(40))})
+        metrics = tasks.metrics()
+        self.assertEqual((metrics["depth"], metrics["completed"]), (0, 80))
+        tasks.shutdown()
+        self.assertEqual(tasks.metrics()["workers_running"], 0)
+
+    def test_full_queue_applies_backpressure(self):
+        tasks = EventTaskQueue(workers=1, maxsize=1, submit_timeout=0.05)
+        gate, started = threading.Event(), threading.Event()
+        tasks.submit(1, lambda: (started.set(), gate.wait()))
+        started.wait(5)
+        tasks.submit(1, lambda: None)  # fills the single slot while the worker is blocked
+        with self.assertRaises(queue.Full):
+            tasks.submit(1, lambda: None)
+        self.assertEqual(tasks.metrics()["depth"], 1)
+        ran = []
+        tasks.submit_or_run(1, ran.append, "overflow")
+        self.assertEqual((ran, tasks.metrics()["overflow"]), (["overflow"], 1))
+        gate.set()
+        tasks.shutdown()
+        self.assertEqual(tasks.metrics()["completed"], 2)
+
+    def test_failures_are_counted_and_shutdown_runs_inline(self):
+        tasks = EventTaskQueue(workers=1)
+        with self.assertLogs("core.tasks", level="ERROR"):
+            tasks.submit(1, lambda: 1 / 0)
+            tasks.drain()
+        tasks.shutdown()
+        ran = []
+        tasks.submit(1, ran.append, "late")
+        self.assertEqual((tasks.metrics()["failed"], ran), (1, ["late"]))
+
+    def test_pending_tasks_can_publish_at_interpreter_exit(self):
+        import subprocess
+        import sys
+
+        script = (
+            "import time, django; django.setup()\n"
+            "from asgiref.sync import async_to_sync\n"
+            "from core import tasks\n"
+            "async def publish(): print('published', flush=True)\n"
+            "tasks.submit(1, lambda: (time.sleep(0.2), async_to_sync(publish)()))\n"
+        )
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": "crowd_mgmt.settings"}
+        result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True,
+                                env=env, cwd=os.path.dirname(os.path.dirname(__file__)), timeout=60)
+        self.assertEqual(result.stdout.strip(), "published", result.stderr[-2000:])
+
+    def test_shutdown_hook_falls_back_to_atexit(self):
+        hook = mock.Mock()
+        with mock.patch("core.tasks.threading", mock.Mock(spec=[])), \
+                mock.patch("core.tasks.atexit.register") as register:
+            at_shutdown(hook)
+        register.assert_called_once_with(hook)
+
+
+class WebsocketClient:
+    """Tiny stand-in for channels.testing.WebsocketCommunicator (which needs daphne)."""
+
+    def __init__(self, path, query_string=b"", subprotocols=()):
+        self.comm = ApplicationCommunicator(URLRouter(websocket_urlpatterns), {
+            "type": "websocket",
+            "path": path,
+            "query_string": query_string,
+            "headers": [],
+            "subprotocols": list(subprotocols),
+        })
+
+    async def connect(self):
+        await self.comm.send_input({"type": "websocket.connect"})
+        return await self.comm.receive_output(1)
+
+    async def receive(self, timeout=1):
+        return await self.comm.receive_output(timeout)
+
+    async def receive_json(self, timeout=1):
+        return json.loads((await self.receive(timeout))["text"])
+
+    async def receive_nothing(self, timeout=0.1):
+        return await self.comm.receive_nothing(timeout)
+
+    async def disconnect(self):
+        await self.comm.send_input({"type": "websocket.disconnect", "code": 1000})
+        await self.comm.wait(1)
+
+
+def headcount_message(event_id, headcount):
+    return {"type": "headcount_update", "data": {
+        "headcount": headcount, "timestamp": None, "source": "qr", "event_id": event_id}}
+
+
+class CoalescingConsumerTests(SimpleTestCase):
+    def setUp(self):
+        for counter in BROADCAST_STATS.values():
+            counter.clear()
+
+    @override_settings(WS_BROADCAST_TICK=0.2)
+    def test_updates_coalesce_per_event_before_publishing(self):
+        sent = []
+        coalescer = fanout.BroadcastCoalescer(
+            lambda event_id, message: sent.append((event_id, message.get("headcount", message["type"])))
+        )
+        for i in range(1, 11):
+            coalescer.broadcast(7, {"type": "headcount_update", "headcount": i})
+        coalescer.broadcast(8, {"type": "headcount_update", "headcount": 1})
+        self.assertEqual(sent, [(7, 1), (8, 1)])  # leading edges go out immediately
+
+        deadline = time.monotonic() + 3.0
+        while len(sent) < 3 and time.monotonic() < deadline:
+            time.sleep(0.02)
+        self.assertEqual(sent[2], (7, 10))  # trailing edge, latest wins
+
+        coalescer.broadcast(7, {"type": "headcount_update", "headcount": 11})
+        coalescer.broadcast(7, {"type": "alert_message"})
+        self.assertEqual(sent[3:], [(7, 11), (7, "alert_message")])  # flushed ahead of the alert
+        time.sleep(0.3)
+        self.assertEqual(len(sent), 5)  # nothing left for the cancelled trailing edge
+        self.assertEqual(coalescer.stats["suppressed"]["7"], 8)
+        self.assertEqual(coalescer.stats["published"]["7"], 4)
+
+    def test_exit_hook_drains_tasks_before_flushing(self):
+        calls = mock.Mock()
+        with mock.patch("core.fanout.tasks.shutdown", calls.shutdown), \
+                mock.patch.object(fanout.coalescer, "flush_all", calls.flush_all):
+            fanout._flush_at_exit()
+        self.assertEqual(calls.mock_calls, [mock.call.shutdown(), mock.call.flush_all()])
+
+    async def test_every_group_message_is_sent(self):
+        ws = WebsocketClient("/ws/event/8/")
+        await ws.connect()
+        await ws.receive_json()
+        for i in range(3):
+            await get_channel_layer().group_send("event_8", headcount_message(8, i))
+        self.assertEqual([(await ws.receive_json())["headcount"] for _ in range(3)], [0, 1, 2])
+        await ws.disconnect()
+        self.assertEqual(BROADCAST_STATS["delivered"]["8"], 3)
+
+    async def test_prebuilt_frame_is_forwarded_verbatim(self):
+        ws = WebsocketClient("/ws/event/9/")
+        await ws.connect()
+        await ws.receive_json()
+        message = headcount_message(9, 5)
+        message["frame"] = '{"type":"headcount_update","headcount":5}'
+        await get_channel_layer().group_send("event_9", message)
+        self.assertEqual((await ws.receive())["text"], message["frame"])
+        await ws.disconnect()
+
+
+@override_settings(WS_BROADCAST_TICK=0)
+class BroadcastFrameTests(TestCase):
+    def test_frames_are_encoded_once_without_serializer_queries(self):
+        from . import views
+
+        event = Event.objects.create(name="Fair", safe_threshold=10, crowded_threshold=20)
+        HeadcountSnapshot.objects.create(event=event, headcount=15, source="admin")
+        event = Event.objects.select_related("state").get(pk=event.pk)
+        sent = []
+        with mock.patch.object(views.fanout, "publish", lambda event_id, message: sent.append(message)):
+            with self.assertNumQueries(0):
+                views.broadcast_update(event)
+        self.assertEqual(json.loads(sent[0]["frame"]), {"type": "event_update", "headcount": 15, "status": "Yellow"})
+
+    def test_dumps_falls_back_for_types_orjson_rejects(self):
+        from decimal import Decimal
+        from .fastjson import dumps
+
+        self.assertEqual(json.loads(dumps({"a": 1, "b": [1, 2]})), {"a": 1, "b": [1, 2]})
+        self.assertEqual(json.loads(dumps({"d": Decimal("1.5")})), {"d": "1.5"})
+
+
+class CompactProtocolTests(TransactionTestCase):
+    def test_negotiation(self):
+        self.assertEqual(wsprotocol.negotiate({"subprotocols": ["crowd.compact.v1"]}), ("compact", "crowd.compact.v1"))
+        self.assertEqual(wsprotocol.negotiate({"query_string": b"proto=binary"}), ("binary", None))
+        self.assertEqual(wsprotocol.negotiate({"subprotocols": ["other"], "query_string": b""}), ("verbose", None))
+
+    def test_encoder_sends_sequenced_deltas(self):
+        encoder = wsprotocol.DeltaEncoder()
+        self.assertEqual(json.loads(encoder.snapshot(100, "2025-09-05T18:00:00+00:00", "Yellow")),
+                         ["s", 1, 100, 1757095200, 1])
+        self.assertEqual(json.loads(encoder.headcount_update(
+            {"headcount": 90, "timestamp": "2025-09-05T18:00:30+00:00"})), ["h", 2, -10, 30])
+
+        binary = wsprotocol.DeltaEncoder(binary=True)
+        binary.snapshot(100, "2025-09-05T18:00:00+00:00", "Red")
+        frame = binary.headcount_update({"headcount": 103, "timestamp": "2025-09-05T18:00:05+00:00"})
+        self.assertEqual(len(frame), 13)
+        self.assertEqual(wsprotocol.decode_binary(frame), ("h", 2, 3, 5))
+
+    async def test_compact_stream_snapshot_deltas_and_resync(self):
+        event = await Event.objects.acreate(name="Fair", safe_threshold=10, crowded_threshold=20)
+        await HeadcountSnapshot.objects.acreate(event=event, headcount=15, source="admin")
+
+        ws = WebsocketClient(f"/ws/event/{event.pk}/", subprotocols=["crowd.compact.v1"])
+        self.assertEqual((await ws.connect())["subprotocol"], "crowd.compact.v1")
+        kind, seq, headcount, _, status = await ws.receive_json()
+        self.assertEqual((kind, seq, headcount, status), ("s", 1, 15, 1))
+
+        await get_channel_layer().group_send(f"event_{event.pk}", headcount_message(event.pk, 18))
+        self.assertEqual((await ws.receive_json())[:3], ["h", 2, 3])
+
+        await ws.comm.send_input({"type": "websocket.receive", "text": '["r"]'})
+        self.assertEqual((await ws.receive_json())[:3], ["s", 3, 15])
+        await ws.disconnect()
+
+    async def test_binary_stream_via_query_param(self):
+        ws = WebsocketClient("/ws/event/4242/", query_string=b"proto=binary")
+        await ws.connect()
+        snapshot = wsprotocol.decode_binary((await ws.receive())["bytes"])
+        self.assertEqual(snapshot[:3], ("s", 1, 0))
+        await get_channel_layer().group_send("event_4242", headcount_message(4242, 7))
+        self.assertEqual(wsprotocol.decode_binary((await ws.receive())["bytes"])[:3], ("h", 2, 7))
+        await ws.disconnect()
+
+
+class RedisChannelLayerTests(SimpleTestCase):
+    async def test_send_receive_and_group_fanout(self):
+        layer = RedisChannelLayer(client=FakeAsyncRedis(), capacity=2)
+        a, b = await layer.new_channel(), await layer.new_channel()
+        await layer.send(a, {"type": "hello", "n": 1})
+        self.assertEqual(await layer.receive(a), {"type": "hello", "n": 1})
+
+        await layer.group_add("event_1.0", a)
+        await layer.group_add("event_1.0", b)
+        for n in range(3):  # third message overflows capacity and is dropped
+            await layer.group_send("event_1.0", {"type": "headcount_update", "n": n})
+        self.assertEqual([(await layer.receive(b))["n"] for _ in range(2)], [0, 1])
+
+        await layer.group_discard("event_1.0", b)
+        await layer.group_send("event_1.0", {"type": "x"})
+        self.assertEqual(await layer.client.llen(layer._channel_key(b)), 0)
+        with self.assertRaises(ChannelFull):
+            await layer.send(a, {"type": "x"})
+
+    async def test_concurrent_sends_never_overfill(self):
+        layer = RedisChannelLayer(client=FakeAsyncRedis(), capacity=2)
+        channel = await layer.new_channel()
+        results = await asyncio.gather(
+            *(layer.send(channel, {"type": "x", "n": n}) for n in range(5)), return_exceptions=True
+        )
+        self.assertEqual(sum(isinstance(r, ChannelFull) for r in results), 3)
+        self.assertEqual(await layer.client.llen(layer._channel_key(channel)), 2)
+
+
+class ShardedFanoutTests(SimpleTestCase):
+    def test_group_names(self):
+        self.assertEqual(fanout.group_names(3), ["event_3"])
+        with override_settings(WS_FANOUT={"SHARDS": 4}):
+            self.assertEqual(len(fanout.group_names(3)), 4)
+            self.assertIn(fanout.group_for(3, "specific.abc"), fanout.group_names(3))
+
+    @override_settings(WS_FANOUT={"SHARDS": 4})
+    async def test_publish_reaches_sockets_on_every_shard(self):
+        sockets = [WebsocketClient("/ws/event/11/") for _ in range(8)]
+        for ws in sockets:
+            await ws.connect()
+            await ws.receive_json()
+        self.assertEqual(fanout.connections.count(11), 8)
+        await fanout.apublish(11, headcount_message(11, 42))
+        for ws in sockets:
+            self.assertEqual((await ws.receive_json())["headcount"], 42)
+            await ws.disconnect()
+        self.assertEqual(fanout.connections.count(11), 0)
+
+    @override_settings(WS_FANOUT={"SHARDS": 2, "LOCAL_REBROADCAST": True})
+    async def test_local_rebroadcast_uses_one_upstream_subscription(self):
+        fanout.relay.upstream.clear()
+        sockets = [WebsocketClient("/ws/event/12/") for _ in range(5)]
+        for ws in sockets:
+            await ws.connect()
+            await ws.receive_json()
+        self.assertEqual(fanout.relay.subscriber_count(12), 5)
+
+        await fanout.apublish(12, headcount_message(12, 7))
+        for ws in sockets:
+            self.assertEqual((await ws.receive_json())["headcount"], 7)
+        self.assertEqual(fanout.relay.upstream["12"], 1)
+
+        for ws in sockets:
+            await ws.disconnect()
+        self.assertEqual(fanout.relay.subscriber_count(12), 0)
+
+
+@override_settings(WS_FANOUT={"LOCAL_REBROADCAST": True, "INBOX_SIZE": 2})
+class RelayInboxTests(TransactionTestCase):
+    def setUp(self):
+        for counter in BROADCAST_STATS.values():
+            counter.clear()
+
+    async def connect(self, event_id):
+        ws = WebsocketClient(f"/ws/event/{event_id}/")
+        await ws.connect()
+        await ws.receive_json()
+        (consumer,) = fanout.relay._subscribers[str(event_id)]
+        return ws, consumer
+
+    async def test_full_inbox_drops_updates_then_resyncs(self):
+        ws, consumer = await self.connect(14)
+        for n in range(5):  # queued without yielding, so the inbox overflows
+            consumer.deliver(headcount_message(14, n))
+        self.assertEqual([(await ws.receive_json())["headcount"] for _ in range(2)], [0, 1])
+        self.assertEqual(await ws.receive_json(), {"type": "snapshot", "headcount": 0, "timestamp": None, "status": "Green"})
+        self.assertEqual(BROADCAST_STATS["dropped"]["14"], 3)
+        await ws.disconnect()
+
+    async def test_alert_that_does_not_fit_closes_for_resync(self):
+        ws, consumer = await self.connect(15)
+        for n in range(2):
+            consumer.deliver(headcount_message(15, n))
+        consumer.deliver({"type": "alert_message", "data": {"message": "Red"}})
+        outputs = [await ws.receive() for _ in range(3)]
+        self.assertIn({"type": "websocket.close", "code": RESYNC_CLOSE_CODE}, outputs)
+        await ws.disconnect()
+
+
+@override_settings(TASK_QUEUE={"EAGER": True}, WS_BROADCAST_TICK=0)
+class LoadTestTests(TransactionTestCase):
+    def test_small_run_reports_latency_and_no_lost_counts(self):
+        from .loadtest import compare_results, run_load_test
+
+        # One scanner: Django runs each ASGI request in its own thread, and the shared-cache
+        # in-memory test database fails concurrent writers instead of waiting like a file would.
+        results = run_load_test(events=1, scanners=1, scans_per_scanner=12, dashboards=0,
+                                ws_clients=4, settle=3.0, log=lambda msg: None)
+        scans = results["http"]["scan_by_token"]
+        self.assertEqual((scans["count"], scans["errors"]), (12, 0))
+        self.assertLessEqual(scans["p50_ms"], scans["p95_ms"])
+        self.assertLessEqual(scans["p95_ms"], scans["p99_ms"])
+        self.assertEqual(results["correctness"]["lost_counts"], 0)
+        self.assertEqual(results["correctness"]["recorded_total"], 12)
+        self.assertEqual(results["websocket"]["stale"], 0)
+        self.assertFalse(Event.objects.filter(name__startswith="loadtest-").exists())
+
+        baseline = {"http": {"scan_by_token": dict(scans, p50_ms=scans["p50_ms"] * 2)}}
+        self.assertEqual(compare_results(results, baseline)["scan_by_token"]["p50_ms"][2], -50.0)
+
+
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        metrics.reset()
+
+    def test_requests_record_route_latency_and_queries(self):
+        event = Event.objects.create(name="Fair")
+        HeadcountSnapshot.objects.create(event=event, headcount=5, source="admin")
+        client = APIClient()
+        with override_settings(INSTRUMENTATION={"SLOW_REQUEST_SECONDS": 0, "SLOW_SAMPLE_RATE": 1.0}):
+            with self.assertLogs("core.slow_requests", "WARNING") as logs:
+                self.assertEqual(client.get("/api/status/", {"event_id": event.pk}).status_code, 200)
+        self.assertIn("SELECT", logs.output[0])
+
+        labels = (("method", "GET"), ("route", "/api/status/"), ("status", "2xx"))
+        self.assertEqual(metrics.histogram("http_request_duration_seconds", labels).count, 1)
+        self.assertGreater(metrics.counter_value("http_db_queries_total", (("route", "/api/status/"),)), 0)
+
+        body = client.get("/api/metrics/").content.decode()
+        self.assertIn('http_request_duration_seconds_bucket{method="GET",route="/api/status/",status="2xx",le="+Inf"} 1', body)
+        self.assertIn("# TYPE http_db_queries_total counter", body)
+        self.assertIn('cache_requests_total{cache="predictions",result="miss"}', body)
+
+    def test_ml_fallback_reasons_are_bounded_labels(self):
+        record_ml("single", 0.002, ("model",))
+        record_ml("single", reasons=("heuristic_error_boom",))
+        self.assertEqual(metrics.counter_value(
+            "ml_predictions_total", (("path", "single"), ("reason", "heuristic_error"))), 1)
+        self.assertEqual(metrics.histogram("ml_inference_seconds", (("path", "single"),)).count, 1)
+
+    def test_histogram_lines_are_in_bucket_order(self):
+        from .instrumentation import LATENCY_BUCKETS, render_prometheus
+
+        record_ml("single", 3.0)
+        record_ml("batch", 0.02)
+        lines = [line for line in render_prometheus().splitlines() if line.startswith("ml_inference_seconds")]
+        per_series = len(LATENCY_BUCKETS) + 3
+        self.assertEqual(len(lines), 2 * per_series)
+        self.assertTrue(all('path="batch"' in line for line in lines[:per_series]))
+        single = lines[per_series:]
+        self.assertEqual([line.split('le="')[1].split('"')[0] for line in single[:-2]],
+                         [str(bound) for bound in LATENCY_BUCKETS] + ["+Inf"])
+        self.assertEqual([line.split("{")[0] for line in single[-2:]],
+                         ["ml_inference_seconds_sum", "ml_inference_seconds_count"])
+
+
+class InstrumentedConsumerTests(SimpleTestCase):
+    async def test_handlers_are_timed(self):
+        metrics.reset()
+        ws = WebsocketClient("/ws/event/21/")
+        await ws.connect()
+        await ws.receive_json()
+        await ws.disconnect()
+        labels = (("consumer", "EventConsumer"), ("type", "websocket.connect"))
+        self.assertEqual(metrics.histogram("ws_handler_duration_seconds", labels).count, 1)
+
+
+class HeatmapAggregationTests(TestCase):
+    def setUp(self):
+        self.event = Event.objects.create(name="Fair")
+        self.start = datetime(2025, 9, 5, 18, 0, tzinfo=dt_timezone.utc)  # epoch multiple of 420
+        self.readings = [(self.start + timedelta(seconds=50 * i), (i * 37) % 101) for i in range(40)]
+        HeadcountSnapshot.objects.bulk_create([
+            HeadcountSnapshot(event=self.event, headcount=h, source="qr", timestamp=ts) for ts, h in self.readings
+        ])
+
+    def test_arbitrary_interval_matches_python_reference(self):
+        expected = {}
+        for ts, headcount in self.readings:
+            key = int(ts.timestamp()) // 420 * 420
+            expected.setdefault(key, []).append(headcount)
+        rows = bucket_snapshots(self.event.pk, 420)
+        self.assertEqual([int(r["bucket"].timestamp()) for r in rows], sorted(expected))
+        for row in rows:
+            values = expected[int(row["bucket"].timestamp())]
+            self.assertEqual((row["last"], row["max"], row["min"], row["samples"]),
+                             (values[-1], max(values), min(values), len(values)))
+            self.assertAlmostEqual(row["avg"], sum(values) / len(values))
+
+    def test_last_is_latest_timestamp_not_latest_insert(self):
+        HeadcountSnapshot.objects.create(event=self.event, headcount=999, source="admin",
+                                         timestamp=self.start + timedelta(seconds=10))
+        first = bucket_snapshots(self.event.pk, 420)[0]
+        self.assertEqual(first["last"], self.readings[8][1])  # 400s reading is still the latest
+        self.assertEqual(first["max"], 999)
+
+    def test_dialect_sql(self):
+        from django.db.models.sql import Query
+        from .aggregation import EpochBucket
+
+        compiler = Query(HeadcountSnapshot).get_compiler(connection=connection)
+        bucket = EpochBucket("timestamp", 90).resolve_expression(Query(HeadcountSnapshot))
+        sql, _ = bucket.as_postgresql(compiler, connection)
+        self.assertIn('FLOOR(EXTRACT(EPOCH FROM "core_headcountsnapshot"."timestamp") / 90) * 90', sql)
+        sql, _ = bucket.as_mysql(compiler, connection)
+        self.assertIn("UNIX_TIMESTAMP", sql)
+        with self.assertRaises(ValueError):
+            EpochBucket("timestamp", 0)
+
+    def test_heatmap_view_honours_interval(self):
+        client = APIClient()
+        rows = client.get("/api/heatmap/", {"event_id": self.event.pk, "interval": 600}).json()
+        self.assertEqual(len(rows), 4)  # 40 readings 50s apart span 2000s
+        self.assertEqual(set(rows[0]), {"ts", "avg_headcount", "last_headcount", "max_headcount",
+                                        "min_headcount", "samples"})
+        self.assertEqual(client.get("/api/heatmap/", {"event_id": self.event.pk, "interval": "x"}).status_code, 400)
+        self.assertEqual(client.get("/api/heatmap/", {"event_id": self.event.pk, "interval": 0}).status_code, 400)
+        for params in ({"minutes": 100000000000}, {"interval": 10 ** 12}):
+            resp = client.get("/api/heatmap/", {"event_id": self.event.pk, **params})
+            self.assertEqual(resp.status_code, 400, params)
+
+    def test_limit_keeps_the_newest_buckets(self):
+        full = bucket_snapshots(self.event.pk, 300)
+        for enabled in (True, False):
+            with override_settings(ROLLUPS={"ENABLED": enabled}):
+                refresh_rollups()
+                self.assertEqual(bucket_snapshots(self.event.pk, 300, limit=2), full[-2:])
+
+    def test_minute_heatmap_validates_its_parameters(self):
+        from django.contrib.auth.models import User
+        from rest_framework.test import APIRequestFactory, force_authenticate
+        from .views import heatmap
+
+        user = User.objects.create_user("viewer")
+        factory = APIRequestFactory()
+        for params in ({"interval": 0}, {"minutes": "x"}, {"minutes": -5},
+                       {"minutes": 100000000000}, {"interval": 10 ** 9}):
+            request = factory.get("/api/heatmap/", {"event_id": self.event.pk, **params})
+            force_authenticate(request, user)
+            self.assertEqual(heatmap(request).status_code, 400, params)
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        self.event = Event.objects.create(name="Fair")
+        self.start = datetime(2025, 9, 5, 18, 0, tzinfo=dt_timezone.utc)
+        self.add([(self.start + timedelta(seconds=45 * i), (i * 37) % 101) for i in range(200)])
+
+    def add(self, readings):
+        HeadcountSnapshot.objects.bulk_create([
+            HeadcountSnapshot(event=self.event, headcount=h, source="qr", timestamp=ts) for ts, h in readings
+        ])
+
+    def raw(self, interval):
+        with override_settings(ROLLUPS={"ENABLED": False}):
+            return bucket_snapshots(self.event.pk, interval)
+
+    def test_incremental_refresh_matches_full_rebuild(self):
+        folded, mark = refresh_rollups(batch_size=30)
+        self.assertEqual(folded, 200)
+        self.assertEqual(mark, HeadcountSnapshot.objects.latest("pk").pk)
+        # A late, backdated snapshot lands in an already rolled-up minute.
+        self.add([(self.start + timedelta(seconds=5), 500)])
+        self.assertEqual(refresh_rollups(batch_size=30)[0], 1)
+
+        minute = MinuteRollup.objects.get(event=self.event, bucket=self.start)
+        self.assertEqual((minute.samples, minute.max_headcount, minute.last_headcount), (3, 500, 37))
+        hours = HourRollup.objects.filter(event=self.event).order_by("bucket")
+        self.assertEqual([h.samples for h in hours], [81, 80, 40])
+        self.assertEqual(refresh_rollups(), (0, watermark()))
+
+    def test_reads_combine_rollups_with_raw_tail(self):
+        refresh_rollups()
+        self.add([(self.start + timedelta(seconds=45 * i + 7), 300 + i) for i in range(190, 220)])
+        for interval in (60, 300, 3600, 7200, 420):
+            self.assertEqual(bucket_snapshots(self.event.pk, interval), self.raw(interval), interval)
+
+    def test_coarsest_grain_is_used(self):
+        self.assertIs(grain_for(7200), HourRollup)
+        self.assertIs(grain_for(300), MinuteRollup)
+        self.assertIsNone(grain_for(90))
+        refresh_rollups()
+        with self.assertNumQueries(4):  # watermark, rollup buckets, last values, raw tail (empty)
+            rows = bucket_snapshots(self.event.pk, 3600)
+        self.assertEqual([r["samples"] for r in rows], [80, 80, 40])
+
+    def test_history_interval(self):
+        refresh_rollups()
+        client = APIClient()
+        with mock.patch("django.utils.timezone.now", return_value=self.start + timedelta(hours=2, minutes=30)):
+            body = client.get("/api/history/", {"event_id": self.event.pk, "interval": 3600, "limit": 2}).json()
+        self.assertEqual(body["interval"], 3600)
+        self.assertEqual([row["samples"] for row in body["history"]], [40, 80])  # newest first
+        self.assertEqual(
+            client.get("/api/history/", {"event_id": self.event.pk, "interval": "x"}).status_code, 400
+        )
+
+    def test_feature_buffers_seed_from_hour_rollups(self):
+        now = self.start + timedelta(hours=3)
+        feature_engine.reset()
+        expected = feature_engine.buffers_for([self.event.pk], now)[self.event.pk]
+        feature_engine.reset()
+        refresh_rollups()
+        self.add([(self.start + timedelta(hours=2, minutes=45), 50)])
+        try:
+            with self.assertNumQueries(3):  # watermark, hour rollups, raw tail
+                seeded = feature_engine.buffers_for([self.event.pk], now)[self.event.pk]
+        finally:
+            feature_engine.reset()
+        start_hour = int(self.start.timestamp()) // 3600
+        expected.add(start_hour + 2, 50)
+        self.assertEqual(list(seeded.window(start_hour)[0]), list(expected.window(start_hour)[0]))
+
+
+    @override_settings(ROLLUPS={"SAFETY_LAG": 30})
+    def test_watermark_waits_for_ids_that_commit_out_of_order(self):
+        top = HeadcountSnapshot.objects.latest("pk").pk
+        late_ts = self.start + timedelta(seconds=10)
+        with mock.patch("django.utils.timezone.now", return_value=self.start + timedelta(days=1)):
+            self.assertEqual(refresh_rollups(), (0, 0))  # records the current top id
+        # id top + 2 is visible while top + 1 is still in flight.
+        HeadcountSnapshot.objects.create(pk=top + 2, event=self.event, headcount=400, source="qr", timestamp=late_ts)
+        with mock.patch("django.utils.timezone.now", return_value=self.start + timedelta(days=1, seconds=31)):
+            self.assertEqual(refresh_rollups(), (200, top))
+        HeadcountSnapshot.objects.create(pk=top + 1, event=self.event, headcount=300, source="qr", timestamp=late_ts)
+        self.assertEqual(bucket_snapshots(self.event.pk, 60), self.raw(60))
+        with mock.patch("django.utils.timezone.now", return_value=self.start + timedelta(days=1, seconds=62)):
+            self.assertEqual(refresh_rollups(), (2, top + 2))
+        self.assertEqual(MinuteRollup.objects.get(event=self.event, bucket=self.start).samples, 4)
+        self.assertEqual(bucket_snapshots(self.event.pk, 60), self.raw(60))
+
+    @override_settings(ROLLUPS={"ENABLED": False, "SAFETY_LAG": 30})
+    def test_feature_buffers_pick_up_ids_that_commit_out_of_order(self):
+        now = self.start + timedelta(hours=3)
+        top = HeadcountSnapshot.objects.latest("pk").pk
+        late_ts = self.start + timedelta(hours=2, minutes=50)
+        feature_engine.reset()
+        try:
+            HeadcountSnapshot.objects.create(pk=top + 2, event=self.event, headcount=400, source="qr", timestamp=late_ts)
+            feature_engine.buffers_for([self.event.pk], now)
+            HeadcountSnapshot.objects.create(pk=top + 1, event=self.event, headcount=300, source="qr", timestamp=late_ts)
+            buffer = feature_engine.buffers_for([self.event.pk], now)[self.event.pk]
+        finally:
+            feature_engine.reset()
+        start_hour = int(self.start.timestamp()) // 3600
+        self.assertEqual(int(buffer.counts[(start_hour + 2) % buffer.capacity]), 42)
+
+
+class RetentionTests(TestCase):
+    def setUp(self):
+        self.event = Event.objects.create(name="Fair")
+        self.start = datetime(2025, 9, 5, 18, 0, tzinfo=dt_timezone.utc)
+        HeadcountSnapshot.objects.bulk_create([
+            HeadcountSnapshot(event=self.event, headcount=i, source="qr", timestamp=self.start + timedelta(seconds=15 * i))
+            for i in range(40)
+        ])
+        self.now = self.start + timedelta(days=8)
+        HeadcountSnapshot.objects.create(event=self.event, headcount=99, source="qr", timestamp=self.now)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def run_retention(self, **overrides):
+        from .retention import apply_retention
+
+        return apply_retention(now=self.now, ARCHIVE_DIR=self.tmp.name, FORMAT="csv", CHUNK_SIZE=16,
+                               PAUSE=0, **overrides)
+
+    def test_compacts_archives_and_restores(self):
+        from .retention import restore_archive
+
+        before = bucket_snapshots(self.event.pk, 60)
+        stats = self.run_retention()
+        self.assertEqual((stats["archived"], stats["deleted"], len(stats["files"])), (40, 30, 3))
+        # One reading per minute is left, the last one; the recent snapshot is untouched.
+        remaining = list(HeadcountSnapshot.objects.order_by("timestamp").values_list("headcount", flat=True))
+        self.assertEqual(remaining[:10], [3, 7, 11, 15, 19, 23, 27, 31, 35, 39])
+        self.assertEqual(remaining[-1], 99)
+        # Aggregates still come from the rollups, unchanged.
+        self.assertEqual(bucket_snapshots(self.event.pk, 60), before)
+        self.assertEqual(self.run_retention()["archived"], 0)  # already processed
+
+        restored = sum(restore_archive(path) for path in stats["files"])
+        self.assertEqual(restored, 40)
+        self.assertEqual(HeadcountSnapshot.objects.count(), 41)
+        self.assertEqual(EventState.objects.get(event=self.event).headcount, 99)
+
+    def test_expired_minute_rollups_are_dropped(self):
+        stats = self.run_retention(MINUTE_ROLLUP_DAYS=1)
+        self.assertEqual(stats["minute_rollups_deleted"], 10)
+        self.assertEqual(MinuteRollup.objects.filter(event=self.event).count(), 1)
+        self.assertEqual(HourRollup.objects.filter(event=self.event).count(), 2)
+
+
+class HistoryPaginationTests(TestCase):
+    def setUp(self):
+        self.event = Event.objects.create(name="Fair")
+        self.other = Event.objects.create(name="Other")
+        start = datetime(2025, 9, 5, 18, 0, tzinfo=dt_timezone.utc)
+        HeadcountSnapshot.objects.bulk_create(
+            [HeadcountSnapshot(event=self.event, headcount=i, source="qr", timestamp=start + timedelta(seconds=i // 2))
+             for i in range(25)]  # pairs share a timestamp
+            + [HeadcountSnapshot(event=self.other, headcount=1, source="qr", timestamp=start)]
+        )
+        self.client = APIClient()
+
+    def test_history_cursor_walks_every_snapshot_once(self):
+        seen, url, params = [], "/api/history/", {"event_id": self.event.pk, "limit": 10}
+        while url:
+            body = self.client.get(url, params).json()
+            seen += [row["headcount"] for row in body["history"]]
+            url, params = body["next"], None
+        self.assertEqual(sorted(seen), list(range(25)))
+        self.assertEqual(len(seen), 25)
+
+    def test_history_limit_is_validated(self):
+        for limit in ("x", 0, 5000):
+            response = self.client.get("/api/history/", {"event_id": self.event.pk, "limit": limit})
+            self.assertEqual(response.status_code, 400, limit)
+
+    def test_snapshot_viewset_is_paginated_without_per_row_queries(self):
+        with self.assertNumQueries(1):
+            body = self.client.get("/api/snapshots/", {"event_id": self.event.pk, "limit": 20}).json()
+        self.assertEqual(len(body["results"]), 20)
+        self.assertEqual(body["results"][0]["event"], str(self.event))
+        self.assertIsNotNone(body["next"])
+
+    def test_export_ndjson_and_csv(self):
+        response = self.client.get("/api/history/export/", {"event_id": self.event.pk})
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual([r["headcount"] for r in rows], list(range(25)))
+
+        response = self.client.get("/api/history/export/", {"event_id": self.event.pk, "format": "csv",
+                                                            "start": "2025-09-05T18:00:05Z"})
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], "id,timestamp,headcount,source")
+        self.assertEqual(len(lines), 1 + 15)
+        self.assertEqual(self.client.get("/api/history/export/", {"event_id": self.event.pk,
+                                                                  "format": "xml"}).status_code, 400)
+
+    async def test_export_pages_by_keyset_under_asgi(self):
+        from django.core.asgi import get_asgi_application
+        from .export import aiter_export, iter_export
+        from .loadtest.asgi import http_request
+
+        status, body = await http_request(get_asgi_application(), "GET", "/api/history/export/",
+                                          query_string=f"event_id={self.event.pk}")
+        self.assertEqual(status, 200)
+        self.assertEqual(len(body.splitlines()), 25)
+        chunks = [chunk async for chunk in aiter_export(self.event.pk, "ndjson", batch_size=4)]
+        expected = await sync_to_async(lambda: "".join(iter_export(self.event.pk, "ndjson")))()
+        self.assertEqual(len(chunks), 7)
+        self.assertEqual("".join(chunks), expected)
+
+
+def write_mandal_csv(directory, name, city, years=(2020, 2021), hours=96, with_datetime=True):
+    """A small *_binary_dataset.csv in the model_data format."""
+    import csv
+
+    path = os.path.join(directory, f"{name.lower().replace(' ', '_')}_binary_dataset.csv")
+    header = ["mandal_name", "city"] + (["datetime"] if with_datetime else []) + [
+        "year", "day_of_festival", "hour_of_day", "is_weekend", "is_special_day", "weather", "headcount"]
+    weathers = ["Sunny", "Humid", "Heavy Rain"]
+    with open(path, "w", newline="") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(header)
+        for year in years:
+            start = datetime(year, 9, 5)
+            for h in range(hours):
+                ts = start + timedelta(hours=h)
+                row = [name, city] + ([ts.strftime("%Y-%m-%d %H:%M:%S")] if with_datetime else [])
+                row += [year, h // 24 + 1, ts.hour, int(ts.weekday() >= 5), int(h < 24),
+                        weathers[h % 3], 1000 + 40 * ts.hour + (h * 37) % 300 + (year - 2020) * 50]
+                writer.writerow(row)
+    return path
+
+
+def write_temple_csv(directory, name, city, years=(2018, 2019)):
+    """A temple-family CSV (year/month/day_of_month/time_slot, 9 days from 1 October)."""
+    import csv
+
+    path = os.path.join(directory, f"{name.lower().replace(' ', '_')}.csv")
+    with open(path, "w", newline="") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(["temple_name", "city", "year", "month", "day_of_month", "time_slot",
+                         "is_weekend_or_holiday", "is_special_festival", "weather", "headcount"])
+        for year in years:
+            for day in range(1, 10):
+                for hour in range(24):
+                    writer.writerow([name, city, year, 10, day, hour, int(day in (6, 7)), 1,
+                                     ["Clear", "Foggy"][hour % 2], 5000 + 100 * hour])
+    return path
+
+
+class TrainingPipelineTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.data_dir = os.path.join(self.tmp.name, "data")
+        os.makedirs(self.data_dir)
+        write_mandal_csv(self.data_dir, "Lalbaugcha Raja", "Mumbai")
+        write_mandal_csv(self.data_dir, "Kasba Ganpati", "Pune", with_datetime=False)
+
+    def test_training_features_match_serving_features(self):
+        from .training.data import dataset_files, load_datasets
+        from .training.features import build_feature_matrix
+
+        frame = load_datasets(dataset_files(self.data_dir))
+        self.assertEqual(frame["headcount"].dtype, np.int32)
+        self.assertEqual(str(frame["venue"].dtype), "category")
+        arrays = build_feature_matrix(frame, ml.DEFAULT_MODEL_FEATURES)
+        self.assertEqual(arrays["X"].shape, (2 * 2 * (96 - 48), len(ml.DEFAULT_MODEL_FEATURES)))
+
+        # Row 10 of Kasba Ganpati's 2021 festival, against feature_row on the same hourly history.
+        venue = frame[(frame["venue"] == "Kasba Ganpati") & (frame["timestamp"].dt.year == 2021)].sort_values("timestamp")
+        hourly = venue["headcount"].to_numpy(np.float64)[:48 + 10 + 1]
+        last_hour = int(venue["timestamp"].iloc[58].timestamp()) // 3600
+        day = venue["day_of_festival"].iloc[58]
+        static = dict(venues.static_features("kasba_ganpati", venue["timestamp"].iloc[58].date()))
+        self.assertEqual(static["festival_progress"], day / 11)
+        self.assertEqual(venue["weather"].iloc[58], "Humid")
+        static["weather_impact_score"] = 0.9
+        static["is_special_day"] = venue["is_special_day"].iloc[58]
+        expected = feature_row(hourly, last_hour, static)
+        row = np.flatnonzero((arrays["venue"] == 2) & (arrays["timestamp"] == last_hour * 3600))
+        self.assertEqual(len(row), 1)
+        for j, name in enumerate(ml.DEFAULT_MODEL_FEATURES):
+            self.assertAlmostEqual(float(arrays["X"][row[0], j]), float(expected[name]), places=2, msg=name)
+
+    def test_loader_normalizes_both_dataset_families(self):
+        from .training.data import dataset_files, iter_dataset, load_datasets
+
+        write_temple_csv(self.data_dir, "Kashi Vishwanath", "Varanasi")
+        chunks = list(iter_dataset(os.path.join(self.data_dir, "kashi_vishwanath.csv"), chunksize=100))
+        self.assertEqual(len(chunks), 5)  # 2 festivals x 9 days x 24h = 432 rows
+
+        frame = load_datasets(dataset_files(self.data_dir), chunksize=100)
+        self.assertEqual(list(frame.columns), ["venue", "timestamp", "day_of_festival", "hour",
+                                               "is_holiday", "is_special_day", "weather", "headcount"])
+        self.assertEqual(frame["day_of_festival"].dtype, np.int8)
+        self.assertEqual(frame["venue"].cat.categories.tolist(), list(venues.VENUE_NAMES))
+        kashi = frame[frame["venue"] == "Kashi Vishwanath"].sort_values("timestamp")
+        self.assertEqual(len(kashi), 432)
+        self.assertEqual(kashi["timestamp"].iloc[0], pd.Timestamp("2018-10-01 00:00"))
+        self.assertEqual(kashi["timestamp"].iloc[-1], pd.Timestamp("2019-10-09 23:00"))
+        self.assertEqual(kashi["day_of_festival"].max(), 9)
+        self.assertEqual(kashi["weather"].iloc[0], "Clear")
+        kasba = frame[frame["venue"] == "Kasba Ganpati"]  # no datetime column: placed by the registry
+        self.assertEqual(kasba["timestamp"].min(), pd.Timestamp("2020-09-05 00:00"))
+
+        write_temple_csv(self.data_dir, "Unknown Shrine", "Nowhere")
+        with self.assertRaisesRegex(ValueError, "not in core.venues.VENUES"):
+            load_datasets(dataset_files(self.data_dir))
+
+    def test_train_writes_servable_model_and_reuses_feature_cache(self):
+        from .training.pipeline import train
+
+        output = os.path.join(self.tmp.name, "ml_models", "crowd_predictor.joblib")
+        cache_dir = os.path.join(self.tmp.name, "cache")
+        first = train(self.data_dir, output, cache_dir, ml.DEFAULT_MODEL_FEATURES, log=lambda msg: None,
+                      n_estimators=40)
+        self.assertFalse(first["feature_cache"]["hit"])
+        self.assertGreater(first["memory"]["peak_traced_mb"], 0)
+        self.assertIn("fit", first["seconds"])
+        self.assertGreater(first["memory"]["max_rss_mb"], 0)
+        with mock.patch.dict("sys.modules", {"resource": None}):  # as on Windows
+            second = train(self.data_dir, output, cache_dir, ml.DEFAULT_MODEL_FEATURES, log=lambda msg: None,
+                           n_estimators=40)
+        self.assertIsNone(second["memory"]["max_rss_mb"])
+        self.assertTrue(second["feature_cache"]["hit"])
+        self.assertEqual(second["mae"], first["mae"])
+
+        model, features = ModelRegistry(output).get()
+        self.assertEqual(features, ml.DEFAULT_MODEL_FEATURES)
+        self.assertEqual(second["compiled"]["max_abs_error"], 0.0)
+        compiled, _ = ModelRegistry(output, compiled_path=output[:-len(".joblib")] + ".npz").get()
+        self.assertIsInstance(compiled, CompiledTrees)
+        from .training.features import FeatureCache
+
+        arrays, _ = FeatureCache(cache_dir).get(second["feature_cache"]["key"])
+        self.assertIsInstance(arrays["X"], np.memmap)
+        baseline = np.mean(np.abs(arrays["y"] - arrays["y"].mean()))
+        self.assertLess(np.mean(np.abs(model.predict(arrays["X"]) - arrays["y"])), baseline / 2)
+        np.testing.assert_array_equal(compiled.predict(arrays["X"]), model.predict(arrays["X"]))
+
+
+def _has_module(name):
+    import importlib.util
+
+    return importlib.util.find_spec(name) is not None
+
+
+class CompiledModelTests(SimpleTestCase):
+    """Exported arrays against the original model's own predict()."""
+
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        self.X = rng.uniform(0, 100, size=(600, 5))
+        self.y = 3 * self.X[:, 0] + np.where(self.X[:, 1] > 50, 200, 0) + rng.normal(0, 5, 600)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def assertParity(self, model, places=6):
+        from .training.export import compile_model
+
+        path = os.path.join(self.tmp.name, "model.npz")
+        compile_model(model, ["f0", "f1", "f2", "f3", "f4"]).save(path)
+        compiled = load_compiled(path)
+        np.testing.assert_allclose(compiled.predict(self.X), model.predict(self.X), atol=10 ** -places)
+        return compiled
+
+    def test_gradient_boosted_trees(self):
+        from .training.gbm import GradientBoostedTrees
+
+        model = GradientBoostedTrees(n_estimators=30, min_samples_leaf=5).fit(self.X, self.y)
+        compiled = self.assertParity(model, places=9)
+        self.assertEqual(compiled.feature_names_in_.tolist(), ["f0", "f1", "f2", "f3", "f4"])
+
+    def test_xgboost_strict_less_than_splits(self):
+        class Booster:  # the parts of xgboost.Booster the exporter reads
+            feature_names = None
+
+            def save_config(self):
+                return json.dumps({"learner": {"objective": {"name": "reg:squarederror"},
+                                               "learner_model_param": {"base_score": "[5E-1]"}}})
+
+            def get_dump(self, dump_format):
+                return [json.dumps({"nodeid": 0, "split": "f1", "split_condition": 50.0, "yes": 1, "no": 2,
+                                    "children": [{"nodeid": 1, "leaf": -1.5}, {"nodeid": 2, "leaf": 2.5}]})]
+
+        from .training.export import compile_model
+
+        compiled = compile_model(Booster())
+        self.assertEqual(compiled.predict([[0, 49.99, 0], [0, 50.0, 0]]).tolist(), [-1.0, 3.0])
+
+    @skipUnless(_has_module("sklearn"), "scikit-learn not installed")
+    def test_sklearn_ensembles(self):
+        from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
+
+        self.assertParity(RandomForestRegressor(n_estimators=20, max_depth=8, random_state=0).fit(self.X, self.y))
+        self.assertParity(GradientBoostingRegressor(n_estimators=40, random_state=0).fit(self.X, self.y))
+
+    @skipUnless(_has_module("lightgbm"), "lightgbm not installed")
+    def test_lightgbm(self):
+        import lightgbm
+
+        self.assertParity(lightgbm.LGBMRegressor(n_estimators=40, verbose=-1).fit(self.X, self.y))
+
+
+class StartupTests(SimpleTestCase):
+    def test_entry_points_start_within_budget_without_heavy_imports(self):
+        from .startup import ENTRY_POINTS, config, profile_imports
+
+        for module in ENTRY_POINTS:
+            profile = profile_imports(module)
+            names = {name for name, _, _, _ in profile["imports"]}
+            self.assertIn("core.views", names)  # the URLconf was imported too
+            self.assertEqual(profile["heavy"], [], module)
+            self.assertNotIn("core.ml", names)
+            self.assertLess(profile["seconds"], config()["BUDGET_SECONDS"], module)
+
+
+class QRCacheTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+
+        caches["qr"].clear()
+        reset_qr_cache_stats()
+        self.manager = User.objects.create_user("gate-manager")
+        self.event = Event.objects.create(name="Gate 1", manager=self.manager)
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+
+    def test_data_uri_is_rendered_once_per_key(self):
+        url = f"/api/qr/{self.event.id}/?type=svg"
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first.data["qr_data_uri"].startswith("data:image/svg+xml;base64,"))
+        self.assertTrue(first.data["scan_url"].endswith(f"/scan/{self.event.qr_token}"))
+        with mock.patch("core.qr_cache.render_qr") as render:
+            self.assertEqual(self.client.get(url).data, first.data)
+        render.assert_not_called()
+        self.assertEqual((qr_cache_stats()["hits"], qr_cache_stats()["misses"]), (1, 1))
+
+        self.assertEqual(self.client.get(f"/api/qr/{self.event.id}/?type=gif").status_code, 400)
+        self.assertEqual(self.client.get(f"/api/qr/{self.event.id}/?box_size=0").status_code, 400)
+        other = APIClient()
+        other.force_authenticate(type(self.manager).objects.create_user("someone-else"))
+        self.assertEqual(other.get(url).status_code, 403)
+
+    def test_image_endpoint_supports_conditional_get(self):
+        url = f"/api/qr/{self.event.id}/image/?type=svg"
+        resp = self.client.get(url, HTTP_ACCEPT="image/svg+xml")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["Content-Type"], "image/svg+xml")
+        self.assertTrue(resp.content.startswith(b"<?xml"))
+        etag = resp["ETag"]
+
+        with mock.patch("core.qr_cache.render_qr") as render:
+            resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((resp.status_code, resp["ETag"]), (304, etag))
+        render.assert_not_called()
+
+        self.assertNotEqual(self.client.get(url + "&box_size=10")["ETag"], etag)
+        self.event.qr_token = "regenerated"
+        self.event.save()
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp["ETag"], etag)
+
+    @override_settings(CACHES={
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+        "qr": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "qr-lru-test",
+               "TIMEOUT": None, "OPTIONS": {"MAX_ENTRIES": 2, "CULL_FREQUENCY": 2}},
+    })
+    def test_least_recently_used_entry_is_evicted(self):
+        for token in ("a", "b", "a", "c"):  # "a" is used again before "c" arrives
+            cached_qr(token, "svg")
+        reset_qr_cache_stats()
+        cached_qr("a", "svg")
+        cached_qr("b", "svg")
+        self.assertEqual((qr_cache_stats()["hits"], qr_cache_stats()["misses"]), (1, 1))
+
+    def test_prerender_command_writes_signage_once(self):
+        from django.core.management import call_command
+
+        with tempfile.TemporaryDirectory() as directory:
+            out = io.StringIO()
+            call_command("prerender_qr", "--format", "svg", "--output-dir", directory, stdout=out)
+            self.assertIn("Wrote 1 image(s), 0 unchanged", out.getvalue())
+            self.assertEqual(os.listdir(directory), [f"event-{self.event.id}-gate-1.svg"])
+            call_command("prerender_qr", "--format", "svg", "--output-dir", directory, stdout=out)
+            self.assertIn("Wrote 0 image(s), 1 unchanged", out.getvalue())
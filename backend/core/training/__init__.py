@@ -0,0 +1,14 @@
+# backend/core/training/__init__.py
+"""
+Reproducible training for the crowd model served by core.ml. Run it with
+`python manage.py train_model`.
+
+    data.py      typed loading of the model_data CSVs
+    features.py  vectorized feature matrix (same definitions as serving) and its on-disk cache
+    gbm.py       NumPy gradient-boosted trees, the default estimator
+    pipeline.py  split, fit, evaluate, save model + report
+    export.py    compile tree models (ours, sklearn, LightGBM, XGBoost) to core.compiled_model arrays
+
+Nothing is imported here: unpickling a served model imports
+core.training.gbm, which must not pull in pandas or the Django models.
+"""
@@ -0,0 +1,165 @@
+# backend/core/training/data.py
+"""
+Loading the festival datasets in model_data/Data.
+
+Two families of CSV live there, each one venue over several festivals:
+
+- mandal files (`*_binary_dataset.csv`, koradi.csv): `mandal_name`,
+  `day_of_festival`, `hour_of_day`, usually a `datetime` column;
+- temple files (kashi.csv, somnath_dataset.csv, ...): `temple_name`,
+  `year, month, day_of_month, time_slot`.
+
+Flag columns are named differently per file too. read_dataset() maps every
+file onto one schema, reading it in chunks with narrow dtypes:
+
+    venue            category  (categories: core.venues.VENUE_NAMES, so codes are registry codes)
+    timestamp        datetime64[s]
+    day_of_festival  int8
+    hour             int8
+    is_holiday       int8      (weekend or public holiday, as the file defines it)
+    is_special_day   int8
+    weather          category  (categories: sorted core.venues.WEATHER_IMPACT keys)
+    headcount        int32
+"""
+import hashlib
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .. import venues
+
+DATASET_PATTERN = "*.csv"
+CHUNK_ROWS = 50_000
+
+# Unified column -> source columns, first present wins.
+ALIASES = {
+    "venue": ("mandal_name", "temple_name"),
+    "hour": ("hour_of_day", "time_slot"),
+    "is_holiday": ("is_weekend", "is_holiday", "is_weekend_or_holiday", "holiday_flag"),
+    "is_special_day": ("is_special_day", "is_festival", "is_special_festival",
+                       "is_durga_puja_or_navratri", "special_event_flag"),
+}
+SOURCE_DTYPES = {
+    "mandal_name": "category",
+    "temple_name": "category",
+    "weather": "category",
+    "datetime": "str",
+    "year": "int16",
+    "month": "int8",
+    "day_of_month": "int8",
+    "day_of_festival": "int8",
+    "hour_of_day": "int8",
+    "time_slot": "int8",
+    "is_weekend": "int8",
+    "is_holiday": "int8",
+    "is_weekend_or_holiday": "int8",
+    "holiday_flag": "int8",
+    "is_special_day": "int8",
+    "is_festival": "int8",
+    "is_special_festival": "int8",
+    "is_durga_puja_or_navratri": "int8",
+    "special_event_flag": "int8",
+    "headcount": "int32",
+}
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+VENUE_DTYPE = pd.CategoricalDtype(venues.VENUE_NAMES)
+WEATHER_DTYPE = pd.CategoricalDtype(sorted(venues.WEATHER_IMPACT))
+
+
+def dataset_files(data_dir, pattern=DATASET_PATTERN):
+    return sorted(Path(data_dir).glob(pattern))
+
+
+def data_hash(paths):
+    """sha256 over the names and contents of `paths`."""
+    digest = hashlib.sha256()
+    for path in sorted(Path(p) for p in paths):
+        digest.update(path.name.encode())
+        with open(path, "rb") as fh:
+            for chunk in iter(lambda: fh.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _pick(columns, unified, path):
+    for name in ALIASES[unified]:
+        if name in columns:
+            return name
+    raise ValueError(f"{path}: no column for {unified!r} (expected one of {', '.join(ALIASES[unified])})")
+
+
+def _festival_start(venue_codes, years):
+    """datetime64[D] of each row's festival start, from the registry."""
+    starts = np.array(
+        [venues.FESTIVALS[venues.VENUES[venues.BY_NAME[name]]["festival"]]["start"] for name in venues.VENUE_NAMES],
+        dtype=np.int64,
+    )
+    month, day = starts[venue_codes, 0], starts[venue_codes, 1]
+    year_start = (years.astype(np.int64) - 1970).astype("datetime64[Y]")
+    return (year_start.astype("datetime64[M]") + (month - 1)).astype("datetime64[D]") + (day - 1)
+
+
+def _normalize(chunk, columns, path):
+    out = pd.DataFrame(index=chunk.index)
+    venue = chunk[_pick(columns, "venue", path)].astype(str)
+    unknown = set(venue.unique()) - set(venues.VENUE_NAMES)
+    if unknown:
+        raise ValueError(f"{path}: venues {sorted(unknown)} are not in core.venues.VENUES")
+    out["venue"] = venue.astype(VENUE_DTYPE)
+    codes = out["venue"].cat.codes.to_numpy(np.int64)
+    hour = chunk[_pick(columns, "hour", path)].to_numpy(np.int64)
+
+    if "datetime" in columns:
+        timestamp = pd.to_datetime(chunk["datetime"], format=DATETIME_FORMAT).to_numpy("datetime64[s]")
+        day = timestamp.astype("datetime64[D]")
+        start = _festival_start(codes, timestamp.astype("datetime64[Y]").astype(np.int64) + 1970)
+    elif "month" in columns:
+        year = chunk["year"].to_numpy(np.int64)
+        month = chunk["month"].to_numpy(np.int64)
+        day = ((year - 1970).astype("datetime64[Y]").astype("datetime64[M]") + (month - 1)).astype("datetime64[D]")
+        day = day + (chunk["day_of_month"].to_numpy(np.int64) - 1)
+        timestamp = day.astype("datetime64[s]") + hour * 3600
+        start = _festival_start(codes, year)
+    else:
+        start = _festival_start(codes, chunk["year"].to_numpy(np.int64))
+        day = start + (chunk["day_of_festival"].to_numpy(np.int64) - 1)
+        timestamp = day.astype("datetime64[s]") + hour * 3600
+
+    out["timestamp"] = timestamp
+    if "day_of_festival" in columns:
+        out["day_of_festival"] = chunk["day_of_festival"].to_numpy(np.int8)
+    else:
+        out["day_of_festival"] = ((day - start).astype(np.int64) + 1).astype(np.int8)
+    out["hour"] = hour.astype(np.int8)
+    out["is_holiday"] = chunk[_pick(columns, "is_holiday", path)].to_numpy(np.int8)
+    out["is_special_day"] = chunk[_pick(columns, "is_special_day", path)].to_numpy(np.int8)
+    out["weather"] = chunk["weather"].astype(str).astype(WEATHER_DTYPE)
+    out["headcount"] = chunk["headcount"].to_numpy(np.int32)
+    return out
+
+
+def iter_dataset(path, chunksize=CHUNK_ROWS):
+    """Yields `path` in normalized frames of at most `chunksize` rows."""
+    columns = set(pd.read_csv(path, nrows=0).columns)
+    reader = pd.read_csv(
+        path,
+        usecols=lambda column: column in SOURCE_DTYPES,
+        dtype={name: dtype for name, dtype in SOURCE_DTYPES.items() if name in columns},
+        chunksize=chunksize,
+    )
+    with reader:
+        for chunk in reader:
+            yield _normalize(chunk, columns, path)
+
+
+def load_datasets(paths, chunksize=CHUNK_ROWS):
+    """
+    Every file in `paths` as one normalized frame (see the module docstring).
+    Categories are fixed up front, so chunks concatenate without re-encoding.
+    """
+    frames = [chunk for path in paths for chunk in iter_dataset(path, chunksize)]
+    if not frames:
+        raise FileNotFoundError("no dataset files to load")
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,194 @@
+# backend/core/training/export.py
+"""
+Compiling trained tree models into core.compiled_model.CompiledTrees.
+
+Supported, recognised by their attributes so no library is imported here:
+
+- GradientBoostedTrees (core.training.gbm): already packed, copied over;
+- scikit-learn DecisionTreeRegressor, RandomForestRegressor,
+  ExtraTreesRegressor, GradientBoostingRegressor and
+  HistGradientBoostingRegressor;
+- LightGBM LGBMRegressor / Booster, via dump_model();
+- XGBoost XGBRegressor / Booster, via the JSON tree dump.
+
+Only single-output regressors with an identity link qualify: a log-link
+objective (poisson, tweedie, ...) would need a transform we do not export.
+"""
+import json
+
+import joblib
+import numpy as np
+
+from ..compiled_model import CompiledTrees
+
+LIGHTGBM_OBJECTIVES = ("regression", "regression_l1", "huber", "fair", "quantile", "mape")
+XGBOOST_OBJECTIVES = ("reg:squarederror", "reg:absoluteerror", "reg:pseudohubererror", "reg:quantileerror")
+
+
+def compile_model(model, feature_names=None):
+    """CompiledTrees equivalent to `model.predict`; raises TypeError for unsupported models."""
+    if hasattr(model, "feature_names_in_"):
+        feature_names = [str(name) for name in model.feature_names_in_]
+    kwargs = {"feature_names": feature_names, "source": type(model).__name__}
+
+    if hasattr(model, "roots_") and hasattr(model, "base_score_"):
+        return CompiledTrees(model.roots_, model.feature_, model.threshold_, model.left_, model.right_,
+                             model.value_, model.depth_, model.base_score_, **kwargs)
+    if hasattr(model, "booster_") or hasattr(model, "dump_model"):
+        return _compile_lightgbm(getattr(model, "booster_", model), **kwargs)
+    if hasattr(model, "get_booster") or hasattr(model, "get_dump"):
+        return _compile_xgboost(model, **kwargs)
+    if hasattr(model, "_predictors") and hasattr(model, "_baseline_prediction"):
+        return _compile_hist_gradient_boosting(model, **kwargs)
+    if hasattr(model, "tree_"):
+        return CompiledTrees.from_trees([_sklearn_tree(model.tree_)], 0.0, input_dtype="float32", **kwargs)
+    if hasattr(model, "estimators_"):
+        return _compile_sklearn_ensemble(model, **kwargs)
+    raise TypeError(f"cannot compile {type(model).__name__}: not a supported tree model")
+
+
+def export_model(model_path, output, feature_names=None, X=None, tolerance=None):
+    """
+    Loads a joblib model, compiles it and writes `output` (.npz). With X,
+    compares predictions first: returns (compiled, largest absolute
+    difference), and raises ValueError without writing if that exceeds
+    `tolerance`.
+    """
+    model = joblib.load(model_path)
+    compiled = compile_model(model, feature_names)
+    max_error = None
+    if X is not None and len(X):
+        max_error = float(np.max(np.abs(np.asarray(model.predict(X), dtype=np.float64) - compiled.predict(X))))
+        if tolerance is not None and max_error > tolerance:
+            raise ValueError(f"compiled predictions differ by up to {max_error:g}; not exported")
+    compiled.save(output)
+    return compiled, max_error
+
+
+# -----------------------
+# scikit-learn
+# -----------------------
+def _sklearn_tree(tree, scale=1.0):
+    """A fitted sklearn Tree object as node lists."""
+    if tree.value.shape[1] != 1:
+        raise TypeError("multi-output trees are not supported")
+    left, right = tree.children_left, tree.children_right
+    feature = np.where(left < 0, -1, tree.feature)
+    value = tree.value[:, 0, 0] * scale
+    return [
+        [int(f), float(t), int(l), int(r), float(v)]
+        for f, t, l, r, v in zip(feature, tree.threshold, left, right, value)
+    ]
+
+
+def _compile_sklearn_ensemble(model, **kwargs):
+    estimators = np.asarray(model.estimators_, dtype=object)
+    if estimators.ndim == 2:  # GradientBoostingRegressor: (n_estimators, 1)
+        if estimators.shape[1] != 1:
+            raise TypeError("multi-output gradient boosting is not supported")
+        init = model.init_
+        if isinstance(init, str) and init == "zero":
+            base = 0.0
+        elif hasattr(init, "constant_"):
+            base = float(np.ravel(init.constant_)[0])
+        else:
+            raise TypeError(f"GradientBoostingRegressor init={type(init).__name__} is not supported")
+        trees = [_sklearn_tree(e.tree_, model.learning_rate) for e in estimators[:, 0]]
+        return CompiledTrees.from_trees(trees, base, input_dtype="float32", **kwargs)
+    # Forests average their trees: fold 1/n into the leaf values.
+    trees = [_sklearn_tree(e.tree_, 1.0 / len(estimators)) for e in estimators]
+    return CompiledTrees.from_trees(trees, 0.0, input_dtype="float32", **kwargs)
+
+
+def _compile_hist_gradient_boosting(model, **kwargs):
+    if model.loss not in ("squared_error", "absolute_error", "quantile"):
+        raise TypeError(f"HistGradientBoostingRegressor loss={model.loss!r} is not supported")
+    trees = []
+    for (predictor,) in model._predictors:
+        nodes = predictor.nodes
+        if nodes["is_categorical"].any():
+            raise TypeError("categorical splits are not supported")
+        feature = np.where(nodes["is_leaf"].astype(bool), -1, nodes["feature_idx"])
+        trees.append([
+            [int(f), float(t), int(l), int(r), float(v)]
+            for f, t, l, r, v in zip(feature, nodes["num_threshold"], nodes["left"], nodes["right"], nodes["value"])
+        ])
+    return CompiledTrees.from_trees(trees, float(np.ravel(model._baseline_prediction)[0]), **kwargs)
+
+
+# -----------------------
+# LightGBM
+# -----------------------
+def _compile_lightgbm(booster, **kwargs):
+    dump = booster.dump_model()
+    objective = dump.get("objective", "regression").split()[0]
+    if objective not in LIGHTGBM_OBJECTIVES or dump.get("num_tree_per_iteration", 1) != 1:
+        raise TypeError(f"LightGBM objective {objective!r} is not supported")
+    trees = []
+    for info in dump["tree_info"]:
+        nodes = []
+        _lightgbm_node(info["tree_structure"], nodes)
+        trees.append(nodes)
+    kwargs["feature_names"] = kwargs["feature_names"] or dump.get("feature_names")
+    # boost_from_average is already part of the first tree's leaves.
+    return CompiledTrees.from_trees(trees, 0.0, **kwargs)
+
+
+def _lightgbm_node(node, nodes):
+    node_id = len(nodes)
+    nodes.append([-1, 0.0, -1, -1, float(node.get("leaf_value", 0.0))])
+    if "split_feature" in node:
+        if node.get("decision_type", "<=") != "<=":
+            raise TypeError("LightGBM categorical splits are not supported")
+        nodes[node_id][0] = int(node["split_feature"])
+        nodes[node_id][1] = float(node["threshold"])
+        nodes[node_id][2] = _lightgbm_node(node["left_child"], nodes)
+        nodes[node_id][3] = _lightgbm_node(node["right_child"], nodes)
+    return node_id
+
+
+# -----------------------
+# XGBoost
+# -----------------------
+def _compile_xgboost(model, **kwargs):
+    booster = model.get_booster() if hasattr(model, "get_booster") else model
+    config = json.loads(booster.save_config())
+    objective = config["learner"]["objective"]["name"]
+    if objective not in XGBOOST_OBJECTIVES:
+        raise TypeError(f"XGBoost objective {objective!r} is not supported")
+    base_score = float(str(config["learner"]["learner_model_param"]["base_score"]).strip("[]"))
+
+    dumps = booster.get_dump(dump_format="json")
+    best = getattr(model, "best_iteration", None)
+    if best is not None and hasattr(model, "get_booster"):
+        # XGBRegressor.predict stops at the early-stopping iteration.
+        per_round = len(dumps) // booster.num_boosted_rounds()
+        dumps = dumps[:(best + 1) * per_round]
+
+    names = booster.feature_names or kwargs["feature_names"]
+    index = {name: i for i, name in enumerate(names or [])}
+    kwargs["feature_names"] = names
+    trees = [_xgboost_tree(json.loads(dump), index) for dump in dumps]
+    return CompiledTrees.from_trees(trees, base_score, input_dtype="float32", **kwargs)
+
+
+def _xgboost_tree(root, index):
+    nodes, ids = [], {}
+    stack = [root]
+    while stack:  # first pass: number the nodes
+        node = stack.pop()
+        ids[node["nodeid"]] = len(nodes)
+        nodes.append(node)
+        stack.extend(node.get("children", ()))
+    out = []
+    for node in nodes:
+        if "leaf" in node:
+            out.append([-1, 0.0, -1, -1, float(node["leaf"])])
+            continue
+        split = node["split"]
+        feature = index[split] if split in index else int(str(split).lstrip("f"))
+        # XGBoost goes left ("yes") when x < threshold in float32; as "<=",
+        # that is the next float32 below it.
+        threshold = float(np.nextafter(np.float32(node["split_condition"]), np.float32(-np.inf)))
+        out.append([feature, threshold, ids[node["yes"]], ids[node["no"]], 0.0])
+    return out
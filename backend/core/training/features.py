@@ -0,0 +1,155 @@
+# backend/core/training/features.py
+"""
+Training feature matrix, computed exactly as core.features does at serving
+time (feature_row), but for every row of every venue at once.
+
+Rows are sorted by (venue, timestamp) and split into segments of
+consecutive hours (one per venue per festival). Lags are plain offsets and
+rolling means/stds come from cumulative sums, so there is no groupby/apply
+and no per-row Python. Rows without a full 48h history in their segment
+are dropped, as the serving path falls back to the heuristic for them.
+
+The matrix is cached on disk as .npy files keyed by the data hash and the
+feature definition, and loaded back memory-mapped.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from .. import venues
+from ..features import LAGS, ROLLING_WINDOWS
+
+# Bump when the feature definitions below change; invalidates cached matrices.
+FEATURE_VERSION = 2
+
+
+def _venue_table(field):
+    """Per-venue value indexed by registry code."""
+    by_code = sorted(venues.VENUES, key=lambda slug: venues.VENUES[slug]["code"])
+    return np.array([field(slug) for slug in by_code], dtype=np.float64)
+
+
+def _rolling(cumsum, index, window):
+    return cumsum[index] - cumsum[index - window]
+
+
+def build_feature_matrix(frame, feature_names):
+    """
+    Returns {"X": float32 (rows, features), "y": float32, "timestamp": int64 epoch
+    seconds, "venue": int16 venue codes} for rows with a full lag history.
+    """
+    venue = frame["venue"].cat.codes.to_numpy(np.int16)  # registry codes (see training.data)
+    ts = frame["timestamp"].to_numpy("datetime64[s]").astype(np.int64)
+    order = np.lexsort((ts, venue))
+    venue, ts = venue[order], ts[order]
+    headcount = frame["headcount"].to_numpy(np.float64)[order]
+
+    n = len(order)
+    new_segment = np.ones(n, dtype=bool)
+    new_segment[1:] = (venue[1:] != venue[:-1]) | (np.diff(ts) != 3600)
+    segment_start = np.flatnonzero(new_segment)
+    position = np.arange(n) - np.repeat(segment_start, np.diff(np.append(segment_start, n)))
+    rows = np.flatnonzero(position >= max(LAGS))
+
+    columns = {}
+    for lag in LAGS:
+        columns[f"headcount_lag_{lag}h"] = headcount[rows - lag]
+    sums = np.concatenate([[0.0], np.cumsum(headcount)])
+    squares = np.concatenate([[0.0], np.cumsum(headcount ** 2)])
+    for window in ROLLING_WINDOWS:
+        mean = _rolling(sums, rows, window) / window
+        variance = (_rolling(squares, rows, window) - window * mean ** 2) / (window - 1)
+        columns[f"headcount_rolling_mean_{window}h"] = mean
+        columns[f"headcount_rolling_std_{window}h"] = np.sqrt(np.maximum(variance, 0.0))
+
+    # Time features, as feature_row derives them from the timestamp.
+    hour = (ts[rows] // 3600) % 24
+    dow = (ts[rows] // 86400 + 3) % 7  # 1970-01-01 was a Thursday (Monday = 0)
+    is_weekend = (dow >= 5).astype(np.float64)
+    columns.update({
+        "hour": hour,
+        "day_of_week": dow,
+        "is_weekend": is_weekend,
+        "hour_sin": np.sin(2 * np.pi * hour / 24),
+        "hour_cos": np.cos(2 * np.pi * hour / 24),
+        "day_sin": np.sin(2 * np.pi * dow / 7),
+        "day_cos": np.cos(2 * np.pi * dow / 7),
+        "is_peak_hour": ((hour >= 17) & (hour < 21)).astype(np.float64),
+        "is_late_night": ((hour >= 23) | (hour < 5)).astype(np.float64),
+    })
+
+    # Per-venue context that serving gets from core.venues.static_features.
+    source = frame.iloc[order[rows]]
+    code = venue[rows]
+    festival_days = _venue_table(lambda slug: venues.festival(slug)["days"])[code]
+    day = np.clip(source["day_of_festival"].to_numpy(np.float64), 1, festival_days)
+    weather = source["weather"].astype(str).map(venues.WEATHER_IMPACT)
+    columns.update({
+        "is_special_day": source["is_special_day"].to_numpy(np.float64),
+        "weather_impact_score": weather.fillna(venues.DEFAULT_WEATHER_IMPACT).to_numpy(np.float64),
+        "is_mumbai": _venue_table(lambda slug: venues.VENUES[slug]["city"] == "Mumbai")[code],
+        "festival_progress": day / festival_days,
+        "days_to_visarjan": festival_days - day,
+        "mandal_encoded": code.astype(np.float64),
+    })
+    columns["hour_x_weekend"] = hour * is_weekend
+    columns["hour_x_special"] = hour * columns["is_special_day"]
+    columns["weather_x_weekend"] = columns["weather_impact_score"] * is_weekend
+
+    X = np.empty((len(rows), len(feature_names)), dtype=np.float32)
+    for j, name in enumerate(feature_names):
+        X[:, j] = columns[name]
+    return {
+        "X": X,
+        "y": headcount[rows].astype(np.float32),
+        "timestamp": ts[rows],
+        "venue": venue[rows],
+    }
+
+
+class FeatureCache:
+    """
+    <cache_dir>/<key>/{X,y,timestamp,venue}.npy plus meta.json. Entries are
+    written to a temporary directory and renamed into place.
+    """
+
+    ARRAYS = ("X", "y", "timestamp", "venue")
+
+    def __init__(self, cache_dir):
+        self.cache_dir = Path(cache_dir)
+
+    @staticmethod
+    def key(data_digest, feature_names):
+        digest = hashlib.sha256()
+        digest.update(data_digest.encode())
+        digest.update(json.dumps([FEATURE_VERSION, list(feature_names)]).encode())
+        return digest.hexdigest()[:24]
+
+    def get(self, key):
+        """Memory-mapped arrays and meta for `key`, or None."""
+        entry = self.cache_dir / key
+        if not (entry / "meta.json").exists():
+            return None
+        arrays = {name: np.load(entry / f"{name}.npy", mmap_mode="r") for name in self.ARRAYS}
+        with open(entry / "meta.json") as fh:
+            return arrays, json.load(fh)
+
+    def put(self, key, arrays, meta):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp = Path(tempfile.mkdtemp(dir=self.cache_dir, prefix=f".{key}."))
+        try:
+            for name in self.ARRAYS:
+                np.save(tmp / f"{name}.npy", np.ascontiguousarray(arrays[name]))
+            with open(tmp / "meta.json", "w") as fh:
+                json.dump(meta, fh, indent=2)
+            os.replace(tmp, self.cache_dir / key)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+            if not (self.cache_dir / key / "meta.json").exists():
+                raise
+        return self.get(key)
@@ -0,0 +1,167 @@
+# backend/core/training/gbm.py
+"""
+Histogram gradient-boosted regression trees in plain NumPy.
+
+Serving only needs NumPy and joblib, so the default estimator is written
+here rather than taken from scikit-learn/LightGBM. Features are binned to
+at most `n_bins` quantile edges once; a node's split search is then a
+bincount over its (row, feature) bin ids, done only for the smaller child
+of each split (the sibling is the parent's histogram minus it).
+
+Trees are stored packed, in the layout core.compiled_model serves: one set
+of node arrays for the whole ensemble (feature, threshold, left, right,
+value) with per-tree root offsets, walked all at once by predict().
+"""
+import numpy as np
+
+from ..compiled_model import CompiledTrees, walk
+
+
+class GradientBoostedTrees:
+    """Least-squares boosting; a small, dependency-free stand-in for LGBMRegressor."""
+
+    def __init__(self, n_estimators=300, learning_rate=0.05, max_depth=6, min_samples_leaf=20,
+                 n_bins=64, l2_regularization=1.0, early_stopping_rounds=30):
+        self.n_estimators = n_estimators
+        self.learning_rate = learning_rate
+        self.max_depth = max_depth
+        self.min_samples_leaf = min_samples_leaf
+        self.n_bins = n_bins
+        self.l2_regularization = l2_regularization
+        self.early_stopping_rounds = early_stopping_rounds
+
+    # -----------------------
+    # Fitting
+    # -----------------------
+    def _bin_edges(self, X):
+        quantiles = np.linspace(0, 1, self.n_bins + 1)[1:-1]
+        return [np.unique(np.quantile(X[:, f], quantiles)) for f in range(X.shape[1])]
+
+    def _binned(self, X):
+        out = np.empty(X.shape, dtype=np.uint8)
+        for f, edges in enumerate(self.bin_edges_):
+            out[:, f] = np.searchsorted(edges, X[:, f], side="left")
+        return out
+
+    def _histogram(self, flat, grad, idx):
+        """Per (feature, bin) gradient sums and counts for rows `idx`."""
+        n_features, size = flat.shape[1], flat.shape[1] * self.n_bins
+        bins = flat[idx].ravel()
+        hist_g = np.bincount(bins, weights=np.repeat(grad[idx], n_features), minlength=size)
+        hist_n = np.bincount(bins, minlength=size)
+        return hist_g.reshape(n_features, self.n_bins), hist_n.reshape(n_features, self.n_bins)
+
+    def _grow(self, Xb, flat, grad, rows):
+        """
+        One tree as lists of (feature, threshold, left, right, value). Only the
+        smaller child's histogram is built; the sibling's is parent minus child.
+        """
+        lam = self.l2_regularization
+        nodes = []  # [feature, threshold, left, right, value]
+        stack = [(rows, 0, None, self._histogram(flat, grad, rows))]
+        while stack:
+            idx, depth, parent, (hist_g, hist_n) = stack.pop()
+            n = len(idx)
+            g_sum = hist_g[0].sum()
+            node_id = len(nodes)
+            nodes.append([-1, 0.0, -1, -1, -g_sum / (n + lam) * self.learning_rate])
+            if parent is not None:
+                nodes[parent[0]][2 if parent[1] else 3] = node_id
+            if depth >= self.max_depth or n < 2 * self.min_samples_leaf:
+                continue
+
+            left_g, left_n = np.cumsum(hist_g, axis=1), np.cumsum(hist_n, axis=1)
+            right_g, right_n = g_sum - left_g, n - left_n
+            with np.errstate(divide="ignore", invalid="ignore"):
+                gain = left_g ** 2 / (left_n + lam) + right_g ** 2 / (right_n + lam)
+            valid = (left_n >= self.min_samples_leaf) & (right_n >= self.min_samples_leaf)
+            gain = np.where(valid, gain, -np.inf)
+            feature, bin_id = np.unravel_index(int(np.argmax(gain)), gain.shape)
+            if not np.isfinite(gain[feature, bin_id]) or gain[feature, bin_id] <= g_sum ** 2 / (n + lam):
+                continue
+
+            goes_left = Xb[idx, feature] <= bin_id
+            left, right = idx[goes_left], idx[~goes_left]
+            small = left if len(left) <= len(right) else right
+            small_hist = self._histogram(flat, grad, small)
+            other_hist = (hist_g - small_hist[0], hist_n - small_hist[1])
+            left_hist, right_hist = (small_hist, other_hist) if small is left else (other_hist, small_hist)
+            nodes[node_id][0] = int(feature)
+            nodes[node_id][1] = float(self.bin_edges_[feature][bin_id])
+            stack.append((right, depth + 1, (node_id, False), right_hist))
+            stack.append((left, depth + 1, (node_id, True), left_hist))
+        return nodes
+
+    def fit(self, X, y, eval_set=None):
+        X = np.asarray(X, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        self.n_features_in_ = X.shape[1]
+        self.bin_edges_ = self._bin_edges(X)
+        # Bin ids index edges, so a split "bin <= b" is exactly "x <= edges[b]".
+        Xb = self._binned(X)
+        flat = (Xb + (np.arange(Xb.shape[1], dtype=np.int32) * self.n_bins)).astype(np.int32)
+        self.base_score_ = float(y.mean())
+        pred = np.full(len(y), self.base_score_)
+        rows = np.arange(len(y))
+
+        eval_pred = best_score = None
+        if eval_set is not None:
+            X_eval, y_eval = np.asarray(eval_set[0], dtype=np.float64), np.asarray(eval_set[1], dtype=np.float64)
+            eval_pred = np.full(len(y_eval), self.base_score_)
+            best_score, best_round = np.inf, 0
+
+        trees = []
+        for round_ in range(self.n_estimators):
+            tree = self._grow(Xb, flat, pred - y, rows)
+            trees.append(tree)
+            pred += _predict_tree(tree, X)
+            if eval_pred is not None:
+                eval_pred += _predict_tree(tree, X_eval)
+                score = float(np.mean(np.abs(eval_pred - y_eval)))
+                if score < best_score:
+                    best_score, best_round = score, round_ + 1
+                elif self.early_stopping_rounds and round_ + 1 - best_round >= self.early_stopping_rounds:
+                    break
+        if eval_pred is not None:
+            trees = trees[:best_round]
+            self.best_iteration_ = best_round
+            self.best_score_ = best_score
+        self._pack(trees)
+        del self.bin_edges_  # only needed while fitting; keeps the pickle small
+        return self
+
+    def _pack(self, trees):
+        packed = CompiledTrees.from_trees(trees, self.base_score_)
+        self.roots_, self.feature_, self.threshold_ = packed.roots, packed.feature, packed.threshold
+        self.left_, self.right_, self.value_ = packed.left, packed.right, packed.value
+        self.depth_ = packed.depth
+
+    # -----------------------
+    # Inference
+    # -----------------------
+    def predict(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if not len(self.roots_):
+            return np.full(len(X), self.base_score_)
+        return self.base_score_ + walk(X, self.roots_, self.feature_, self.threshold_,
+                                       self.left_, self.right_, self.value_, self.depth_)
+
+    @property
+    def n_trees(self):
+        return len(self.roots_)
+
+
+def _predict_tree(nodes, X):
+    """Contribution of one unpacked tree (used while fitting)."""
+    out = np.empty(len(X))
+    stack = [(0, np.arange(len(X)))]
+    while stack:
+        node_id, idx = stack.pop()
+        feature, threshold, left, right, value = nodes[node_id]
+        if feature < 0:
+            out[idx] = value
+            continue
+        goes_left = X[idx, feature] <= threshold
+        stack.append((left, idx[goes_left]))
+        stack.append((right, idx[~goes_left]))
+    return out
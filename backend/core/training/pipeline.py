@@ -0,0 +1,170 @@
+# backend/core/training/pipeline.py
+"""
+End-to-end training run: load CSVs, build (or reuse) the cached feature
+matrix, split chronologically, fit, evaluate and write the model file that
+core.ml serves, its compiled NumPy export and a JSON report next to it.
+"""
+import json
+import os
+import platform
+import time
+import tracemalloc
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+
+import joblib
+import numpy as np
+
+from .data import data_hash, dataset_files, load_datasets
+from .export import compile_model
+from .features import FeatureCache, build_feature_matrix
+from .gbm import GradientBoostedTrees
+
+ESTIMATORS = ("gbm", "random_forest")
+
+
+def chronological_split(timestamps, train=0.70, validation=0.85):
+    """Row masks for train/validation/test by timestamp quantile (the notebook's 70/15/15)."""
+    cut_train, cut_val = np.quantile(timestamps, [train, validation])
+    return timestamps < cut_train, (timestamps >= cut_train) & (timestamps < cut_val), timestamps >= cut_val
+
+
+def make_estimator(name, **params):
+    if name == "gbm":
+        return GradientBoostedTrees(**params)
+    if name == "random_forest":
+        try:
+            from sklearn.ensemble import RandomForestRegressor  # optional dependency
+        except ImportError as exc:
+            raise RuntimeError("--estimator random_forest needs scikit-learn installed") from exc
+        # Settings from the notebook's ensemble member.
+        defaults = {"n_estimators": 200, "max_depth": 15, "min_samples_split": 10,
+                    "min_samples_leaf": 5, "random_state": 42, "n_jobs": -1}
+        defaults.update(params)
+        return RandomForestRegressor(**defaults)
+    raise ValueError(f"unknown estimator {name!r}; choose from {', '.join(ESTIMATORS)}")
+
+
+def _mae(model, X, y):
+    if not len(y):
+        return None
+    return float(np.mean(np.abs(model.predict(X) - y)))
+
+
+def _max_rss_mb():
+    """Peak resident set size in MB, or None where `resource` is unavailable (Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if platform.system() == "Darwin" else rss / 1024  # bytes on macOS, KiB on Linux
+
+
+def train(data_dir, output, cache_dir, feature_names, estimator="gbm", use_cache=True, log=print, **params):
+    """
+    Train and save a model. Returns the report dict (also written to
+    <output>.json): data hash, rows, split sizes, MAE, timings and memory.
+    """
+    tracemalloc.start()
+    try:
+        return _train(data_dir, output, cache_dir, feature_names, estimator, use_cache, log, params)
+    finally:
+        tracemalloc.stop()
+
+
+def _train(data_dir, output, cache_dir, feature_names, estimator, use_cache, log, params):
+    started = time.perf_counter()
+    timings = {}
+
+    paths = dataset_files(data_dir)
+    if not paths:
+        raise FileNotFoundError(f"no *.csv files in {data_dir}")
+    t0 = time.perf_counter()
+    digest = data_hash(paths)
+    cache = FeatureCache(cache_dir)
+    key = FeatureCache.key(digest, feature_names)
+    cached = cache.get(key) if use_cache else None
+    timings["hash"] = time.perf_counter() - t0
+
+    if cached is None:
+        t0 = time.perf_counter()
+        frame = load_datasets(paths)
+        timings["load"] = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        arrays = build_feature_matrix(frame, feature_names)
+        timings["features"] = time.perf_counter() - t0
+        meta = {
+            "data_hash": digest,
+            "files": [p.name for p in paths],
+            "venues": sorted(frame["venue"].unique().astype(str)),
+            "rows": int(len(arrays["y"])),
+        }
+        del frame
+        if use_cache:
+            arrays, meta = cache.put(key, arrays, meta)
+        log(f"Built feature matrix {arrays['X'].shape} from {len(paths)} file(s)")
+    else:
+        arrays, meta = cached
+        log(f"Feature matrix {arrays['X'].shape} loaded from cache {key}")
+
+    X, y = arrays["X"], arrays["y"]
+    train_rows, val_rows, test_rows = chronological_split(np.asarray(arrays["timestamp"]))
+    model = make_estimator(estimator, **params)
+    t0 = time.perf_counter()
+    if estimator == "gbm":
+        model.fit(X[train_rows], y[train_rows], eval_set=(X[val_rows], y[val_rows]))
+    else:
+        model.fit(X[train_rows], y[train_rows])
+    timings["fit"] = time.perf_counter() - t0
+    model.feature_names_in_ = np.array(feature_names, dtype=object)
+
+    report = {
+        "trained_at": datetime.now(dt_timezone.utc).isoformat(),
+        "estimator": type(model).__name__,
+        "params": params,
+        "data_hash": meta["data_hash"],
+        "feature_cache": {"key": key, "hit": cached is not None},
+        "venues": meta["venues"],
+        "rows": {"train": int(train_rows.sum()), "validation": int(val_rows.sum()), "test": int(test_rows.sum())},
+        "mae": {
+            "validation": _mae(model, X[val_rows], y[val_rows]),
+            "test": _mae(model, X[test_rows], y[test_rows]),
+        },
+    }
+
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    tmp = output.with_name(output.name + ".tmp")
+    joblib.dump(model, tmp)
+    os.replace(tmp, output)  # the model registry picks up the new file on its next check
+
+    # The NumPy-only export core.ml prefers; written second so it is the newer file.
+    t0 = time.perf_counter()
+    try:
+        compiled = compile_model(model, feature_names)
+    except TypeError as exc:
+        log(f"Not exporting a compiled model: {exc}")
+    else:
+        compiled_path = output.with_suffix(".npz")
+        compiled.save(compiled_path)
+        sample = X[test_rows]
+        report["compiled"] = {
+            "file": compiled_path.name,
+            "bytes": compiled_path.stat().st_size,
+            "max_abs_error": float(np.max(np.abs(model.predict(sample) - compiled.predict(sample)))) if len(sample) else None,
+        }
+        timings["export"] = time.perf_counter() - t0
+
+    timings["total"] = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    report["seconds"] = {name: round(value, 3) for name, value in timings.items()}
+    max_rss = _max_rss_mb()
+    report["memory"] = {
+        "peak_traced_mb": round(peak / 1e6, 1),
+        "max_rss_mb": round(max_rss, 1) if max_rss is not None else None,
+    }
+    report["model_bytes"] = output.stat().st_size
+    with open(output.with_suffix(".json"), "w") as fh:
+        json.dump(report, fh, indent=2)
+    return report
@@ -2,7 +2,8 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     EventViewSet, ManagerEventViewSet, CustomAuthToken,
-    heatmap, PublicEventViewSet, AlertViewSet, HeadcountSnapshotViewSet, acknowledge_alert, code_entry_page, scan, scan_by_token
+    heatmap, PublicEventViewSet, AlertViewSet, HeadcountSnapshotViewSet, acknowledge_alert, code_entry_page, scan, scan_by_token,
+    scan_bulk,
 )
 
 
@@ -10,6 +11,7 @@ from .views import (
 router = DefaultRouter()
 router.register(r'events', PublicEventViewSet, basename='public-event')
 router.register(r'manager/events', ManagerEventViewSet, basename='manager-event')
+router.register(r'snapshots', HeadcountSnapshotViewSet, basename='snapshot')
 
 urlpatterns = [
     # API routes
@@ -25,5 +27,6 @@ urlpatterns = [
 
     # API endpoints (already provided in your views.py)
     path('api/scan/', scan, name='scan'),
+    path('api/scan/bulk/', scan_bulk, name='scan_bulk'),
     path('api/scan-by-token/', scan_by_token, name='scan_by_token'), # 👈 this line adds test frontend
 ]
@@ -1,8 +1,13 @@
-import qrcode
 import io
 import base64
 
-def generate_qr_datauri(url, box_size=6, border=2):
+def render_qr(url, fmt="png", box_size=6, border=2):
+    """
+    QR code for `url` as image bytes. "svg" uses qrcode's pure-Python SVG
+    factory and needs no PIL; "png" needs Pillow (or pypng).
+    """
+    import qrcode  # imported on first use: keeps qrcode/PIL out of worker start-up
+
     qr = qrcode.QRCode(
         box_size=box_size,
         border=border,
@@ -10,10 +15,18 @@ def generate_qr_datauri(url, box_size=6, border=2):
     qr.add_data(url)
     qr.make(fit=True)
 
-    img = qr.make_image(fill_color="black", back_color="white")
-
     buffered = io.BytesIO()
-    img.save(buffered, format="PNG")
-    b = base64.b64encode(buffered.getvalue()).decode()
+    if fmt == "svg":
+        import qrcode.image.svg
+
+        qr.make_image(image_factory=qrcode.image.svg.SvgPathImage).save(buffered)
+    else:
+        img = qr.make_image(fill_color="black", back_color="white")
+        img.save(buffered, format="PNG")
+    return buffered.getvalue()
+
+
+def generate_qr_datauri(url, box_size=6, border=2):
+    b = base64.b64encode(render_qr(url, "png", box_size, border)).decode()
 
-    return f"data:image/png;base64,{b}"
\ No newline at end of file
+    return f"data:image/png;base64,{b}"
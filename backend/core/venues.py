@@ -0,0 +1,105 @@
+# backend/core/venues.py
+"""
+Venue metadata shared by training and serving.
+
+Every venue in model_data/Data has an entry here: its display name (as it
+appears in the CSVs), city, the festival it is modelled around and a
+stable integer code. The code is the model's `mandal_encoded` feature, so
+codes are append-only: add new venues at the end and never renumber.
+
+Events opt in through Event.venue (a key of VENUES). static_features()
+turns (venue, day) into the per-venue features feature_row expects; events
+without a known venue keep core.features.STATIC_FEATURES.
+
+This module has no Django imports so the training code can use it freely.
+"""
+from datetime import date
+from functools import lru_cache
+
+# Festival windows as the datasets model them: a fixed start date each year,
+# `days` long, with the days (1-based) that carry is_special_day = 1.
+# special_days=None means every festival day is special.
+FESTIVALS = {
+    "ganeshotsav": {"start": (9, 5), "days": 11, "special_days": (1, 5, 7, 10, 11)},
+    "navratri": {"start": (10, 1), "days": 9, "special_days": None},
+    "koradi_navratri": {"start": (10, 1), "days": 9, "special_days": (1, 8, 9)},
+}
+
+VENUES = {
+    "andhericha_raja": {"code": 0, "name": "Andhericha Raja", "city": "Mumbai", "festival": "ganeshotsav"},
+    "dagdusheth_halwai_ganpati": {"code": 1, "name": "Dagdusheth Halwai Ganpati", "city": "Pune", "festival": "ganeshotsav"},
+    "kasba_ganpati": {"code": 2, "name": "Kasba Ganpati", "city": "Pune", "festival": "ganeshotsav"},
+    "lalbaugcha_raja": {"code": 3, "name": "Lalbaugcha Raja", "city": "Mumbai", "festival": "ganeshotsav"},
+    "siddhivinayak_temple": {"code": 4, "name": "Siddhivinayak Temple", "city": "Mumbai", "festival": "ganeshotsav"},
+    "koradi_devi_temple": {"code": 5, "name": "Koradi Devi Temple", "city": "Nagpur", "festival": "koradi_navratri"},
+    "dakshineswar_kali": {"code": 6, "name": "Dakshineswar Kali", "city": "Kolkata", "festival": "navratri"},
+    "kashi_vishwanath": {"code": 7, "name": "Kashi Vishwanath", "city": "Varanasi", "festival": "navratri"},
+    "somnath": {"code": 8, "name": "Somnath", "city": "Gujarat", "festival": "navratri"},
+    "vaishno_devi": {"code": 9, "name": "Vaishno Devi", "city": "Katra", "festival": "navratri"},
+}
+
+# Venue names ordered by code: the category order of the loaded datasets.
+VENUE_NAMES = tuple(v["name"] for v in sorted(VENUES.values(), key=lambda v: v["code"]))
+BY_NAME = {v["name"]: slug for slug, v in VENUES.items()}
+
+WEATHER_IMPACT = {
+    "Sunny": 1.0, "Clear": 1.0, "Pleasant": 1.0, "Humid": 0.9, "Cloudy": 0.85,
+    "Cold": 0.8, "Fog": 0.75, "Foggy": 0.75, "Light Rain": 0.7, "Rain": 0.55, "Heavy Rain": 0.4,
+}
+# Used when the weather is unknown, as at serving time (no weather feed yet).
+DEFAULT_WEATHER_IMPACT = 0.5
+
+
+def festival(slug):
+    return FESTIVALS[VENUES[slug]["festival"]]
+
+
+def festival_start(slug, year):
+    month, day = festival(slug)["start"]
+    return date(year, month, day)
+
+
+def is_special(slug, day_of_festival):
+    fest = festival(slug)
+    if not 1 <= day_of_festival <= fest["days"]:
+        return False
+    return fest["special_days"] is None or day_of_festival in fest["special_days"]
+
+
+@lru_cache(maxsize=4096)
+def static_features(slug, day, start=None):
+    """
+    Per-venue features for calendar `day`, or None for an unknown venue.
+    `start` is the festival's first day (default: the registry date in
+    `day`'s year). Days outside the festival are clamped to its ends for
+    progress and countdown, and are never special.
+
+    The result is cached and shared: callers must copy before mutating
+    (feature_row does).
+    """
+    venue = VENUES.get(slug)
+    if venue is None:
+        return None
+    fest = festival(slug)
+    start = start or festival_start(slug, day.year)
+    day_of_festival = (day - start).days + 1
+    clamped = min(max(day_of_festival, 1), fest["days"])
+    return {
+        "is_special_day": int(is_special(slug, day_of_festival)),
+        "weather_impact_score": DEFAULT_WEATHER_IMPACT,
+        "is_mumbai": int(venue["city"] == "Mumbai"),
+        "festival_progress": clamped / fest["days"],
+        "days_to_visarjan": fest["days"] - clamped,
+        "mandal_encoded": venue["code"],
+    }
+
+
+def event_static(event, now):
+    """
+    static_features for an Event at `now`; None when the event has no known
+    venue. Event.date, when set, is taken as the festival's first day.
+    """
+    if not event.venue:
+        return None
+    return static_features(event.venue, now.date(), event.date)
+
@@ -1,22 +1,24 @@
+from datetime import timezone as dt_timezone
+
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.conf import settings
-from django.db.models import Avg
-from django.db.models.functions import TruncSecond
+from django.core.handlers.asgi import ASGIRequest
 from django.shortcuts import render, get_object_or_404
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
 
 from rest_framework import viewsets, mixins, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.views import APIView
+from rest_framework.negotiation import BaseContentNegotiation
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.authtoken.models import Token
 
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
-
 # Local imports
-from .models import Event, HeadcountSnapshot, Alert
+from .models import Event, HeadcountSnapshot, Alert, Forecast
 from .serializers import (
     EventSerializer,
     EventDetailSerializer,
@@ -26,8 +28,15 @@ from .serializers import (
     HeatmapBucketSerializer,
 )
 from .permissions import IsEventManager
-from .utils import generate_qr_datauri
-from .ml import run_ml_predict
+from . import export, fanout, qr_cache, tasks
+from .consumers import alert_frame, broadcast_stats, event_update_frame, headcount_frame
+from .fastjson import dumps
+from .instrumentation import render_prometheus
+from .prediction_cache import cached_prediction, cache_stats
+from .counters import flush_headcounts, increment_headcount, increment_headcounts, parse_increment, set_headcount
+from .services import active_events, reduce_scans
+from .aggregation import bucket_snapshots
+from .pagination import MAX_PAGE_SIZE, SnapshotCursorPagination
 
 
 # -----------------------
@@ -35,16 +44,12 @@ from .ml import run_ml_predict
 # -----------------------
 def broadcast_update(event):
     """Broadcast event summary update to its group."""
-    channel_layer = get_channel_layer()
-    serializer = EventSerializer(event)
-    async_to_sync(channel_layer.group_send)(
-        f"event_{event.id}",
-        {
-            "type": "event_update",
-            "headcount": serializer.data.get("current_headcount"),
-            "status": serializer.data.get("status"),
-        },
-    )
+    state = event.current_state()
+    message = {
+        "headcount": state.headcount if state else 0,
+        "status": state.status if state else event.crowd_status(0),
+    }
+    fanout.broadcast(event.id, {"type": "event_update", **message, "frame": dumps(event_update_frame(message))})
 
 
 def broadcast_snapshot(snap):
@@ -53,11 +58,15 @@ def broadcast_snapshot(snap):
         "headcount": snap.headcount,
         "timestamp": snap.timestamp.isoformat() if hasattr(snap, "timestamp") else None,
         "source": snap.source,
-        "event_id": snap.event.id,
+        "event_id": snap.event_id,
     }
-    async_to_sync(get_channel_layer().group_send)(
-        f"event_{snap.event.id}", {"type": "headcount_update", "data": data}
-    )
+    fanout.broadcast(snap.event_id, {"type": "headcount_update", "data": data, "frame": dumps(headcount_frame(data))})
+
+
+def broadcast_alert(alert):
+    """Broadcast a newly raised alert to its event's group."""
+    data = dict(AlertSerializer(alert).data)
+    fanout.broadcast(alert.event_id, {"type": "alert_message", "data": data, "frame": dumps(alert_frame(data))})
 
 
 def check_alerts_for_snapshot(snap):
@@ -106,16 +115,72 @@ def check_alerts_for_snapshot(snap):
     return None
 
 
+def publish_snapshot(snap):
+    """Broadcast a snapshot, evaluate alerts for it and broadcast any alert raised."""
+    broadcast_snapshot(snap)
+    alert = check_alerts_for_snapshot(snap)
+    if alert:
+        broadcast_alert(alert)
+
+
+def enqueue_snapshot(snap):
+    """
+    Run publish_snapshot on the background queue, in order per event. The
+    scan is already counted, so a full queue publishes inline rather than
+    failing the request.
+    """
+    tasks.submit_or_run(snap.event_id, publish_snapshot, snap)
+
+
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def task_queue_metrics(request):
+    """
+    GET /api/tasks/metrics/
+    Depth and lag of the background alert/broadcast queue.
+    """
+    return Response(tasks.get_task_queue().metrics())
+
+
+def prometheus_metrics(request):
+    """
+    GET /api/metrics/
+    Request, consumer, SQL, cache and ML metrics in Prometheus text format.
+    """
+    return HttpResponse(render_prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def ws_broadcast_metrics(request):
+    """
+    GET /api/ws/metrics/
+    Group messages published vs. suppressed by coalescing, WebSocket frames
+    delivered, live sockets per event and relay upstream messages, all for
+    this process.
+    """
+    return Response({
+        "tick_seconds": fanout.broadcast_tick(),
+        **{name: {"total": sum(counter.values()), "per_event": dict(counter)}
+           for name, counter in fanout.coalescer.stats.items()},
+        **broadcast_stats(),
+        "shards": fanout.shard_count(),
+        "local_rebroadcast": fanout.local_rebroadcast(),
+        "connections": fanout.connections.counts(),
+        "relay_upstream": dict(fanout.relay.upstream),
+    })
+
+
 # -----------------------
 # Event ViewSets
 # -----------------------
 class PublicEventViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = Event.objects.all().order_by("-date")
+    queryset = Event.objects.select_related("state").order_by("-date")
     serializer_class = EventSerializer
     permission_classes = [AllowAny]
 
 class EventViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
-    queryset = Event.objects.all().order_by("-date")
+    queryset = Event.objects.select_related("state").order_by("-date")
     serializer_class = EventSerializer
     permission_classes = [AllowAny]
 
@@ -128,7 +193,7 @@ class ManagerEventViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated, IsEventManager]
 
     def get_queryset(self):
-        return Event.objects.filter(manager=self.request.user)
+        return Event.objects.filter(manager=self.request.user).select_related("state")
 
     def perform_create(self, serializer):
         serializer.save(manager=self.request.user)
@@ -163,21 +228,14 @@ def scan(request):
         return Response({"error": "event not found"}, status=404)
 
     try:
-        increment = int(request.data.get("increment", 1))
-    except (TypeError, ValueError):
-        increment = 1
-
-    last = HeadcountSnapshot.objects.filter(event=event).order_by("-timestamp").first()
-    new_count = (last.headcount if last else 0) + increment
-    snap = HeadcountSnapshot.objects.create(
-        event=event, headcount=new_count, source="qr", timestamp=timezone.now()
-    )
-    broadcast_snapshot(snap)
-    alert = check_alerts_for_snapshot(snap)
-    if alert:
-        async_to_sync(get_channel_layer().group_send)(
-            f"event_{event_id}", {"type": "alert_message", "data": AlertSerializer(alert).data}
-        )
+        increment = parse_increment(request.data.get("increment"))
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+
+    # Atomic increment; the counter flushes totals into HeadcountSnapshot periodically.
+    new_count = increment_headcount(event.id, increment)
+    snap = HeadcountSnapshot(event=event, headcount=new_count, source="qr", timestamp=timezone.now())
+    enqueue_snapshot(snap)
     return Response({"headcount": new_count, "event_id": event.id})
 
 
@@ -194,22 +252,49 @@ def scan_by_token(request):
         return Response({"error": "invalid token"}, status=404)
 
     try:
-        increment = int(request.data.get("increment", 1))
-    except (TypeError, ValueError):
-        increment = 1
+        increment = parse_increment(request.data.get("increment"))
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+
+    # Atomic increment; the counter flushes totals into HeadcountSnapshot periodically.
+    new_count = increment_headcount(event.id, increment)
+    snap = HeadcountSnapshot(event=event, headcount=new_count, source="qr", timestamp=timezone.now())
+    enqueue_snapshot(snap)
+    return Response({"headcount": new_count, "event_id": event.id, "token": token})
 
-    last = HeadcountSnapshot.objects.filter(event=event).order_by("-timestamp").first()
-    new_count = (last.headcount if last else 0) + increment
-    snap = HeadcountSnapshot.objects.create(
-        event=event, headcount=new_count, source="qr", timestamp=timezone.now()
-    )
-    broadcast_snapshot(snap)
-    alert = check_alerts_for_snapshot(snap)
-    if alert:
-        async_to_sync(get_channel_layer().group_send)(
-            f"event_{event.id}", {"type": "alert_message", "data": AlertSerializer(alert).data}
+
+@api_view(["POST"])
+@permission_classes([AllowAny])
+def scan_bulk(request):
+    """
+    POST /api/api/scan/bulk/
+    Body JSON: {"scans": [{"event_id": 1, "increment": 1}, {"token": "abc123"}, ...]}
+    Increments are reduced per event, written in one transaction and
+    broadcast as one headcount_update per event.
+    """
+    scans = request.data.get("scans")
+    if not isinstance(scans, list) or not scans:
+        return Response({"error": "scans must be a non-empty list"}, status=400)
+    max_batch = getattr(settings, "SCAN_BULK_MAX_ITEMS", 5000)
+    if len(scans) > max_batch:
+        return Response({"error": f"at most {max_batch} scans per request"}, status=400)
+
+    totals, errors = reduce_scans(scans)
+    counts = increment_headcounts({event.id: total for event, total in totals.items()})
+    flushed = {snap.event_id: snap for snap in flush_headcounts(event_ids=list(counts))}
+
+    now = timezone.now()
+    results = []
+    for event, total in totals.items():
+        # Alerts compare against the snapshot before this one, so publish the row
+        # just written; a concurrent flush may already have taken this total.
+        snap = flushed.get(event.id) or HeadcountSnapshot(
+            event=event, headcount=counts[event.id], source="qr", timestamp=now
         )
-    return Response({"headcount": new_count, "event_id": event.id, "token": token})
+        snap.event = event
+        enqueue_snapshot(snap)
+        results.append({"event_id": event.id, "increment": total, "headcount": counts[event.id]})
+    return Response({"results": results, "errors": errors})
 
 
 # -----------------------
@@ -239,12 +324,8 @@ def admin_update(request):
     snap = HeadcountSnapshot.objects.create(
         event=event, headcount=new_count, source="admin", timestamp=timezone.now()
     )
-    broadcast_snapshot(snap)
-    alert = check_alerts_for_snapshot(snap)
-    if alert:
-        async_to_sync(get_channel_layer().group_send)(
-            f"event_{event.id}", {"type": "alert_message", "data": AlertSerializer(alert).data}
-        )
+    set_headcount(event.id, new_count)
+    enqueue_snapshot(snap)
     return Response({"headcount": new_count, "event_id": event.id})
 
 
@@ -259,61 +340,200 @@ def status_view(request):
         return Response({"status": "ok"})  # health check fallback
 
     try:
-        event = Event.objects.get(pk=event_id)
+        event = Event.objects.select_related("state").get(pk=event_id)
     except Event.DoesNotExist:
         return Response({"error": "event not found"}, status=404)
 
-    last = HeadcountSnapshot.objects.filter(event=event).order_by("-timestamp").first()
-    if not last:
+    state = event.current_state()
+    if not state:
         return Response({"error": "no snapshots"}, status=404)
 
-    predicted = run_ml_predict(event, timezone.now() + timezone.timedelta(hours=1))
+    now = timezone.now()
+    target = now + timezone.timedelta(hours=1)
+    predicted = stored_prediction(event, now)
+    if predicted is None and getattr(settings, "FORECAST_INLINE_FALLBACK", False):
+        from .ml import run_ml_predict  # numpy and the model load only when predicting inline
+
+        predicted, _ = cached_prediction(event, target, state.snapshot_id, run_ml_predict)
     status_data = {
-        "headcount": last.headcount,
-        "status": EventSerializer(event).get_status(event),
-        "source": last.source,
+        "headcount": state.headcount,
+        "status": state.status,
+        "source": state.source,
         "predicted_next_hour": predicted,
-        "timestamp": last.timestamp,
+        "timestamp": state.timestamp,
     }
     return Response(StatusSerializer(status_data).data)
 
 
+def stored_prediction(event, now):
+    """
+    Next-hour headcount from the precomputed Forecast table: the stored
+    forecast whose target is closest to an hour from now, or None. Forecasts
+    generated more than FORECAST_MAX_AGE seconds ago are ignored (the
+    compute_forecasts loop has stopped), so the caller falls back.
+    """
+    max_age = getattr(settings, "FORECAST_MAX_AGE", 900)
+    forecast = (
+        Forecast.objects.filter(
+            event=event,
+            target_time__gte=now + timezone.timedelta(minutes=30),
+            generated_at__gte=now - timezone.timedelta(seconds=max_age),
+        )
+        .order_by("target_time")
+        .values_list("predicted_headcount", flat=True)
+        .first()
+    )
+    return forecast
+
+
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def forecast_view(request):
+    """
+    GET /api/forecast/?event_id=<id>
+    Stored multi-horizon forecasts for an event (see compute_forecasts).
+    """
+    event_id = request.query_params.get("event_id")
+    if not event_id:
+        return Response({"error": "event_id required"}, status=400)
+    try:
+        event = Event.objects.get(pk=event_id)
+    except (Event.DoesNotExist, ValueError):
+        return Response({"error": "event not found"}, status=404)
+
+    forecasts = (
+        Forecast.objects.filter(event=event)
+        .order_by("horizon_hours")
+        .values("horizon_hours", "target_time", "predicted_headcount", "method", "model_version", "generated_at")
+    )
+    return Response({"event_id": event.id, "forecasts": list(forecasts)})
+
+
 @api_view(["GET"])
 @permission_classes([AllowAny])
 def history_view(request):
+    """
+    GET /api/history/?event_id=<id>[&limit=50][&cursor=<next cursor>][&interval=<seconds>]
+    Snapshots newest first, keyset-paginated: follow `next` for older pages.
+    With `interval`, the latest `limit` aggregated buckets instead.
+    """
     event_id = request.query_params.get("event_id")
-    limit = int(request.query_params.get("limit", 50))
     if not event_id:
         return Response({"error": "event_id required"}, status=400)
+    try:
+        limit = int(request.query_params.get("limit", 50))
+    except ValueError:
+        return Response({"error": "limit must be an integer"}, status=400)
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return Response({"error": f"limit must be between 1 and {MAX_PAGE_SIZE}"}, status=400)
     try:
         event = Event.objects.get(pk=event_id)
-    except Event.DoesNotExist:
+    except (Event.DoesNotExist, ValueError):
         return Response({"error": "event not found"}, status=404)
 
-    snaps = (
-        HeadcountSnapshot.objects.filter(event=event)
-        .order_by("-timestamp")[:limit]
-        .values("timestamp", "headcount", "source")
+    interval = request.query_params.get("interval")
+    if interval is not None:
+        # Bucketed history: the latest `limit` buckets, served from the rollups where possible.
+        try:
+            interval = int(interval)
+        except ValueError:
+            return Response({"error": "interval must be an integer"}, status=400)
+        if interval < 1:
+            return Response({"error": "interval must be positive"}, status=400)
+        now = timezone.now()
+        start = now - timezone.timedelta(seconds=interval * (limit - 1) + int(now.timestamp()) % interval)
+        buckets = bucket_snapshots(event.id, interval, start=start)[-limit:]
+        return Response({
+            "event_id": event.id,
+            "interval": interval,
+            "history": HeatmapBucketSerializer(buckets[::-1], many=True).data,
+        })
+
+    paginator = SnapshotCursorPagination()
+    paginator.page_size = limit
+    snaps = paginator.paginate_queryset(
+        HeadcountSnapshot.objects.filter(event=event).values("timestamp", "headcount", "source"), request
+    )
+    return Response({"event_id": event.id, "history": snaps, "next": paginator.get_next_link()})
+
+
+def history_export(request):
+    """
+    GET /api/history/export/?event_id=<id>[&format=ndjson|csv][&start=<iso>][&end=<iso>]
+    Streams every snapshot of an event, oldest first, in constant memory.
+    A plain Django view: DRF would treat ?format= as a renderer choice.
+    """
+    event_id = request.GET.get("event_id")
+    fmt = request.GET.get("format", "ndjson")
+    if not event_id:
+        return JsonResponse({"error": "event_id required"}, status=400)
+    if fmt not in export.FORMATS:
+        return JsonResponse({"error": f"format must be one of {', '.join(export.FORMATS)}"}, status=400)
+    bounds = {}
+    for name in ("start", "end"):
+        raw = request.GET.get(name)
+        if raw is None:
+            continue
+        try:
+            bounds[name] = parse_datetime(raw)
+        except ValueError:
+            bounds[name] = None
+        if bounds[name] is None:
+            return JsonResponse({"error": f"{name} must be an ISO 8601 datetime"}, status=400)
+        if timezone.is_naive(bounds[name]):
+            bounds[name] = timezone.make_aware(bounds[name], dt_timezone.utc)
+    event = Event.objects.filter(pk=event_id).first() if event_id.isdigit() else None
+    if event is None:
+        return JsonResponse({"error": "event not found"}, status=404)
+
+    content_type, suffix = export.FORMATS[fmt]
+    response = StreamingHttpResponse(
+        export.stream(event.id, fmt, asynchronous=isinstance(request, ASGIRequest), **bounds),
+        content_type=content_type,
     )
-    return Response({"event_id": event.id, "history": list(snaps)})
+    response["Content-Disposition"] = f'attachment; filename="event-{event.id}-history.{suffix}"'
+    return response
+
+
+# Heatmap windows past these bounds overflow datetime arithmetic.
+HEATMAP_MAX_MINUTES = 366 * 24 * 60  # one year
+HEATMAP_MAX_INTERVAL = 7 * 24 * 3600  # seconds; one week
+
+
+def _heatmap_bounds_error(minutes, interval_seconds):
+    """Error Response for a window or bucket past the heatmap bounds, else None."""
+    if minutes is not None and minutes > HEATMAP_MAX_MINUTES:
+        return Response({"error": f"minutes must be at most {HEATMAP_MAX_MINUTES}"}, status=400)
+    if interval_seconds > HEATMAP_MAX_INTERVAL:
+        return Response({"error": f"interval must be at most {HEATMAP_MAX_INTERVAL} seconds"}, status=400)
+    return None
 
 
 @api_view(["GET"])
 @permission_classes([AllowAny])
 def heatmap_view(request):
+    """
+    GET /api/heatmap/?event_id=<id>&interval=300[&minutes=<window>]
+    Headcount per `interval`-second bucket (last/avg/max/min), aggregated in SQL.
+    """
     event_id = request.query_params.get("event_id")
-    interval = int(request.query_params.get("interval", 300))
     if not event_id:
         return Response({"error": "event_id required"}, status=400)
+    try:
+        interval = int(request.query_params.get("interval", 300))
+        minutes = request.query_params.get("minutes")
+        minutes = int(minutes) if minutes is not None else None
+    except (TypeError, ValueError):
+        return Response({"error": "interval and minutes must be integers"}, status=400)
+    if interval < 1 or (minutes is not None and minutes < 1):
+        return Response({"error": "interval and minutes must be positive"}, status=400)
+    error = _heatmap_bounds_error(minutes, interval)
+    if error is not None:
+        return error
 
-    heatmap_data = (
-        HeadcountSnapshot.objects.filter(event_id=event_id)
-        .annotate(ts=TruncSecond("timestamp"))
-        .values("ts")
-        .annotate(avg_headcount=Avg("headcount"))
-        .order_by("ts")
-    )
-    return Response(HeatmapBucketSerializer(heatmap_data, many=True).data)
+    start = timezone.now() - timezone.timedelta(minutes=minutes) if minutes else None
+    buckets = bucket_snapshots(event_id, interval, start=start)
+    return Response(HeatmapBucketSerializer(buckets, many=True).data)
 
 
 @api_view(["GET"])
@@ -324,11 +544,11 @@ def alerts_view(request):
         return Response({"error": "event_id required"}, status=400)
 
     try:
-        event = Event.objects.get(pk=event_id)
+        event = Event.objects.select_related("state").get(pk=event_id)
     except Event.DoesNotExist:
         return Response({"error": "event not found"}, status=404)
 
-    latest = event.snapshots.order_by("-timestamp").first()
+    latest = event.current_state()
     alerts = []
     if latest:
         if latest.headcount > getattr(event, "crowded_threshold", 0):
@@ -350,26 +570,162 @@ def alerts_view(request):
     return Response(alerts)
 
 
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def forecast_batch(request):
+    """
+    GET /api/forecast/batch/?event_ids=1,2,3
+    Next-hour forecasts for many events with one history query and one
+    model.predict call. Without event_ids, covers every active event
+    (undated, or dated today or later).
+    """
+    raw_ids = request.query_params.get("event_ids")
+    if raw_ids:
+        try:
+            ids = [int(i) for i in raw_ids.split(",") if i.strip()]
+        except ValueError:
+            return Response({"error": "event_ids must be comma-separated integers"}, status=400)
+        events = Event.objects.filter(pk__in=ids)
+    else:
+        events = active_events()
+
+    events = list(events.select_related("state").order_by("pk"))
+    target = timezone.now() + timezone.timedelta(hours=1)
+    from .ml import run_ml_predict_batch
+
+    predictions = run_ml_predict_batch(events, target)
+    return Response({
+        "target": target,
+        "forecasts": [
+            {
+                "event_id": event.id,
+                "predicted_next_hour": predictions[event.id][0],
+                "reason": predictions[event.id][1],
+            }
+            for event in events
+        ],
+    })
+
+
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def ml_model_info(request):
+    """
+    GET /api/ml/model/
+    Reports the cached prediction model (version hash, load time, reload count)
+    and prediction cache hit/miss counters.
+    """
+    from .ml import model_registry
+
+    try:
+        model_registry.get()
+    except Exception:
+        pass  # reported through last_error below
+    return Response({**model_registry.info(), "prediction_cache": cache_stats()})
+
+
 # -----------------------
 # QR code generation
 # -----------------------
+QR_LIMITS = {"box_size": (1, 40), "border": (0, 20)}
+
+
+def _qr_options(params):
+    """(format, box_size, border) from ?type=&box_size=&border=; None means the QR_CODES default."""
+    fmt = params.get("type") or None
+    if fmt is not None and fmt not in qr_cache.FORMATS:
+        raise ValueError(f"type must be one of {', '.join(qr_cache.FORMATS)}")
+    sizes = {}
+    for name, (low, high) in QR_LIMITS.items():
+        raw = params.get(name)
+        if raw is None:
+            sizes[name] = None
+            continue
+        if not raw.isdigit() or not low <= int(raw) <= high:
+            raise ValueError(f"{name} must be an integer from {low} to {high}")
+        sizes[name] = int(raw)
+    return fmt, sizes["box_size"], sizes["border"]
+
+
+def _managed_event(request, event_id):
+    """(event, None) for the event's manager, else (None, error Response)."""
+    try:
+        event = Event.objects.get(pk=event_id)
+    except Event.DoesNotExist:
+        return None, Response({"error": "event not found"}, status=404)
+    if event.manager != request.user:
+        return None, Response({"error": "permission denied"}, status=403)
+    return event, None
+
+
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def qr_for_event(request, event_id):
+    """
+    GET /api/qr/<event_id>/[?type=png|svg][&box_size=][&border=]
+    The event's scan QR code as a data URI, from the QR asset cache.
+    """
+    event, error = _managed_event(request, event_id)
+    if error:
+        return error
     try:
-        event = Event.objects.get(pk=event_id)
-    except Event.DoesNotExist:
-        return Response({"error": "event not found"}, status=404)
+        fmt, box_size, border = _qr_options(request.query_params)
+    except ValueError as exc:
+        return Response({"error": str(exc)}, status=400)
+
+    body, content_type, etag = qr_cache.cached_qr(event.qr_token, fmt, box_size, border)
+    return Response({
+        "qr_data_uri": qr_cache.data_uri(body, content_type),
+        "scan_url": qr_cache.scan_url(event.qr_token),
+        "etag": etag,
+    })
+
+
+class FirstRendererNegotiation(BaseContentNegotiation):
+    """
+    Ignores Accept, so `Accept: image/png` reaches the view instead of a 406;
+    errors are still rendered as JSON.
+    """
+
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
 
-    if event.manager != request.user:
-        return Response({"error": "permission denied"}, status=403)
 
-    frontend_url = getattr(settings, "FRONTEND_BASE_URL", "http://localhost:3000")
-    scan_url = f"{frontend_url}/scan/{event.qr_token}"
-    data_uri = generate_qr_datauri(scan_url)
-    return Response({"qr_data_uri": data_uri, "scan_url": scan_url})
+class QRImageView(APIView):
+    """
+    GET /api/qr/<event_id>/image/[?type=png|svg][&box_size=][&border=]
+    The raw image bytes, for <img> tags and printing. Responses carry an
+    ETag derived from the cache key, so If-None-Match gets a 304 without
+    rendering anything.
+    """
+    permission_classes = [IsAuthenticated]
+    content_negotiation_class = FirstRendererNegotiation
+
+    def get(self, request, event_id):
+        event, error = _managed_event(request, event_id)
+        if error:
+            return error
+        try:
+            fmt, box_size, border = _qr_options(request.query_params)
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=400)
+
+        etag = qr_cache.qr_etag(event.qr_token, fmt, box_size, border)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            body, content_type, etag = qr_cache.cached_qr(event.qr_token, fmt, box_size, border)
+            response = HttpResponse(body, content_type=content_type)
+            suffix = "svg" if content_type == qr_cache.FORMATS["svg"] else "png"
+            response["Content-Disposition"] = f'inline; filename="event-{event.id}-qr.{suffix}"'
+        response["ETag"] = etag
+        # Revalidate every time: a regenerated qr_token changes the ETag.
+        response["Cache-Control"] = "private, no-cache"
+        return response
+
 
-  
 class SnapshotCreateView(APIView):
     """
     POST /api/snapshots/<event_id>/
@@ -389,16 +745,10 @@ class SnapshotCreateView(APIView):
             timestamp=timezone.now(),
             source=request.data.get("source", "sensor"),
         )
+        set_headcount(event_id, headcount)
 
-        # Broadcast headcount update
-        broadcast_snapshot(snap)
-
-        # Check for alerts and broadcast if created
-        alert = check_alerts_for_snapshot(snap)
-        if alert:
-            async_to_sync(get_channel_layer().group_send)(
-                f"event_{event_id}", {"type": "alert_message", "data": AlertSerializer(alert).data}
-            )
+        # Broadcast and check alerts off the request path
+        enqueue_snapshot(snap)
 
         return Response({"status": "ok", "headcount": headcount, "event_id": event_id})
 
@@ -418,8 +768,16 @@ def heatmap(request):
     except Event.DoesNotExist:
         return Response({"error": "event not found"}, status=404)
 
-    minutes = int(request.query_params.get("minutes", 60))
-    interval = int(request.query_params.get("interval", 10))
+    try:
+        minutes = int(request.query_params.get("minutes", 60))
+        interval = int(request.query_params.get("interval", 10))
+    except (TypeError, ValueError):
+        return Response({"error": "interval and minutes must be integers"}, status=400)
+    if interval < 1 or minutes < 1:
+        return Response({"error": "interval and minutes must be positive"}, status=400)
+    error = _heatmap_bounds_error(minutes, interval * 60)  # interval is in minutes here
+    if error is not None:
+        return error
 
     from .services import heatmap_for_event
     data = heatmap_for_event(event, minutes=minutes, interval=interval)
@@ -437,12 +795,13 @@ class AlertViewSet(viewsets.ReadOnlyModelViewSet):
 # -----------------------
 class HeadcountSnapshotViewSet(viewsets.ReadOnlyModelViewSet):
     """
-    Read-only ViewSet for HeadcountSnapshot.
-    Supports optional ?event_id=<id> filter.
+    Read-only ViewSet for HeadcountSnapshot, cursor-paginated newest first.
+    Supports optional ?event_id=<id> filter and ?limit=<page size>.
     """
-    queryset = HeadcountSnapshot.objects.all().order_by("-timestamp")
+    queryset = HeadcountSnapshot.objects.select_related("event")
     serializer_class = HeadcountSnapshotSerializer
     permission_classes = [AllowAny]
+    pagination_class = SnapshotCursorPagination
 
     def get_queryset(self):
         qs = super().get_queryset()
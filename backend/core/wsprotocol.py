@@ -0,0 +1,122 @@
+# backend/core/wsprotocol.py
+"""
+Compact wire formats for /ws/event/<id>/.
+
+The default stream sends JSON objects (see consumers.headcount_frame). A
+client can opt into a compact mode with a WebSocket subprotocol or, where it
+cannot set one, a ?proto= query parameter:
+
+    crowd.compact.v1   (?proto=compact)  JSON arrays in text frames
+    crowd.binary.v1    (?proto=binary)   fixed-size big-endian binary frames
+
+Every frame carries a per-socket sequence number that increases by one, so a
+client that sees a gap knows it missed something and asks for a resync.
+Headcount updates are deltas against the last value sent on this socket:
+
+    kind       array frame                     binary frame (struct)
+    snapshot   ["s", seq, headcount, ts, st]   !BIiIB  (0, seq, headcount, ts, st)
+    headcount  ["h", seq, d_headcount, d_ts]   !BIii   (1, seq, d_headcount, d_ts)
+    event      ["e", seq, headcount, st]       !BIiB   (2, seq, headcount, st)
+    alert      ["a", seq, {alert}]             same array, as a text frame
+
+`ts` is epoch seconds, `st` the status code (0 Green, 1 Yellow, 2 Red). A
+snapshot is sent right after connect and whenever the client sends
+{"action": "resync"} (or ["r"]); it resets the delta base.
+"""
+import struct
+import time
+from datetime import datetime
+from urllib.parse import parse_qs
+
+from .fastjson import dumps
+
+COMPACT_SUBPROTOCOL = "crowd.compact.v1"
+BINARY_SUBPROTOCOL = "crowd.binary.v1"
+
+VERBOSE, COMPACT, BINARY = "verbose", "compact", "binary"
+
+STATUS_CODES = {"Green": 0, "Yellow": 1, "Red": 2}
+
+_SNAPSHOT = struct.Struct("!BIiIB")
+_HEADCOUNT = struct.Struct("!BIii")
+_EVENT = struct.Struct("!BIiB")
+
+
+def negotiate(scope):
+    """
+    Pick the stream mode for a connection.
+    Returns (mode, subprotocol to accept or None).
+    """
+    offered = scope.get("subprotocols") or []
+    if BINARY_SUBPROTOCOL in offered:
+        return BINARY, BINARY_SUBPROTOCOL
+    if COMPACT_SUBPROTOCOL in offered:
+        return COMPACT, COMPACT_SUBPROTOCOL
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    proto = (query.get("proto") or [""])[0]
+    if proto in (COMPACT, BINARY):
+        return proto, None
+    return VERBOSE, None
+
+
+def epoch_seconds(timestamp):
+    """ISO string / datetime / None -> integer epoch seconds (now for None)."""
+    if timestamp is None:
+        return int(time.time())
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+    return int(timestamp.timestamp())
+
+
+class DeltaEncoder:
+    """
+    Per-socket encoder: owns the sequence counter and the delta base
+    (last headcount and timestamp sent). Frames are str (text) or bytes.
+    """
+
+    def __init__(self, binary=False):
+        self.binary = binary
+        self.seq = 0
+        self.headcount = 0
+        self.ts = 0
+
+    def _next(self):
+        self.seq += 1
+        return self.seq
+
+    def snapshot(self, headcount, timestamp, status):
+        self.headcount, self.ts = int(headcount), epoch_seconds(timestamp)
+        code = STATUS_CODES.get(status, 0)
+        if self.binary:
+            return _SNAPSHOT.pack(0, self._next(), self.headcount, self.ts, code)
+        return dumps(["s", self._next(), self.headcount, self.ts, code])
+
+    def headcount_update(self, data):
+        headcount, ts = int(data.get("headcount") or 0), epoch_seconds(data.get("timestamp"))
+        d_headcount, d_ts = headcount - self.headcount, ts - self.ts
+        self.headcount, self.ts = headcount, ts
+        if self.binary:
+            return _HEADCOUNT.pack(1, self._next(), d_headcount, d_ts)
+        return dumps(["h", self._next(), d_headcount, d_ts])
+
+    def event_update(self, headcount, status):
+        self.headcount = int(headcount or 0)
+        code = STATUS_CODES.get(status, 0)
+        if self.binary:
+            return _EVENT.pack(2, self._next(), self.headcount, code)
+        return dumps(["e", self._next(), self.headcount, code])
+
+    def alert(self, data):
+        return dumps(["a", self._next(), data])
+
+
+def decode_binary(frame):
+    """Inverse of DeltaEncoder's binary frames (for clients written in Python and tests)."""
+    kind = frame[0]
+    if kind == 0:
+        return ("s",) + _SNAPSHOT.unpack(frame)[1:]
+    if kind == 1:
+        return ("h",) + _HEADCOUNT.unpack(frame)[1:]
+    if kind == 2:
+        return ("e",) + _EVENT.unpack(frame)[1:]
+    raise ValueError(f"unknown frame kind {kind}")
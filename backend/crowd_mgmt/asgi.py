@@ -1,16 +1,20 @@
 # backend/core/crowd_mgmt/asgi.py
 import os
 from django.core.asgi import get_asgi_application
-from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
-
-# import app routing
-import core.routing as core_routing
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "crowd_mgmt.settings")
 
+# Set up Django (apps, models) before anything imports core's models.
+django_asgi_app = get_asgi_application()
+
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+from channels.auth import AuthMiddlewareStack  # noqa: E402
+
+# import app routing
+import core.routing as core_routing  # noqa: E402
+
 application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
+    "http": django_asgi_app,
     "websocket": AuthMiddlewareStack(
         URLRouter(core_routing.websocket_urlpatterns)
     ),
@@ -50,6 +50,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.instrumentation.MetricsMiddleware",  # first, so it times the whole stack
     "django.middleware.security.SecurityMiddleware",
     'corsheaders.middleware.CorsMiddleware',
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -123,6 +124,131 @@ CHANNEL_LAYERS = {
         'BACKEND': 'channels.layers.InMemoryChannelLayer'
     }
 }
+# Multi-process deployments can share groups through Redis:
+# CHANNEL_LAYERS = {
+#     'default': {
+#         'BACKEND': 'core.layers.RedisChannelLayer',
+#         'CONFIG': {'url': 'redis://localhost:6379/0'},
+#     }
+# }
+
+# Request/consumer latency, SQL and ML metrics at /api/metrics/ (core.instrumentation).
+# A SLOW_SAMPLE_RATE fraction of requests slower than SLOW_REQUEST_SECONDS is logged
+# to core.slow_requests with their first MAX_TRACED_QUERIES SQL statements.
+INSTRUMENTATION = {
+    'ENABLED': True,
+    'SLOW_REQUEST_SECONDS': 1.0,
+    'SLOW_SAMPLE_RATE': 0.1,
+    'MAX_TRACED_QUERIES': 20,
+}
+
+# Event broadcasts go to SHARDS sub-groups per event; with LOCAL_REBROADCAST each
+# process subscribes once per event and fans out to its own sockets (core.fanout),
+# queueing at most INBOX_SIZE frames per socket.
+WS_FANOUT = {
+    'SHARDS': 1,
+    'LOCAL_REBROADCAST': False,
+    'INBOX_SIZE': 100,
+}
+
+# Each event's group gets at most one headcount/event update per tick (latest value wins),
+# coalesced by the producer (core/fanout.py). Alerts are always published immediately.
+# 0 disables coalescing.
+WS_BROADCAST_TICK = 1.0
+
+# Running headcount counter used by the scan endpoints (see core/counters.py).
+# Switch BACKEND to 'core.counters.RedisCounter' with OPTIONS {'url': ...}
+# when running more than one worker process.
+HEADCOUNT_COUNTER = {
+    'BACKEND': 'core.counters.LocalCounter',
+    'OPTIONS': {},
+    'FLUSH_INTERVAL': 1.0,  # max seconds a scan waits to be flushed into HeadcountSnapshot
+    'MAX_INCREMENT': 10000,  # scans with a larger |increment| are rejected with 400
+}
+
+# Prediction model cache (see core/model_registry.py).
+ML_MODEL_MMAP_MODE = None       # e.g. 'r' to memory-map large numpy arrays in the model
+ML_MODEL_CHECK_INTERVAL = 5.0   # seconds between checks for a replaced model file
+ML_SERVE_COMPILED = True        # serve ml_models/crowd_predictor.npz (NumPy-only export) when up to date
+
+# `manage.py profile_startup` and the cold-start test (see core/startup.py).
+STARTUP = {
+    'BUDGET_SECONDS': 3.0,  # import time of crowd_mgmt.asgi/wsgi plus the URLconf
+}
+
+# `manage.py train_model` (see core/training/).
+ML_TRAINING = {
+    'DATA_DIR': BASE_DIR.parent / 'model_data' / 'Data',
+    'CACHE_DIR': BASE_DIR / 'ml_models' / 'feature_cache',  # memory-mapped feature matrices, keyed by data hash
+}
+
+# Caches. 'predictions' holds run_ml_predict results (see core/prediction_cache.py);
+# LocMemCache evicts least-recently-used entries beyond MAX_ENTRIES.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'predictions': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'predictions',
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    # Rendered QR images (see core/qr_cache.py). Keys change with their inputs, so
+    # no expiry; culling one entry at a time keeps eviction least-recently-used.
+    'qr': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'qr',
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 512, 'CULL_FREQUENCY': 512},
+    },
+}
+PREDICTION_CACHE_ALIAS = 'predictions'
+PREDICTION_CACHE_TTL = 300  # seconds; the target hour bucket also rolls the key
+
+# QR codes for /api/qr/ and `manage.py prerender_qr` (see core/qr_cache.py).
+QR_CODES = {
+    'CACHE_ALIAS': 'qr',
+    'FORMAT': 'png',  # default image type; 'svg' needs no PIL
+    'BOX_SIZE': 6,
+    'BORDER': 2,
+    'SIGNAGE_DIR': BASE_DIR / 'qr_signage',
+}
+
+# /status/ serves predictions precomputed by `manage.py compute_forecasts --interval 300`.
+# Set to True to run (cached) inference inline when no fresh stored forecast exists.
+FORECAST_INLINE_FALLBACK = False
+FORECAST_MAX_AGE = 900  # seconds; older stored forecasts are not served
+
+# Minute/hour rollups of headcount snapshots (see core/rollups.py), maintained by
+# `manage.py refresh_rollups --interval 60`. History/heatmap reads use them when possible.
+ROLLUPS = {
+    'ENABLED': True,
+    'BATCH_SIZE': 50000,  # snapshots folded per transaction
+    'SAFETY_LAG': None,   # seconds before an id range counts as committed; None = 0 on SQLite, 30 elsewhere
+}
+
+# Raw snapshot retention (see core/retention.py): `manage.py apply_retention --interval 3600`
+# archives snapshots older than RAW_DAYS and keeps one per COMPACT_SECONDS bucket.
+# Restore with `manage.py restore_snapshots <archive dir or files>`.
+RETENTION = {
+    'RAW_DAYS': 7,
+    'COMPACT_SECONDS': 60,
+    'MINUTE_ROLLUP_DAYS': 90,
+    'ARCHIVE_DIR': BASE_DIR / 'archive',
+    'FORMAT': 'auto',     # Parquet when pyarrow is installed, else gzip CSV
+    'CHUNK_SIZE': 5000,   # snapshots per archive file / delete transaction
+    'PAUSE': 0.05,        # seconds between chunks, lets scan writers in
+}
+
+# Background queue for alert evaluation and WebSocket fan-out (see core/tasks.py).
+# EAGER runs tasks inline in the caller instead.
+TASK_QUEUE = {
+    'EAGER': False,
+    'WORKERS': 4,
+    'MAXSIZE': 1000,        # pending tasks per worker before producers block
+    'SUBMIT_TIMEOUT': 5.0,  # seconds a request may block on a full queue
+}
 
 # ADDED: Django REST Framework configuration for Token Authentication
 REST_FRAMEWORK = {